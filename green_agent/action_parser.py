@@ -0,0 +1,223 @@
+"""
+pyautogui Action Parser
+
+Turns agent output (pyautogui code, single calls or multi-line blocks) into
+typed actions that green_agent.actions can compile into one batch. Parsing
+is AST-based and table-driven, and results are memoized because agents
+repeat the same strings often (e.g. "pyautogui.press('enter')").
+
+Shared by the native adapter and both benchmark scripts.
+"""
+
+import ast
+import logging
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, NamedTuple, Optional, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Agent control tokens that are not pyautogui code
+CONTROL_TOKENS = ("DONE", "FAIL", "WAIT")
+
+# pyautogui function -> (op, positional parameter names)
+PYAUTOGUI_CALLS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "click": ("click", ("x", "y", "clicks", "interval", "button")),
+    "leftClick": ("click", ("x", "y")),
+    "doubleClick": ("double_click", ("x", "y")),
+    "rightClick": ("right_click", ("x", "y")),
+    "moveTo": ("move", ("x", "y")),
+    "dragTo": ("drag", ("x", "y", "duration", "tween", "button")),
+    "mouseDown": ("mouse_down", ("x", "y", "button")),
+    "mouseUp": ("mouse_up", ("x", "y", "button")),
+    "write": ("type", ("text", "interval")),
+    "typewrite": ("type", ("text", "interval")),
+    "press": ("press", ("key", "presses", "interval")),
+    "keyDown": ("key_down", ("key",)),
+    "keyUp": ("key_up", ("key",)),
+    "scroll": ("scroll", ("amount", "x", "y")),
+    "vscroll": ("scroll", ("amount", "x", "y")),
+    "sleep": ("wait", ("seconds",)),
+}
+
+# pyautogui keyword names -> our argument names
+KEYWORD_ALIASES = {"message": "text", "keys": "key", "clicks": "amount", "secs": "seconds"}
+
+# X11 keysyms some agents emit -> pyautogui key names
+KEY_ALIASES = {
+    "control_l": "ctrl",
+    "control_r": "ctrlright",
+    "control": "ctrl",
+    "shift_l": "shift",
+    "shift_r": "shiftright",
+    "alt_l": "alt",
+    "alt_r": "altright",
+    "super_l": "win",
+    "super_r": "winright",
+    "super": "win",
+    "return": "enter",
+    "escape": "esc",
+}
+
+
+class ParsedAction(NamedTuple):
+    """One executable action; args is read-only because results are cached."""
+
+    op: str
+    args: Mapping[str, Any]
+    source: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"op": self.op, "args": dict(self.args)}
+
+
+class ParseResult(NamedTuple):
+    actions: Tuple[ParsedAction, ...]
+    # Source of statements that could not be turned into actions
+    unparsed: Tuple[str, ...]
+
+
+def normalize_key(key: Any) -> Any:
+    if isinstance(key, (list, tuple)):
+        return [normalize_key(k) for k in key]
+    return KEY_ALIASES.get(str(key).lower(), key)
+
+
+def _call_target(node: ast.Call) -> Optional[Tuple[str, str]]:
+    """('pyautogui', 'click') for pyautogui.click(...), None otherwise."""
+    func = node.func
+    if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+        return func.value.id, func.attr
+    return None
+
+
+def _is_number(value: Any) -> bool:
+    """An int or float literal; bools are not numbers here."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_coord(value: Any) -> bool:
+    """x/y must be a number literal (or absent)."""
+    return value is None or _is_number(value)
+
+
+def _parse_call(node: ast.Call, source: str) -> Optional[ParsedAction]:
+    target = _call_target(node)
+    if target is None:
+        return None
+    module, name = target
+    try:
+        positional = [ast.literal_eval(a) for a in node.args]
+        keywords = {kw.arg: ast.literal_eval(kw.value) for kw in node.keywords if kw.arg}
+    except ValueError:
+        # Non-literal arguments (variables, expressions)
+        return None
+
+    if module == "time" and name == "sleep" and positional:
+        if not _is_number(positional[0]):
+            # e.g. time.sleep("a"): not a duration
+            return None
+        return ParsedAction("wait", MappingProxyType({"seconds": float(positional[0])}), source)
+    if module != "pyautogui":
+        return None
+
+    if name == "hotkey":
+        keys = normalize_key(positional or keywords.get("keys", []))
+        return ParsedAction("hotkey", MappingProxyType({"keys": keys}), source)
+
+    if name in PYAUTOGUI_CALLS:
+        op, params = PYAUTOGUI_CALLS[name]
+        args: Dict[str, Any] = dict(zip(params, positional))
+        for k, v in keywords.items():
+            args[k if k in params else KEYWORD_ALIASES.get(k, k)] = v
+        if isinstance(args.get("x"), (tuple, list)) and len(args["x"]) == 2:
+            # pyautogui.click((x, y))
+            args["x"], args["y"] = args["x"][0], args["x"][1]
+        if not all(_is_coord(args.get(k)) for k in ("x", "y")):
+            # e.g. pyautogui.click('button.png'): image lookups are not coordinates
+            return None
+        if "key" in args:
+            args["key"] = normalize_key(args["key"])
+        if op == "type" and isinstance(args.get("text"), (list, tuple)):
+            # typewrite(['a', 'enter']) presses a sequence of keys
+            return ParsedAction("press", MappingProxyType({"key": normalize_key(args["text"])}), source)
+        return ParsedAction(op, MappingProxyType(args), source)
+
+    # Any other pyautogui call with literal arguments runs verbatim
+    return ParsedAction("raw", MappingProxyType({"code": source}), source)
+
+
+def _parse_statements(code: str) -> Tuple[List[ParsedAction], List[str]]:
+    tree = ast.parse(code)
+    actions: List[ParsedAction] = []
+    unparsed: List[str] = []
+    for stmt in tree.body:
+        if isinstance(stmt, (ast.Import, ast.ImportFrom)):
+            continue
+        source = ast.get_source_segment(code, stmt) or ast.unparse(stmt)
+        if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call):
+            parsed = _parse_call(stmt.value, source)
+            if parsed is not None:
+                actions.append(parsed)
+                continue
+        unparsed.append(source)
+    return actions, unparsed
+
+
+@lru_cache(maxsize=2048)
+def parse_actions(code: str) -> ParseResult:
+    """
+    Parse a pyautogui code string into typed actions.
+
+    Multi-line blocks are parsed as a whole; if the block is not valid
+    Python (e.g. truncated model output) each line is parsed on its own so
+    the valid ones still run. Imports and comments are ignored.
+    """
+    code = code.strip()
+    if not code or code in CONTROL_TOKENS:
+        return ParseResult((), ())
+    try:
+        actions, unparsed = _parse_statements(code)
+    except SyntaxError:
+        actions, unparsed = [], []
+        for line in code.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                a, u = _parse_statements(line)
+            except SyntaxError:
+                a, u = [], [line]
+            actions.extend(a)
+            unparsed.extend(u)
+    return ParseResult(tuple(actions), tuple(unparsed))
+
+
+def parse_many(codes: Iterable[str]) -> ParseResult:
+    """Parse a step's list of action strings, skipping DONE/FAIL/WAIT tokens."""
+    actions: List[ParsedAction] = []
+    unparsed: List[str] = []
+    for code in codes:
+        result = parse_actions(code)
+        actions.extend(result.actions)
+        unparsed.extend(result.unparsed)
+    return ParseResult(tuple(actions), tuple(unparsed))
+
+
+def run_pyautogui(client, codes: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Parse pyautogui action strings and execute them with a sync OSWorldClient
+    in one /run_python round trip. Statements that could not be parsed are
+    logged instead of being dropped silently.
+    """
+    result = parse_many(codes)
+    for source in result.unparsed:
+        logger.warning(f"Unsupported pyautogui statement (not executed): {source}")
+    if not result.actions:
+        return []
+
+    results = client.run_actions(list(result.actions))
+    for r in results:
+        if not r.get("ok"):
+            logger.warning(f"Action {r['index']} ({r['op']}) failed: {r.get('error', 'skipped')}")
+    return results
@@ -0,0 +1,163 @@
+"""
+Batched pyautogui Actions
+
+Compiles a list of parsed actions into a single pyautogui script so a whole
+step executes in one /run_python round trip, and maps the script's output
+back to a per-action result.
+
+Actions use the same shape as models.Action: {"op": "click", "args": {...}}.
+"""
+
+import json
+from typing import Dict, Any, List, Callable, Iterable
+
+BATCH_RESULT_MARKER = "__GREEN_AGENT_BATCH__"
+
+
+def _xy(args: Dict[str, Any]) -> str:
+    if args.get("x") is None or args.get("y") is None:
+        return ""
+    return f"{int(args['x'])}, {int(args['y'])}"
+
+
+def _click(args: Dict[str, Any]) -> str:
+    params = [p for p in [_xy(args)] if p]
+    if args.get("button"):
+        params.append(f"button={args['button']!r}")
+    if args.get("clicks"):
+        params.append(f"clicks={int(args['clicks'])}")
+    return f"pyautogui.click({', '.join(params)})"
+
+
+def _scroll(args: Dict[str, Any]) -> str:
+    xy = _xy(args)
+    return f"pyautogui.scroll({int(args.get('amount', 0))}{', ' + xy if xy else ''})"
+
+
+def _drag(args: Dict[str, Any]) -> str:
+    duration = float(args.get("duration", 0.5))
+    return f"pyautogui.dragTo({int(args['x'])}, {int(args['y'])}, duration={duration}, button={args.get('button', 'left')!r})"
+
+
+def _mouse_button(fn: str) -> Callable[[Dict[str, Any]], str]:
+    def build(args: Dict[str, Any]) -> str:
+        params = [p for p in [_xy(args)] if p]
+        params.append(f"button={args.get('button', 'left')!r}")
+        return f"pyautogui.{fn}({', '.join(params)})"
+    return build
+
+
+def _key(key: Any) -> str:
+    if isinstance(key, (list, tuple)):
+        return repr([str(k) for k in key])
+    return repr(str(key))
+
+
+def _press(args: Dict[str, Any]) -> str:
+    params = [_key(args["key"])]
+    if args.get("presses"):
+        params.append(f"presses={int(args['presses'])}")
+    if args.get("interval"):
+        params.append(f"interval={float(args['interval'])}")
+    return f"pyautogui.press({', '.join(params)})"
+
+
+def _type(args: Dict[str, Any]) -> str:
+    interval = f", interval={float(args['interval'])}" if args.get("interval") else ""
+    return f"pyautogui.write({str(args.get('text', ''))!r}{interval})"
+
+
+# op -> builder(args) returning one pyautogui expression
+ACTION_CODE: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    "click": _click,
+    "double_click": lambda a: f"pyautogui.doubleClick({_xy(a)})",
+    "right_click": lambda a: f"pyautogui.rightClick({_xy(a)})",
+    "move": lambda a: f"pyautogui.moveTo({_xy(a)})",
+    "drag": _drag,
+    "mouse_down": _mouse_button("mouseDown"),
+    "mouse_up": _mouse_button("mouseUp"),
+    "type": _type,
+    "press": _press,
+    "key_down": lambda a: f"pyautogui.keyDown({_key(a['key'])})",
+    "key_up": lambda a: f"pyautogui.keyUp({_key(a['key'])})",
+    "hotkey": lambda a: f"pyautogui.hotkey({', '.join(repr(str(k)) for k in a.get('keys', []))})",
+    "scroll": _scroll,
+    "wait": lambda a: f"time.sleep({float(a.get('seconds', a.get('duration', 1.0)))})",
+    # Verbatim pyautogui call from the action parser (a single expression)
+    "raw": lambda a: str(a["code"]),
+}
+
+
+def _op_args(action: Any) -> tuple[str, Dict[str, Any]]:
+    """Accept {"op", "args"} dicts as well as objects exposing .op/.args."""
+    if isinstance(action, dict):
+        return action.get("op", ""), action.get("args") or {}
+    return action.op, dict(action.args or {})
+
+
+def action_dicts(actions: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Normalize actions to JSON-serializable {"op", "args"} dicts."""
+    return [{"op": op, "args": dict(args)} for op, args in map(_op_args, actions)]
+
+
+def compile_batch(actions: Iterable[Any], stop_on_error: bool = True) -> str:
+    """
+    Compile actions into one Python script for /run_python.
+
+    Each action runs inside its own try block; the script prints a single
+    marker line with a JSON list of per-action results.
+
+    Args:
+        actions: Actions as {"op", "args"} dicts (or objects with .op/.args)
+        stop_on_error: Skip remaining actions after the first failure
+
+    Raises:
+        ValueError: If an action has an unknown op or is missing arguments
+    """
+    lines = [
+        "import json, time, pyautogui",
+        "_results = []",
+        f"_STOP_ON_ERROR = {stop_on_error!r}",
+        "def _run(i, op, fn):",
+        "    if _STOP_ON_ERROR and any(not r['ok'] for r in _results):",
+        "        _results.append({'index': i, 'op': op, 'ok': False, 'skipped': True})",
+        "        return",
+        "    t0 = time.time()",
+        "    try:",
+        "        fn()",
+        "        _results.append({'index': i, 'op': op, 'ok': True, 'time_sec': round(time.time() - t0, 4)})",
+        "    except Exception as e:",
+        "        _results.append({'index': i, 'op': op, 'ok': False, 'error': repr(e)})",
+    ]
+    for i, action in enumerate(actions):
+        op, args = _op_args(action)
+        builder = ACTION_CODE.get(op)
+        if builder is None:
+            raise ValueError(f"Unsupported action op '{op}'")
+        try:
+            statement = builder(args)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid arguments for action '{op}': {args} ({e})")
+        lines.append(f"_run({i}, {op!r}, lambda: {statement})")
+    lines.append(f"print({BATCH_RESULT_MARKER!r} + json.dumps(_results))")
+    return "\n".join(lines)
+
+
+def parse_batch_result(response: Dict[str, Any], actions: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Extract per-action results from a /run_python response.
+
+    If the script did not get as far as printing its results (e.g. a syntax
+    or import error on the VM), every action is reported with the overall
+    error.
+    """
+    for key in ("output", "message"):
+        text = response.get(key) or ""
+        for line in str(text).splitlines():
+            if line.startswith(BATCH_RESULT_MARKER):
+                return json.loads(line[len(BATCH_RESULT_MARKER):])
+    error = response.get("error") or response.get("message") or "no batch result in output"
+    return [
+        {"index": i, "op": _op_args(a)[0], "ok": False, "error": str(error)}
+        for i, a in enumerate(actions)
+    ]
@@ -1,11 +1,18 @@
 from __future__ import annotations
-import os, json, uuid, time, base64, logging
-from fastapi import FastAPI, HTTPException
-from typing import Dict, Any
+import os, json, uuid, time, base64, logging, functools
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, Optional
 from .models import StartAssessmentRequest, AssessmentStatus, RunMetrics
 from . import storage
 from .white_client import WhiteClient
-from .osworld_adapter import run_osworld
+from .osworld_adapter import run_osworld, max_steps_for
+from .jobs import JobQueue, AssessmentJob, QueueFullError
+from .obs_encoding import resolve_config
+from .timeline import summarize
+from .task_catalog import TaskNotFoundError, get_catalog
+from .blob_store import BlobNotFoundError, get_blob_store, read_manifest
+from .frame_pack import FramePack, group_for, list_groups
 
 # Configure logging
 logging.basicConfig(
@@ -32,6 +39,11 @@ def health() -> Dict[str, Any]:
     else:
         mode = "docker"
 
+    vm_pool = None
+    if mode == "native":
+        from .vm_pool import get_pool
+        vm_pool = get_pool().stats()
+
     return {
         "status": "healthy",
         "service": "green-agent",
@@ -39,6 +51,8 @@ def health() -> Dict[str, Any]:
         "osworld_mode": mode,
         "osworld_server_url": osworld_server_url if mode == "native" else None,
         "max_steps": int(os.environ.get("OSWORLD_MAX_STEPS", "15")),
+        "jobs": jobs.stats(),
+        "vm_pool": vm_pool,
     }
 
 
@@ -53,9 +67,30 @@ def card() -> Dict[str, Any]:
 
 
 @app.get("/assessments")
-def list_assessments(limit: int = 50) -> Dict[str, Any]:
-    """List all assessments, newest first."""
-    runs = storage.list_runs(limit=limit)
+def list_assessments(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    task_id: Optional[str] = None,
+    white_agent: Optional[str] = None,
+    status: Optional[str] = None,
+    success: Optional[bool] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    List assessments, newest first.
+
+    Pages with an opaque cursor: pass the previous response's next_cursor
+    to get the next page. Filters are exact matches; since/until bound
+    created_at (epoch seconds).
+    """
+    try:
+        runs, next_cursor = storage.query_runs(
+            limit=limit, cursor=cursor, task_id=task_id, white_agent=white_agent,
+            status=status, success=success, since=since, until=until,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     return {
         "assessments": [
             {
@@ -70,64 +105,86 @@ def list_assessments(limit: int = 50) -> Dict[str, Any]:
             for r in runs
         ],
         "total": len(runs),
+        "next_cursor": next_cursor,
+    }
+
+
+@app.get("/tasks")
+def list_tasks(
+    domain: Optional[str] = None,
+    source: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+) -> Dict[str, Any]:
+    """
+    Catalogued tasks (TASKS_DIR and OSWorld examples), by domain then id.
+
+    Filters: domain, source ("tasks" or "osworld"), q (substring of the goal or id).
+    """
+    catalog = get_catalog()
+    entries = catalog.list(domain=domain, source=source, query=q)
+    page = entries[max(0, offset):max(0, offset) + max(1, min(limit, 1000))]
+    return {
+        "tasks": [e.summary() for e in page],
+        "total": len(entries),
+        "domains": catalog.domains(),
     }
 
 
+@app.get("/tasks/{task_id}")
+def get_task(task_id: str) -> Dict[str, Any]:
+    """One task: its Green Agent form and the JSON it was loaded from."""
+    try:
+        entry = get_catalog().get(task_id)
+    except TaskNotFoundError:
+        raise HTTPException(404, f"Task not found: {task_id}")
+    return {**entry.summary(), "path": entry.path, "task": entry.task, "config": entry.config}
+
+
 @app.post("/reset")
 def reset():
     # stateless MVP; extend with caches if needed
     return {"ok": True}
 
 
-@app.post("/assessments/start")
-def start_assessment(req: StartAssessmentRequest) -> Dict[str, Any]:
-    assess_id = str(uuid.uuid4())
-    logger.info(f"Starting assessment {assess_id} for task={req.task_id}, white_agent={req.white_agent_url}")
-
-    artifacts_dir = storage.create_run(assess_id, req.task_id, req.white_agent_url)
-    logger.info(f"Created artifacts directory: {artifacts_dir}")
-
-    # Load task JSON (MVP: tasks/<task_id>.json)
-    task_path = os.path.join("tasks", f"{req.task_id}.json")
-    if not os.path.exists(task_path):
-        logger.error(f"Task not found: {req.task_id}")
-        raise HTTPException(404, f"Task not found: {req.task_id}")
-    with open(task_path, "r") as f:
-        task = json.load(f)
-    logger.info(f"Loaded task: {task.get('id', req.task_id)}")
+def _execute_assessment(job: AssessmentJob) -> None:
+    """Worker entry point: run one queued assessment and persist its result."""
+    assess_id = job.assessment_id
+    storage.update_status(assess_id, status="running")
+    logger.info(f"Running assessment {assess_id} (queued {job.started_at - job.enqueued_at:.2f}s)")
 
     # White client
-    white = WhiteClient(req.white_agent_url)
+    white = WhiteClient(job.white_agent_url)
     white.reset()
     logger.info("White agent reset completed")
 
     t0 = time.time()
-    steps = 0
-    failure = None
 
     def white_decide(obs: Dict[str, Any]) -> Dict[str, Any]:
-        nonlocal steps
-        steps += 1
-        logger.debug(f"Step {steps}: Requesting decision from white agent")
+        step = job.advance()
+        logger.debug(f"Step {step}: Requesting decision from white agent")
         return white.decide(obs)
 
     try:
         logger.info("Starting OSWorld execution...")
         result = run_osworld(
-            task,
+            job.task,
             white_decide,
-            artifacts_dir,
-            white_agent_url=req.white_agent_url
+            job.artifacts_dir,
+            white_agent_url=job.white_agent_url,
+            encoding=job.encoding,
+            record_step=functools.partial(storage.record_action, assess_id),
+            on_step=job.advance,
         )
         logger.info(f"OSWorld execution completed: success={result.get('success')}, steps={result.get('steps')}")
     except Exception as e:
         logger.error(f"OSWorld execution error: {e}", exc_info=True)
-        failure = f"adapter_error: {e}"
         result = {
             "success": 0,
-            "steps": steps,
+            "steps": job.step,
             "time_sec": time.time() - t0,
-            "failure_reason": failure,
+            "failure_reason": f"adapter_error: {e}",
             "artifacts": {},
         }
 
@@ -141,15 +198,75 @@ def start_assessment(req: StartAssessmentRequest) -> Dict[str, Any]:
     )
 
     logger.info(f"Assessment {assess_id} completed: success={result.get('success')}, time={result.get('time_sec'):.2f}s")
+    logger.info(f"White agent calls for {assess_id}: {white.stats()}")
+
+
+jobs = JobQueue(_execute_assessment)
+
+
+@app.on_event("startup")
+def fail_orphaned_runs() -> None:
+    """Runs queued or running when the previous process exited will never finish."""
+    orphaned = storage.fail_unfinished_runs("orphaned: green agent restarted before the run finished")
+    if orphaned:
+        logger.warning(f"Marked {orphaned} unfinished assessment(s) from a previous process as failed")
+
+
+@app.post("/assessments/start")
+def start_assessment(req: StartAssessmentRequest) -> Dict[str, Any]:
+    """Queue an assessment and return immediately; poll /status for progress."""
+    assess_id = str(uuid.uuid4())
+    logger.info(f"Queueing assessment {assess_id} for task={req.task_id}, white_agent={req.white_agent_url}")
+
+    # Task from the catalog (tasks/<task_id>.json or an OSWorld example)
+    try:
+        task = get_catalog().get(req.task_id).task
+    except TaskNotFoundError:
+        logger.error(f"Task not found: {req.task_id}")
+        raise HTTPException(404, f"Task not found: {req.task_id}")
+    logger.info(f"Loaded task: {task.get('id', req.task_id)}")
+
+    # Observation encoding: env defaults < task "observation" block < request overrides
+    try:
+        encoding = resolve_config(task, req.observation)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(400, f"Invalid observation encoding: {e}")
+
+    artifacts_dir = storage.create_run(assess_id, req.task_id, req.white_agent_url, status="queued")
+    logger.info(f"Created artifacts directory: {artifacts_dir}")
+
+    job = AssessmentJob(
+        assess_id,
+        task,
+        req.white_agent_url,
+        artifacts_dir,
+        max_steps=max_steps_for(task),
+        encoding=encoding,
+    )
+    try:
+        jobs.submit(job)
+    except QueueFullError as e:
+        storage.update_status(assess_id, status="rejected", failure_reason=str(e))
+        raise HTTPException(503, str(e))
 
     return {
         "assessment_id": assess_id,
-        "status": "running" if failure is None else "completed",
+        "status": job.state,
     }
 
 
 @app.get("/assessments/{assessment_id}/status")
 def status(assessment_id: str) -> AssessmentStatus:
+    job = jobs.get(assessment_id)
+    if job is not None:
+        # In flight: report live progress published by the worker
+        return AssessmentStatus(
+            assessment_id=assessment_id,
+            status=job.state,
+            progress=job.progress,
+            last_step=job.step,
+            max_steps=job.max_steps,
+        )
     row = storage.fetch_run(assessment_id)
     if not row:
         raise HTTPException(404, "assessment not found")
@@ -157,7 +274,7 @@ def status(assessment_id: str) -> AssessmentStatus:
     return AssessmentStatus(
         assessment_id=assessment_id,
         status=row["status"],
-        progress=1.0 if done else 0.5,
+        progress=1.0 if done else 0.0,
         last_step=row.get("steps") or 0,
     )
 
@@ -179,9 +296,58 @@ def results(assessment_id: str) -> RunMetrics:
     )
 
 
+@app.get("/assessments/{assessment_id}/actions")
+def list_actions(assessment_id: str, limit: int = 200, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """A run's recorded actions in step order, paged like /assessments."""
+    if not storage.fetch_run(assessment_id):
+        raise HTTPException(404, "assessment not found")
+    storage.flush_actions(timeout=5)
+    try:
+        actions, next_cursor = storage.list_actions(assessment_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    for action in actions:
+        action.pop("rowid", None)
+    return {"assessment_id": assessment_id, "actions": actions, "next_cursor": next_cursor}
+
+
+@app.get("/assessments/{assessment_id}/timeline")
+def get_timeline(assessment_id: str) -> Dict[str, Any]:
+    """Per-step actions and phase timings for a run, plus per-phase totals."""
+    row = storage.fetch_run(assessment_id)
+    if not row:
+        raise HTTPException(404, "assessment not found")
+    storage.flush_actions(timeout=5)
+    steps = [
+        {
+            "step": a["step"],
+            "op": a["op"],
+            "args": a["args"],
+            "ok": a["ok"],
+            "ts": a["ts"],
+            "timings": a["timings"],
+        }
+        for a in storage.fetch_actions(assessment_id)
+    ]
+    return {
+        "assessment_id": assessment_id,
+        "status": row["status"],
+        "time_sec": row["time_sec"],
+        "summary": summarize(steps),
+        "steps": steps,
+    }
+
+
 @app.get("/assessments/{assessment_id}/artifacts")
 def list_artifacts(assessment_id: str) -> Dict[str, Any]:
-    """List all artifacts (screenshots, logs, etc.) for an assessment."""
+    """
+    List all artifacts (screenshots, logs, etc.) for an assessment.
+
+    Runs are listed from their manifest and pack indexes; only files that
+    are appended to over time (whose size the manifest cannot know) are
+    stat'ed. Runs without either (written before the manifest listed plain
+    files, or by OSWorld itself) fall back to walking the directory.
+    """
     row = storage.fetch_run(assessment_id)
     if not row:
         raise HTTPException(404, "assessment not found")
@@ -190,18 +356,52 @@ def list_artifacts(assessment_id: str) -> Dict[str, Any]:
     if not os.path.exists(artifacts_dir):
         return {"assessment_id": assessment_id, "artifacts": [], "artifacts_dir": artifacts_dir}
 
-    # List all files in the artifacts directory
+    # Blob-backed artifacts and plain files, from the run's manifest
     artifacts = []
-    for root, dirs, files in os.walk(artifacts_dir):
-        for file in files:
-            file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path, artifacts_dir)
-            file_stat = os.stat(file_path)
+    for name, entry in read_manifest(artifacts_dir).items():
+        if "blob" in entry:
             artifacts.append({
-                "filename": rel_path,
-                "size_bytes": file_stat.st_size,
-                "modified": file_stat.st_mtime,
+                "filename": name,
+                "size_bytes": entry["size"],
+                "modified": entry["ts"],
+                "blob": entry["blob"],
             })
+        elif entry["size"] is not None:
+            artifacts.append({"filename": name, "size_bytes": entry["size"], "modified": entry["ts"]})
+        else:
+            try:
+                file_stat = os.stat(os.path.join(artifacts_dir, name))
+            except OSError:
+                continue
+            artifacts.append({"filename": name, "size_bytes": file_stat.st_size, "modified": file_stat.st_mtime})
+
+    # Pack-backed artifacts (latest entry per name)
+    groups = list_groups(artifacts_dir)
+    for group in groups:
+        with FramePack(artifacts_dir, group) as pack:
+            packed = {e["name"]: e for e in pack.entries()}
+        artifacts.extend(
+            {
+                "filename": name,
+                "size_bytes": entry["size_bytes"],
+                "modified": entry["ts"],
+                "pack": group,
+                "index": entry["index"],
+            }
+            for name, entry in packed.items()
+        )
+
+    if not artifacts:
+        # No index: plain files in the artifacts directory
+        for root, dirs, files in os.walk(artifacts_dir):
+            for file in files:
+                file_path = os.path.join(root, file)
+                file_stat = os.stat(file_path)
+                artifacts.append({
+                    "filename": os.path.relpath(file_path, artifacts_dir),
+                    "size_bytes": file_stat.st_size,
+                    "modified": file_stat.st_mtime,
+                })
 
     # Sort by filename
     artifacts.sort(key=lambda x: x["filename"])
@@ -210,5 +410,77 @@ def list_artifacts(assessment_id: str) -> Dict[str, Any]:
         "assessment_id": assessment_id,
         "artifacts_dir": artifacts_dir,
         "total_files": len(artifacts),
+        "frame_count": groups.get("frames", 0),
         "artifacts": artifacts,
     }
+
+
+@app.get("/assessments/{assessment_id}/artifacts/{name:path}")
+def get_artifact(assessment_id: str, name: str) -> Response:
+    """Return one artifact's content, from the blob store or the run directory."""
+    row = storage.fetch_run(assessment_id)
+    if not row:
+        raise HTTPException(404, "assessment not found")
+    artifacts_dir = row["artifacts_dir"]
+    media_type = "image/png" if name.endswith(".png") else "application/octet-stream"
+
+    entry = read_manifest(artifacts_dir).get(name)
+    if entry is not None and "blob" in entry:
+        try:
+            return Response(get_blob_store().get(entry["blob"]), media_type=media_type)
+        except BlobNotFoundError:
+            raise HTTPException(410, f"blob {entry['blob']} for {name} was garbage-collected")
+
+    group = group_for(name)
+    if group in list_groups(artifacts_dir):
+        with FramePack(artifacts_dir, group) as pack:
+            index = pack.find(name)
+            if index is not None:
+                return Response(bytes(pack.frame(index)), media_type=media_type)
+
+    root = os.path.realpath(artifacts_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        raise HTTPException(404, "artifact not found")
+    with open(path, "rb") as f:
+        return Response(f.read(), media_type=media_type)
+
+
+def _open_pack(assessment_id: str, group: str) -> FramePack:
+    row = storage.fetch_run(assessment_id)
+    if not row:
+        raise HTTPException(404, "assessment not found")
+    if group not in list_groups(row["artifacts_dir"]):
+        raise HTTPException(404, f"no '{group}' pack for this assessment")
+    return FramePack(row["artifacts_dir"], group)
+
+
+@app.get("/assessments/{assessment_id}/frames")
+def list_frames(assessment_id: str, group: str = "frames") -> Dict[str, Any]:
+    """Frame index of a packed run (ARTIFACT_STORE=pack)."""
+    with _open_pack(assessment_id, group) as pack:
+        return {
+            "assessment_id": assessment_id,
+            "group": group,
+            "frame_count": len(pack),
+            "frames": pack.entries(),
+        }
+
+
+@app.get("/assessments/{assessment_id}/frames/{n}")
+def get_frame(assessment_id: str, n: int, group: str = "frames") -> StreamingResponse:
+    """Stream frame n of a packed run straight from the pack."""
+    pack = _open_pack(assessment_id, group)
+    if not 0 <= n < len(pack):
+        pack.close()
+        raise HTTPException(404, f"frame {n} out of range (0-{len(pack) - 1})")
+    name = pack.entries()[n]["name"]
+    media_type = "image/png" if name.endswith(".png") else "application/octet-stream"
+
+    def stream():
+        try:
+            yield from pack.iter_frame(n)
+        finally:
+            pack.close()
+
+    return StreamingResponse(stream(), media_type=media_type, headers={"X-Frame-Name": name})
@@ -0,0 +1,391 @@
+"""
+Artifact Writer
+
+Background writer for run artifacts (screenshots, replay frames, indexes).
+Step loops hand raw bytes to a bounded queue and move on; a worker thread
+writes them and fsyncs in batches instead of once per file.
+
+With ARTIFACT_STORE=blobs, whole-file artifacts go to the content-addressed
+blob store (see blob_store) and the run directory only gets a manifest
+line per artifact. With ARTIFACT_STORE=pack, they are appended to one
+indexed pack per artifact directory (see frame_pack). In both modes
+appended files (indexes) stay plain files. Every plain file is also
+listed in the run's manifest, so listing a run never walks its directory.
+
+When the queue is full the producer either waits for a slot (bounded by
+ARTIFACT_BLOCK_TIMEOUT) or, in "drop" mode, drops the write right away.
+Dropped writes are counted and reported in stats(), as are failed writes
+(with the last error).
+"""
+
+import os
+import time
+import hashlib
+import queue
+import asyncio
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_QUEUE_SIZE = int(os.environ.get("ARTIFACT_QUEUE_SIZE", 64))
+# block: wait up to ARTIFACT_BLOCK_TIMEOUT for queue space; drop: drop at once when full
+ARTIFACT_OVERFLOW = os.environ.get("ARTIFACT_OVERFLOW", "block")
+ARTIFACT_BLOCK_TIMEOUT = float(os.environ.get("ARTIFACT_BLOCK_TIMEOUT", 5))
+# Upper bound for close() to drain the queue; flush() and close() also give up if the worker died
+ARTIFACT_CLOSE_TIMEOUT = float(os.environ.get("ARTIFACT_CLOSE_TIMEOUT", 60))
+# fsync once per this many files, or when the queue runs empty
+ARTIFACT_FSYNC_BATCH = int(os.environ.get("ARTIFACT_FSYNC_BATCH", 16))
+# files: one file per artifact; blobs: deduplicated blob store + per-run manifest;
+# pack: one append-only pack + index per artifact directory
+ARTIFACT_STORE = os.environ.get("ARTIFACT_STORE", "files")
+
+Data = Union[bytes, bytearray, memoryview]
+
+_STOP = object()
+
+
+class _Write:
+    __slots__ = ("name", "path", "data", "append", "done")
+
+    def __init__(self, name: str, path: str, data: Data, append: bool,
+                 done: Optional[threading.Event] = None):
+        self.name = name
+        self.path = path
+        self.data = data
+        self.append = append
+        self.done = done
+
+
+class ArtifactWriter:
+    """
+    Bounded-queue artifact writer for one run directory.
+
+    Usage:
+        writer = ArtifactWriter(artifacts_dir)
+        writer.write("frames/step_0001.png", png_bytes)
+        ...
+        writer.close()  # drains the queue and fsyncs
+    """
+
+    def __init__(
+        self,
+        root: str,
+        maxsize: int = ARTIFACT_QUEUE_SIZE,
+        overflow: str = ARTIFACT_OVERFLOW,
+        block_timeout: float = ARTIFACT_BLOCK_TIMEOUT,
+        fsync_batch: int = ARTIFACT_FSYNC_BATCH,
+        store: str = ARTIFACT_STORE,
+        blob_store=None,
+    ):
+        """
+        Args:
+            root: Directory relative paths are resolved against
+            maxsize: Writes that may be pending before backpressure applies
+            overflow: "block" (wait for space, up to block_timeout) or "drop"
+            block_timeout: Seconds a producer waits for space before dropping
+            fsync_batch: Files written between fsyncs (0 disables fsync)
+            store: "files", "blobs" (content-addressed, see blob_store) or
+                "pack" (per-run frame packs, see frame_pack)
+            blob_store: BlobStore to use in "blobs" mode (default: get_blob_store())
+        """
+        if overflow not in ("block", "drop"):
+            raise ValueError(f"Unknown overflow policy '{overflow}'. Available: block, drop")
+        if store not in ("files", "blobs", "pack"):
+            raise ValueError(f"Unknown artifact store '{store}'. Available: files, blobs, pack")
+        if store == "blobs" and blob_store is None:
+            from .blob_store import get_blob_store
+            blob_store = get_blob_store()
+        self.store = store
+        self.blobs = blob_store if store == "blobs" else None
+        self._packs: Dict[str, Any] = {}
+        self.root = root
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.fsync_batch = fsync_batch
+        self._queue: "queue.Queue" = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._dirs: set = set()
+        # Manifest lines written with the next sync; appended files are listed once
+        self._manifest_lines: List[bytes] = []
+        self._listed: set = set()
+        self._written = 0
+        self._bytes = 0
+        self._deduped = 0
+        self._dropped = 0
+        self._errors = 0
+        self._last_error: Optional[str] = None
+        self._fsyncs = 0
+        self._blocked_sec = 0.0
+        self._max_depth = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "ArtifactWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _enqueue(self, item: _Write, block: bool) -> bool:
+        if self._closed:
+            raise RuntimeError("ArtifactWriter is closed")
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if not block or self.overflow == "drop":
+                return self._drop(item)
+            t0 = time.time()
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                return self._drop(item)
+            finally:
+                with self._lock:
+                    self._blocked_sec += time.time() - t0
+        with self._lock:
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+        return True
+
+    def _drop(self, item: _Write) -> bool:
+        with self._lock:
+            self._dropped += 1
+        logger.warning(f"Artifact queue full; dropped {item.path}")
+        return False
+
+    def write(self, relpath: str, data: Data, append: bool = False, wait: bool = True) -> bool:
+        """
+        Queue bytes for relpath (under root). Returns False if the write was dropped.
+
+        The data is not copied; do not mutate it after handing it over.
+
+        Args:
+            relpath: Path relative to root (parent directories are created)
+            data: Bytes to write
+            append: Append instead of replacing the file
+            wait: Wait for queue space in "block" mode; False drops at once
+                (for best-effort data such as replay frames)
+        """
+        return self._enqueue(self._item(relpath, data, append), block=wait)
+
+    async def write_async(self, relpath: str, data: Data, append: bool = False) -> bool:
+        """write() for event loops: waits for queue space in a worker thread, never on the loop."""
+        item = self._item(relpath, data, append)
+        if self.overflow == "drop" or not self._queue.full():
+            return self._enqueue(item, block=False)
+        return await asyncio.to_thread(self._enqueue, item, True)
+
+    def _item(self, relpath: str, data: Data, append: bool) -> _Write:
+        return _Write(relpath, os.path.join(self.root, relpath), data, append)
+
+    def _put_control(self, item, deadline: Optional[float]) -> bool:
+        """Queue a control item; False if the worker is gone or the deadline passes."""
+        while self._thread.is_alive():
+            wait = 0.5 if deadline is None else min(0.5, deadline - time.time())
+            if wait <= 0:
+                return False
+            try:
+                self._queue.put(item, timeout=wait)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _wait_worker(self, done: threading.Event, deadline: Optional[float]) -> bool:
+        while not done.is_set() and self._thread.is_alive():
+            wait = 0.5 if deadline is None else min(0.5, deadline - time.time())
+            if wait <= 0:
+                break
+            done.wait(wait)
+        return done.is_set()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until everything queued so far is written and fsynced.
+
+        Returns False on timeout or if the worker thread has died.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        done = threading.Event()
+        if not self._put_control(_Write("", "", b"", False, done), deadline):
+            return False
+        return self._wait_worker(done, deadline)
+
+    def close(self, timeout: Optional[float] = ARTIFACT_CLOSE_TIMEOUT) -> bool:
+        """
+        Drain the queue, fsync and stop the worker.
+
+        Returns False if the worker did not finish within timeout (or had
+        died); writes still queued then are lost.
+        """
+        if self._closed:
+            return not self._thread.is_alive()
+        self._closed = True
+        deadline = None if timeout is None else time.time() + timeout
+        if self._put_control(_STOP, deadline):
+            self._thread.join(None if deadline is None else max(0.0, deadline - time.time()))
+        finished = not self._thread.is_alive() and self._queue.empty()
+        if not finished:
+            logger.error(
+                f"Artifact writer for {self.root} did not drain "
+                f"({self._queue.qsize()} writes left, last error: {self._last_error})"
+            )
+        if self._dropped:
+            logger.warning(f"Artifact writer for {self.root} dropped {self._dropped} writes")
+        return finished
+
+    def _open(self, item: _Write) -> int:
+        parent = os.path.dirname(item.path)
+        if parent and parent not in self._dirs:
+            os.makedirs(parent, exist_ok=True)
+            self._dirs.add(parent)
+        flags = os.O_WRONLY | os.O_CREAT | (os.O_APPEND if item.append else os.O_TRUNC)
+        return os.open(item.path, flags, 0o644)
+
+    def _sync(self, fds: List[Optional[int]]):
+        from .blob_store import MANIFEST_NAME
+
+        if self._manifest_lines:
+            # One manifest append per batch instead of one per artifact
+            lines = b"".join(self._manifest_lines)
+            self._manifest_lines.clear()
+            manifest = _Write(MANIFEST_NAME, os.path.join(self.root, MANIFEST_NAME), lines, True)
+            try:
+                self._write_file(manifest, fds)
+            except OSError as e:
+                self._record_error("write artifact manifest", e)
+        # None marks a pack append or blob; packs are synced as a whole below
+        for fd in fds:
+            if fd is None:
+                continue
+            try:
+                if self.fsync_batch > 0:
+                    os.fsync(fd)
+            except OSError as e:
+                logger.warning(f"fsync failed: {e}")
+            finally:
+                os.close(fd)
+        for pack in self._packs.values():
+            try:
+                if self.fsync_batch > 0:
+                    pack.sync()
+            except OSError as e:
+                logger.warning(f"fsync failed: {e}")
+        if fds and self.fsync_batch > 0:
+            with self._lock:
+                self._fsyncs += 1
+        fds.clear()
+
+    def _write_file(self, item: _Write, pending: List[int]):
+        fd = self._open(item)
+        pending.append(fd)
+        view = memoryview(item.data)
+        while view:
+            view = view[os.write(fd, view):]
+
+    def _write_listed_file(self, item: _Write, pending: List[int]):
+        from .blob_store import file_line
+
+        self._write_file(item, pending)
+        if not item.append:
+            self._manifest_lines.append(file_line(item.name, len(item.data)))
+        elif item.name not in self._listed:
+            self._listed.add(item.name)
+            self._manifest_lines.append(file_line(item.name))
+
+    def _store_blob(self, item: _Write, pending: List[Optional[int]]):
+        from .blob_store import manifest_line
+
+        data = bytes(item.data)
+        digest = hashlib.sha256(data).hexdigest()
+        if self.blobs.exists(digest):
+            with self._lock:
+                self._deduped += 1
+        self.blobs.put(data, durable=self.fsync_batch > 0, digest=digest)
+        self._manifest_lines.append(manifest_line(item.name, digest, len(data)))
+        pending.append(None)
+
+    def _append_pack(self, item: _Write, pending: List[Optional[int]]):
+        from .frame_pack import FramePackWriter, group_for
+
+        group = group_for(item.name)
+        pack = self._packs.get(group)
+        if pack is None:
+            pack = self._packs[group] = FramePackWriter(self.root, group)
+        pack.append(item.name, item.data)
+        pending.append(None)
+
+    def _record_error(self, what: str, e: Exception):
+        with self._lock:
+            self._errors += 1
+            self._last_error = f"{type(e).__name__}: {e}"
+        logger.warning(f"Failed to {what}: {e}")
+
+    def _safe_sync(self, pending: List[Optional[int]]):
+        try:
+            self._sync(pending)
+        except Exception as e:
+            pending.clear()
+            self._record_error("sync artifacts", e)
+
+    def _run(self):
+        pending: List[Optional[int]] = []
+        while True:
+            if pending:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    # Queue ran dry: make the batch durable before waiting
+                    self._safe_sync(pending)
+                    continue
+            else:
+                item = self._queue.get()
+
+            if item is _STOP:
+                self._safe_sync(pending)
+                for pack in self._packs.values():
+                    try:
+                        pack.close()
+                    except Exception as e:
+                        self._record_error("close frame pack", e)
+                return
+            if item.done is not None:
+                self._safe_sync(pending)
+                item.done.set()
+                continue
+            try:
+                if self.blobs is not None and not item.append:
+                    self._store_blob(item, pending)
+                elif self.store == "pack" and not item.append:
+                    try:
+                        self._append_pack(item, pending)
+                    except ValueError:
+                        # Name does not fit the pack index; keep it as a file
+                        self._write_listed_file(item, pending)
+                else:
+                    self._write_listed_file(item, pending)
+                with self._lock:
+                    self._written += 1
+                    self._bytes += len(item.data)
+            except Exception as e:
+                # Never let one bad write kill the worker; later writes and close() depend on it
+                self._record_error(f"write artifact {item.path}", e)
+            if len(pending) >= max(1, self.fsync_batch):
+                self._safe_sync(pending)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "written": self._written,
+                "bytes": self._bytes,
+                "deduplicated": self._deduped,
+                "dropped": self._dropped,
+                "errors": self._errors,
+                "last_error": self._last_error,
+                "fsyncs": self._fsyncs,
+                "queued": self._queue.qsize(),
+                "max_queue_depth": self._max_depth,
+                "blocked_sec": round(self._blocked_sec, 3),
+            }
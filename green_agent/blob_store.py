@@ -0,0 +1,249 @@
+"""
+Content-Addressed Blob Store
+
+Artifacts stored once per distinct content, keyed by SHA-256. Runs keep a
+manifest (manifest.jsonl in the run directory) mapping artifact names to
+blob hashes, so identical frames from idle desktops or repeated tasks take
+disk space once across all runs.
+
+Layout:
+    <BLOB_STORE_DIR>/ab/cd/abcd...ef        raw blob
+    <BLOB_STORE_DIR>/ab/cd/abcd...ef.zst    zstd-compressed blob (BLOB_COMPRESSION=zstd)
+    <run_dir>/manifest.jsonl                {"name", "blob", "size", "ts"} per line;
+                                            plain files written by ArtifactWriter get
+                                            {"name", "file": true, "size", "ts"}
+
+Garbage collection removes blobs no manifest references:
+    python -m green_agent.blob_store gc [--dry-run] [--runs-dir DIR ...]
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+import tempfile
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BLOB_STORE_DIR = os.environ.get("BLOB_STORE_DIR", "blobs")
+# none or zstd (requires the optional 'zstandard' package)
+BLOB_COMPRESSION = os.environ.get("BLOB_COMPRESSION", "none")
+BLOB_ZSTD_LEVEL = int(os.environ.get("BLOB_ZSTD_LEVEL", 3))
+MANIFEST_NAME = "manifest.jsonl"
+
+
+class BlobNotFoundError(KeyError):
+    pass
+
+
+class BlobStore:
+    """
+    SHA-256 keyed blob store on the local filesystem.
+
+    Writes are atomic (temp file + rename), so a blob visible under its
+    hash is always complete; storing content that already exists is a
+    no-op apart from hashing.
+    """
+
+    def __init__(self, root: str = BLOB_STORE_DIR, compression: str = BLOB_COMPRESSION,
+                 level: int = BLOB_ZSTD_LEVEL):
+        if compression not in ("none", "zstd"):
+            raise ValueError(f"Unknown blob compression '{compression}'. Available: none, zstd")
+        if compression == "zstd" and zstandard is None:
+            logger.warning("BLOB_COMPRESSION=zstd but 'zstandard' is not installed; storing blobs uncompressed")
+            compression = "none"
+        self.root = root
+        self.compression = compression
+        self.level = level
+        os.makedirs(root, exist_ok=True)
+
+    def _base(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _find(self, digest: str) -> Optional[str]:
+        base = self._base(digest)
+        for path in (base, base + ".zst"):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def exists(self, digest: str) -> bool:
+        return self._find(digest) is not None
+
+    def put(self, data: bytes, durable: bool = True, digest: Optional[str] = None) -> str:
+        """
+        Store data and return its hex SHA-256.
+
+        Args:
+            data: Blob content
+            durable: fsync a new blob before publishing it under its hash
+            digest: Precomputed SHA-256 of data (skips hashing it again)
+        """
+        digest = digest or hashlib.sha256(data).hexdigest()
+        existing = self._find(digest)
+        if existing is not None:
+            # Refresh mtime so gc's min_age protects it until the manifest line lands
+            try:
+                os.utime(existing)
+                return digest
+            except FileNotFoundError:
+                pass
+        path = self._base(digest)
+        payload = data
+        if self.compression == "zstd":
+            payload = zstandard.ZstdCompressor(level=self.level).compress(data)
+            path += ".zst"
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+                if durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        path = self._find(digest)
+        if path is None:
+            raise BlobNotFoundError(digest)
+        with open(path, "rb") as f:
+            data = f.read()
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError(f"Blob {digest} is zstd-compressed but 'zstandard' is not installed")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return data
+
+    def iter_blobs(self) -> Iterator[tuple]:
+        """Yield (digest, path) for every stored blob."""
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                yield name.split(".", 1)[0], os.path.join(dirpath, name)
+
+    def gc(self, live: Set[str], min_age: float = 3600, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Delete blobs not in live.
+
+        Args:
+            live: Digests referenced by manifests
+            min_age: Keep unreferenced blobs younger than this (seconds); a
+                run writes the blob before its manifest line
+            dry_run: Only report what would be deleted
+        """
+        now = time.time()
+        removed = kept = freed = 0
+        for digest, path in self.iter_blobs():
+            if digest in live:
+                kept += 1
+                continue
+            try:
+                st = os.stat(path)
+                if now - st.st_mtime < min_age:
+                    kept += 1
+                    continue
+                if not dry_run:
+                    os.unlink(path)
+                removed += 1
+                freed += st.st_size
+            except FileNotFoundError:
+                continue
+        return {"removed": removed, "kept": kept, "freed_bytes": freed, "dry_run": dry_run}
+
+
+_default_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Process-wide store configured from the environment."""
+    global _default_store
+    if _default_store is None:
+        _default_store = BlobStore()
+    return _default_store
+
+
+def manifest_line(name: str, digest: str, size: int) -> bytes:
+    return (json.dumps({"name": name, "blob": digest, "size": size, "ts": time.time()}) + "\n").encode()
+
+
+def file_line(name: str, size: Optional[int] = None) -> bytes:
+    """Manifest line for an artifact kept as a plain file (size None: appended to over time)."""
+    return (json.dumps({"name": name, "file": True, "size": size, "ts": time.time()}) + "\n").encode()
+
+
+def read_manifest(run_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Artifact name -> latest manifest entry for a run ({} if it has no manifest)."""
+    entries: Dict[str, Dict[str, Any]] = {}
+    try:
+        with open(os.path.join(run_dir, MANIFEST_NAME)) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn last line after a crash
+                    continue
+                entries[entry["name"]] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def find_manifests(dirs: Iterable[str]) -> Iterator[str]:
+    for top in dirs:
+        for dirpath, _, files in os.walk(top):
+            if MANIFEST_NAME in files:
+                yield dirpath
+
+
+def live_digests(dirs: Iterable[str]) -> Set[str]:
+    """Every blob referenced by a manifest under dirs."""
+    live: Set[str] = set()
+    for run_dir in find_manifests(dirs):
+        live.update(e["blob"] for e in read_manifest(run_dir).values() if "blob" in e)
+    return live
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Content-addressed artifact blob store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gc = sub.add_parser("gc", help="Delete blobs no run manifest references")
+    gc.add_argument("--store", default=BLOB_STORE_DIR, help="Blob store directory")
+    gc.add_argument("--runs-dir", action="append",
+                    help="Directory scanned for run manifests (repeatable; default: RUNS_DIR and results/)")
+    gc.add_argument("--min-age", type=float, default=3600,
+                    help="Keep unreferenced blobs younger than this many seconds")
+    gc.add_argument("--dry-run", action="store_true", help="Report without deleting")
+    args = parser.parse_args(argv)
+
+    if args.command == "gc":
+        dirs = args.runs_dir or [os.environ.get("RUNS_DIR", "runs"), "results"]
+        live = live_digests(d for d in dirs if os.path.isdir(d))
+        result = BlobStore(args.store).gc(live, min_age=args.min_age, dry_run=args.dry_run)
+        print(json.dumps({"live": len(live), **result}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
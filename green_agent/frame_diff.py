@@ -0,0 +1,182 @@
+"""
+Frame Diff
+
+Cheap change detection between consecutive screenshots. Changed tiles and
+the "unchanged" flag are exact: a tile counts as changed if any of its
+pixels differs from the previous frame, so a caret or a single character
+is never lost when only changed tiles are sent. Each frame is also reduced
+to a small grayscale thumbnail, giving a perceptual hash (dHash) and a
+tolerant "similar" flag for settle detection, where a blinking caret must
+not count as activity.
+
+Used by the observation pipeline to flag unchanged observations and,
+optionally, to send only the changed tiles plus the previous frame's ID.
+"""
+
+import io
+import base64
+from typing import Dict, Any, List, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+# Tile grid over the screen and thumbnail pixels per tile edge
+TILE_COLS = 16
+TILE_ROWS = 9
+TILE_PX = 8
+# Mean absolute thumbnail difference (0-255) above which a tile counts as
+# visibly changed for the tolerant "similar" check (not for tile deltas)
+TILE_THRESHOLD = 2.0
+
+
+def dhash(img: Image.Image, size: int = 8) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair."""
+    small = img.convert("L").resize((size + 1, size), Image.BILINEAR)
+    px = small.tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (px[offset + col] > px[offset + col + 1])
+    return bits
+
+
+def _comparable(img: Image.Image) -> Image.Image:
+    # getbbox() on an RGBA difference only looks at alpha
+    return img if img.mode in ("RGB", "L") else img.convert("RGB")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class FrameDelta:
+    """Result of comparing a frame with the previous one."""
+
+    def __init__(
+        self,
+        frame_id: int,
+        prev_frame_id: Optional[int],
+        unchanged: bool,
+        phash: int,
+        changed_tiles: List[Tuple[int, int, int, int]],
+        tile_count: int,
+        similar: Optional[bool] = None,
+    ):
+        self.frame_id = frame_id
+        self.prev_frame_id = prev_frame_id
+        # Pixel-identical to the previous frame
+        self.unchanged = unchanged
+        # No tile changed visibly (thumbnail difference under the threshold)
+        self.similar = unchanged if similar is None else similar
+        self.phash = phash
+        # (x, y, w, h) boxes in screen coordinates
+        self.changed_tiles = changed_tiles
+        self.tile_count = tile_count
+
+    @property
+    def changed_ratio(self) -> float:
+        return len(self.changed_tiles) / self.tile_count if self.tile_count else 1.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "frame_id": self.frame_id,
+            "prev_frame_id": self.prev_frame_id,
+            "unchanged": self.unchanged,
+            "similar": self.similar,
+            "phash": f"{self.phash:016x}",
+            "changed_tiles": len(self.changed_tiles),
+            "changed_ratio": round(self.changed_ratio, 4),
+        }
+
+
+class FrameDiffer:
+    """
+    Stateful comparator for one screen stream (one run).
+
+    Usage:
+        differ = FrameDiffer()
+        delta = differ.diff(png_bytes, frame_id=step)
+        if delta.unchanged: ...
+        tiles = differ.tile_payload(delta)  # changed regions as PNGs
+    """
+
+    def __init__(
+        self,
+        cols: int = TILE_COLS,
+        rows: int = TILE_ROWS,
+        threshold: float = TILE_THRESHOLD,
+    ):
+        self.cols = cols
+        self.rows = rows
+        self.threshold = threshold
+        self._prev_bytes: Optional[bytes] = None
+        self._prev_thumb: Optional[Image.Image] = None
+        self._prev_id: Optional[int] = None
+        self._prev_hash: Optional[int] = None
+        self._image: Optional[Image.Image] = None
+
+    def _tile_boxes(self, size: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+        w, h = size
+        boxes = []
+        for r in range(self.rows):
+            for c in range(self.cols):
+                x0, y0 = c * w // self.cols, r * h // self.rows
+                x1, y1 = (c + 1) * w // self.cols, (r + 1) * h // self.rows
+                boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
+
+    def diff(self, png_bytes: bytes, frame_id: int) -> FrameDelta:
+        """Compare a frame with the previous one and make it the new reference."""
+        prev_id = self._prev_id
+        tile_count = self.cols * self.rows
+
+        if self._prev_bytes is not None and png_bytes == self._prev_bytes:
+            # Byte-identical frame: no decode needed
+            self._prev_id = frame_id
+            return FrameDelta(frame_id, prev_id, True, self._prev_hash or 0, [], tile_count)
+
+        img = Image.open(io.BytesIO(png_bytes))
+        img.load()
+        thumb = img.convert("L").resize(
+            (self.cols * TILE_PX, self.rows * TILE_PX), Image.BILINEAR
+        )
+        phash = dhash(thumb)
+        boxes = self._tile_boxes(img.size)
+
+        prev = self._image
+        if prev is None or prev.size != img.size or self._prev_thumb is None:
+            changed = boxes
+            similar = False
+        else:
+            exact = ImageChops.difference(_comparable(img), _comparable(prev))
+            changed = [(x, y, w, h) for x, y, w, h in boxes if exact.crop((x, y, x + w, y + h)).getbbox()]
+            similar = True
+            delta = ImageChops.difference(thumb, self._prev_thumb)
+            for i in range(len(boxes)):
+                r, c = divmod(i, self.cols)
+                tile = delta.crop((c * TILE_PX, r * TILE_PX, (c + 1) * TILE_PX, (r + 1) * TILE_PX))
+                if sum(tile.tobytes()) / (TILE_PX * TILE_PX) > self.threshold:
+                    similar = False
+                    break
+
+        unchanged = prev_id is not None and not changed
+        self._prev_bytes = png_bytes
+        self._prev_thumb = thumb
+        self._prev_id = frame_id
+        self._prev_hash = phash
+        self._image = img
+        return FrameDelta(frame_id, prev_id, unchanged, phash, changed, tile_count, similar=prev_id is not None and similar)
+
+    def tile_payload(self, delta: FrameDelta) -> List[Dict[str, Any]]:
+        """Changed regions of the latest frame as base64 PNG tiles."""
+        if self._image is None:
+            return []
+        tiles = []
+        for x, y, w, h in delta.changed_tiles:
+            buf = io.BytesIO()
+            self._image.crop((x, y, x + w, y + h)).save(buf, format="PNG")
+            tiles.append({
+                "x": x, "y": y, "w": w, "h": h,
+                "png_b64": base64.b64encode(buf.getvalue()).decode("ascii"),
+            })
+        return tiles
@@ -0,0 +1,173 @@
+"""
+Frame Packs
+
+Append-only container for a run's frames: one data file holding the
+frames back to back plus a fixed-size record index.
+
+    <run_dir>/<group>.pack   frame bytes, concatenated
+    <run_dir>/<group>.idx    one RECORD per frame: offset, length, timestamp, name
+
+The group is the artifact directory ("frames", "replay"; top-level
+artifacts use "artifacts"). Counting frames is a single stat of the index,
+listing is a single read, and frame N is a slice of an mmap of the pack.
+A run's frames upload as one sequential file.
+
+Index records are appended after their data, so a crash can leave
+unreferenced bytes at the end of the pack but never an index entry
+pointing past the data. A torn index record is cut off when the pack is
+reopened for writing, so later records stay aligned.
+"""
+
+import os
+import mmap
+import time
+import struct
+from typing import Dict, Any, Iterator, List, Optional
+
+# offset, length, captured/written timestamp, name (utf-8, NUL padded)
+RECORD = struct.Struct("<QQd48s")
+MAX_NAME = 48
+DEFAULT_GROUP = "artifacts"
+
+
+def pack_paths(run_dir: str, group: str) -> tuple:
+    return os.path.join(run_dir, f"{group}.pack"), os.path.join(run_dir, f"{group}.idx")
+
+
+def group_for(relpath: str) -> str:
+    """Pack group an artifact path belongs to (its top-level directory)."""
+    head = relpath.replace("\\", "/").split("/", 1)
+    return head[0] if len(head) > 1 else DEFAULT_GROUP
+
+
+def list_groups(run_dir: str) -> Dict[str, int]:
+    """Pack group -> frame count, from index sizes alone."""
+    groups = {}
+    try:
+        names = os.listdir(run_dir)
+    except FileNotFoundError:
+        return groups
+    for name in names:
+        if name.endswith(".idx"):
+            groups[name[:-4]] = os.stat(os.path.join(run_dir, name)).st_size // RECORD.size
+    return groups
+
+
+class FramePackWriter:
+    """Appends frames to a pack; used from a single writer thread."""
+
+    def __init__(self, run_dir: str, group: str):
+        os.makedirs(run_dir, exist_ok=True)
+        self.pack_path, self.idx_path = pack_paths(run_dir, group)
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        self._pack = os.open(self.pack_path, flags, 0o644)
+        self._idx = os.open(self.idx_path, flags, 0o644)
+        self._offset = os.fstat(self._pack).st_size
+        size = os.fstat(self._idx).st_size
+        self.count = size // RECORD.size
+        if size % RECORD.size:
+            # Torn record from a crash mid-append; appends must start on a record boundary
+            os.ftruncate(self._idx, self.count * RECORD.size)
+        self.dirty = False
+
+    def append(self, name: str, data, ts: Optional[float] = None) -> int:
+        """
+        Append one frame; returns its index in the pack.
+
+        Raises:
+            ValueError: If name is longer than MAX_NAME bytes when encoded
+        """
+        encoded = name.encode("utf-8")
+        if len(encoded) > MAX_NAME:
+            raise ValueError(f"Frame name too long for pack index ({len(encoded)} > {MAX_NAME}): {name}")
+        view = memoryview(data)
+        length = len(view)
+        while view:
+            view = view[os.write(self._pack, view):]
+        os.write(self._idx, RECORD.pack(self._offset, length, ts or time.time(), encoded))
+        self._offset += length
+        self.count += 1
+        self.dirty = True
+        return self.count - 1
+
+    def sync(self):
+        if self.dirty:
+            os.fsync(self._pack)
+            os.fsync(self._idx)
+            self.dirty = False
+
+    def close(self):
+        os.close(self._pack)
+        os.close(self._idx)
+
+
+class FramePack:
+    """
+    Read access to a pack.
+
+    Usage:
+        with FramePack(run_dir, "frames") as pack:
+            len(pack); pack.entries()
+            png = bytes(pack.frame(3))
+    """
+
+    def __init__(self, run_dir: str, group: str = "frames"):
+        self.pack_path, self.idx_path = pack_paths(run_dir, group)
+        with open(self.idx_path, "rb") as f:
+            raw = f.read()
+        usable = len(raw) - len(raw) % RECORD.size
+        self._records = [RECORD.unpack_from(raw, i) for i in range(0, usable, RECORD.size)]
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __enter__(self) -> "FramePack":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        return [
+            {"index": i, "name": name.rstrip(b"\0").decode("utf-8"), "offset": offset,
+             "size_bytes": length, "ts": ts}
+            for i, (offset, length, ts, name) in enumerate(self._records)
+        ]
+
+    def find(self, name: str) -> Optional[int]:
+        """Index of the latest frame stored under name."""
+        encoded = name.encode("utf-8")
+        for i in range(len(self._records) - 1, -1, -1):
+            if self._records[i][3].rstrip(b"\0") == encoded:
+                return i
+        return None
+
+    def _map(self) -> mmap.mmap:
+        if self._mmap is None:
+            self._file = open(self.pack_path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def frame(self, n: int) -> memoryview:
+        """Zero-copy view of frame n (valid until close())."""
+        offset, length, _, _ = self._records[n]
+        if length == 0:
+            return memoryview(b"")
+        return memoryview(self._map())[offset:offset + length]
+
+    def iter_frame(self, n: int, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+        """Frame n in chunks, for streaming responses."""
+        view = self.frame(n)
+        try:
+            for start in range(0, len(view), chunk_size):
+                yield bytes(view[start:start + chunk_size])
+        finally:
+            view.release()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
@@ -0,0 +1,168 @@
+"""
+Assessment Job Queue
+
+Runs assessments on a bounded pool of background worker threads so that
+/assessments/start can return as soon as the run is queued. Workers publish
+live progress (current step / max_steps) on the job object, which the
+status endpoint reads while the run is in flight.
+"""
+
+import os
+import queue
+import threading
+import time
+import logging
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_RUNS = int(os.environ.get("GREEN_MAX_CONCURRENT_RUNS", 4))
+MAX_QUEUED_RUNS = int(os.environ.get("GREEN_MAX_QUEUED_RUNS", 1000))
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more submissions."""
+
+
+class AssessmentJob:
+    """A queued assessment run and its live progress."""
+
+    def __init__(
+        self,
+        assessment_id: str,
+        task: Dict[str, Any],
+        white_agent_url: str,
+        artifacts_dir: str,
+        max_steps: int = 0,
+        encoding=None,
+    ):
+        self.assessment_id = assessment_id
+        self.task = task
+        self.white_agent_url = white_agent_url
+        self.artifacts_dir = artifacts_dir
+        self.state = "queued"
+        self.step = 0
+        self.max_steps = max_steps
+        # obs_encoding.EncodingConfig applied to observations (native runner)
+        self.encoding = encoding
+        self.enqueued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def advance(self) -> int:
+        """Record that the worker started another step; returns the step number."""
+        self.step += 1
+        return self.step
+
+    @property
+    def progress(self) -> float:
+        if self.state == "completed":
+            return 1.0
+        if self.max_steps <= 0:
+            return 0.0
+        return min(self.step / self.max_steps, 1.0)
+
+
+class JobQueue:
+    """
+    Bounded FIFO of assessment jobs drained by a fixed pool of worker threads.
+
+    Workers are started lazily on the first submission so importing the app
+    (e.g. for tests or tooling) does not spawn threads.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[AssessmentJob], None],
+        workers: int = MAX_CONCURRENT_RUNS,
+        maxsize: int = MAX_QUEUED_RUNS,
+    ):
+        """
+        Args:
+            runner: Callable that executes one job to completion
+            workers: Number of runs allowed to execute concurrently
+            maxsize: Maximum number of jobs waiting to start (0 = unbounded)
+        """
+        self._runner = runner
+        self._num_workers = max(1, workers)
+        self._queue: "queue.Queue[Optional[AssessmentJob]]" = queue.Queue(maxsize=maxsize)
+        self._jobs: Dict[str, AssessmentJob] = {}
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self._num_workers):
+                t = threading.Thread(
+                    target=self._worker, name=f"assessment-worker-{i}", daemon=True
+                )
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, job: AssessmentJob) -> AssessmentJob:
+        """
+        Queue a job without blocking.
+
+        Raises:
+            QueueFullError: If the queue already holds maxsize pending jobs
+        """
+        self._ensure_workers()
+        with self._lock:
+            self._jobs[job.assessment_id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.assessment_id, None)
+            raise QueueFullError(
+                f"assessment queue is full ({self._queue.maxsize} pending)"
+            )
+        return job
+
+    def get(self, assessment_id: str) -> Optional[AssessmentJob]:
+        """Return the in-flight job for an assessment, if it is queued or running."""
+        with self._lock:
+            return self._jobs.get(assessment_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if j.state == "running")
+            pending = len(self._jobs) - running
+        return {
+            "workers": self._num_workers,
+            "running": running,
+            "queued": pending,
+            "max_queued": self._queue.maxsize,
+        }
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            job.state = "running"
+            job.started_at = time.time()
+            try:
+                self._runner(job)
+            except Exception as e:
+                logger.error(f"Assessment {job.assessment_id} worker error: {e}", exc_info=True)
+            finally:
+                job.state = "completed"
+                job.finished_at = time.time()
+                with self._lock:
+                    self._jobs.pop(job.assessment_id, None)
+                self._queue.task_done()
+
+    def shutdown(self, wait: bool = True):
+        """Stop workers after the jobs already queued have drained."""
+        with self._lock:
+            threads = list(self._threads)
+            self._threads = []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for t in threads:
+                t.join()
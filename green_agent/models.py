@@ -16,13 +16,21 @@ class TaskBrief(BaseModel):
 class StartAssessmentRequest(BaseModel):
     task_id: str
     white_agent_url: str
+    # Observation encoding overrides for this white agent (see obs_encoding.EncodingConfig)
+    observation: Optional[Dict[str, Any]] = None
 
 
 class Observation(BaseModel):
     frame_id: int
-    image_png_b64: str
+    image_png_b64: str = ""
     ui_hint: Optional[str] = None
     done: bool = False
+    unchanged: bool = False
+    prev_frame_id: Optional[int] = None
+    tiles: List[Dict[str, Any]] = Field(default_factory=list)
+    # Encoding of image_png_b64 when it is not the raw screenshot
+    image_mime: str = "image/png"
+    image_transform: Optional[Dict[str, Any]] = None
 
 
 class Action(BaseModel):
@@ -35,6 +43,7 @@ class AssessmentStatus(BaseModel):
     status: str
     progress: float = 0.0
     last_step: int = 0
+    max_steps: int = 0
 
 
 class RunMetrics(BaseModel):
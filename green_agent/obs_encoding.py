@@ -0,0 +1,301 @@
+"""
+Observation Encoding
+
+Pluggable stage between the raw VM screenshot and the white agent: optional
+crop (fixed region or the active window), downscale to a target resolution,
+grayscale, and re-encode as PNG/JPEG/WebP at a given quality.
+
+Every encoded frame records its scale and offset so coordinates the white
+agent returns (in encoded-image space) map back to screen pixels.
+
+Configuration merges, in increasing priority: environment defaults, the
+task's "observation" block, and the per-assessment (white agent) request.
+"""
+
+import io
+import os
+import ast
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+CODECS = {"png": ("PNG", "image/png"), "jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+
+
+def _parse_crop(crop: Any) -> Any:
+    """Validate a crop setting: None, "active_window", [x, y, w, h] or "x,y,w,h"."""
+    if crop is None or crop == "active_window":
+        return crop
+    parts = crop.split(",") if isinstance(crop, str) else crop
+    try:
+        box = [int(v) for v in parts]
+    except (TypeError, ValueError):
+        box = None
+    if box is None or len(box) != 4 or box[2] <= 0 or box[3] <= 0:
+        raise ValueError(f"Invalid crop {crop!r}. Expected \"active_window\" or [x, y, w, h] with w, h > 0")
+    return box
+
+
+def _parse_dimension(name: str, value: Any) -> Optional[int]:
+    """Validate max_width / max_height: None or a positive integer."""
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        size = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name} {value!r}. Expected a positive integer")
+    if size <= 0:
+        raise ValueError(f"Invalid {name} {value!r}. Expected a positive integer")
+    return size
+
+
+class EncodingConfig:
+    """How observations are encoded for a white agent."""
+
+    def __init__(
+        self,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None,
+        codec: str = "png",
+        quality: int = 85,
+        grayscale: bool = False,
+        crop: Any = None,
+    ):
+        """
+        Args:
+            max_width: Downscale so the frame is at most this wide (keeps aspect)
+            max_height: Downscale so the frame is at most this tall (keeps aspect)
+            codec: "png", "jpeg" or "webp"
+            quality: Lossy quality (1-100) for JPEG/WebP
+            grayscale: Convert to single-channel grayscale
+            crop: None, "active_window", or [x, y, w, h] in screen pixels
+                (also accepted as an "x,y,w,h" string)
+        """
+        codec = codec.lower().replace("jpg", "jpeg")
+        if codec not in CODECS:
+            raise ValueError(f"Unsupported codec '{codec}'. Available: {', '.join(CODECS)}")
+        self.max_width = _parse_dimension("max_width", max_width)
+        self.max_height = _parse_dimension("max_height", max_height)
+        self.codec = codec
+        self.quality = int(quality)
+        self.grayscale = grayscale
+        self.crop = _parse_crop(crop)
+
+    @property
+    def passthrough(self) -> bool:
+        """True when the raw PNG from the VM can be sent untouched."""
+        return (
+            self.codec == "png"
+            and not self.max_width
+            and not self.max_height
+            and not self.grayscale
+            and not self.crop
+        )
+
+    @classmethod
+    def from_env(cls) -> "EncodingConfig":
+        def _env(name):
+            value = os.environ.get(name)
+            return value or None
+
+        return cls(
+            max_width=_env("OBS_MAX_WIDTH"),
+            max_height=_env("OBS_MAX_HEIGHT"),
+            codec=os.environ.get("OBS_CODEC", "png"),
+            quality=int(os.environ.get("OBS_QUALITY", 85)),
+            grayscale=os.environ.get("OBS_GRAYSCALE", "0") == "1",
+            crop=os.environ.get("OBS_CROP") or None,
+        )
+
+    def merged(self, overrides: Optional[Dict[str, Any]]) -> "EncodingConfig":
+        """Copy of this config with keys from overrides applied."""
+        params = self.to_dict()
+        for key, value in (overrides or {}).items():
+            if key not in params:
+                raise ValueError(f"Unknown observation encoding option '{key}'")
+            params[key] = value
+        return EncodingConfig(**params)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_width": self.max_width,
+            "max_height": self.max_height,
+            "codec": self.codec,
+            "quality": self.quality,
+            "grayscale": self.grayscale,
+            "crop": self.crop,
+        }
+
+
+def resolve_config(
+    task: Optional[Dict[str, Any]] = None, overrides: Optional[Dict[str, Any]] = None
+) -> EncodingConfig:
+    """Environment defaults < task "observation" block < per-assessment overrides."""
+    config = EncodingConfig.from_env()
+    if task and task.get("observation"):
+        config = config.merged(task["observation"])
+    return config.merged(overrides)
+
+
+class EncodedFrame:
+    """An encoded observation frame and its mapping back to the screen."""
+
+    def __init__(
+        self,
+        data: bytes,
+        mime: str,
+        size: Tuple[int, int],
+        scale: Tuple[float, float] = (1.0, 1.0),
+        offset: Tuple[int, int] = (0, 0),
+    ):
+        self.data = data
+        self.mime = mime
+        self.width, self.height = size
+        self.scale_x, self.scale_y = scale
+        self.offset_x, self.offset_y = offset
+
+    def to_screen(self, x: float, y: float) -> Tuple[int, int]:
+        """Map a point in encoded-image coordinates back to screen pixels."""
+        return (
+            int(round(x / self.scale_x + self.offset_x)),
+            int(round(y / self.scale_y + self.offset_y)),
+        )
+
+    @property
+    def identity(self) -> bool:
+        """True when encoded-image coordinates are screen coordinates."""
+        return (self.scale_x, self.scale_y, self.offset_x, self.offset_y) == (1.0, 1.0, 0, 0)
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "mime": self.mime,
+            "width": self.width,
+            "height": self.height,
+            "scale_x": self.scale_x,
+            "scale_y": self.scale_y,
+            "offset_x": self.offset_x,
+            "offset_y": self.offset_y,
+        }
+
+
+def encode_frame(
+    png_bytes: bytes,
+    config: EncodingConfig,
+    crop_box: Optional[Tuple[int, int, int, int]] = None,
+) -> EncodedFrame:
+    """
+    Encode a raw PNG screenshot according to config.
+
+    Args:
+        png_bytes: Screenshot as returned by the VM
+        config: Encoding configuration
+        crop_box: (x, y, w, h) region to keep; overrides config.crop (used
+            for "active_window", which must be resolved per step)
+    """
+    if config.passthrough and crop_box is None:
+        with Image.open(io.BytesIO(png_bytes)) as img:
+            return EncodedFrame(png_bytes, "image/png", img.size)
+
+    img = Image.open(io.BytesIO(png_bytes))
+    offset = (0, 0)
+    box = crop_box
+    if box is None and isinstance(config.crop, (list, tuple)):
+        box = tuple(int(v) for v in config.crop)
+    if box is not None:
+        x, y, w, h = box
+        x, y = max(0, x), max(0, y)
+        w, h = min(w, img.width - x), min(h, img.height - y)
+        if w > 0 and h > 0:
+            img = img.crop((x, y, x + w, y + h))
+            offset = (x, y)
+
+    scale = 1.0
+    if config.max_width and img.width > config.max_width:
+        scale = min(scale, config.max_width / img.width)
+    if config.max_height and img.height > config.max_height:
+        scale = min(scale, config.max_height / img.height)
+    if scale < 1.0:
+        img = img.resize(
+            (max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+            Image.LANCZOS,
+        )
+
+    if config.grayscale:
+        img = img.convert("L")
+    elif config.codec == "jpeg" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    fmt, mime = CODECS[config.codec]
+    buf = io.BytesIO()
+    if config.codec == "png":
+        img.save(buf, format=fmt, optimize=False)
+    else:
+        img.save(buf, format=fmt, quality=config.quality)
+
+    return EncodedFrame(buf.getvalue(), mime, img.size, (scale, scale), offset)
+
+
+def parse_window_geometry(output: str) -> Optional[Tuple[int, int, int, int]]:
+    """Parse `xdotool getwindowgeometry --shell` output into (x, y, w, h)."""
+    values = {}
+    for line in output.splitlines():
+        key, _, value = line.partition("=")
+        if value.strip().lstrip("-").isdigit():
+            values[key.strip()] = int(value.strip())
+    try:
+        return values["X"], values["Y"], values["WIDTH"], values["HEIGHT"]
+    except KeyError:
+        return None
+
+
+ACTIVE_WINDOW_COMMAND = ["xdotool", "getactivewindow", "getwindowgeometry", "--shell"]
+
+
+async def active_window_box(client) -> Optional[Tuple[int, int, int, int]]:
+    """Geometry of the focused window on the VM, or None if unavailable."""
+    try:
+        result = await client.execute(ACTIVE_WINDOW_COMMAND, timeout=5)
+        return parse_window_geometry(result.get("output", ""))
+    except Exception as e:
+        logger.debug(f"Active window lookup failed: {e}")
+        return None
+
+
+def _has_numeric_args(code: str) -> bool:
+    """True if a verbatim call passes any number (which may be a coordinate)."""
+    try:
+        tree = ast.parse(code, mode="eval")
+    except SyntaxError:
+        return True
+    return any(
+        isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+        for node in ast.walk(tree)
+    )
+
+
+def map_action_coords(actions: List[Any], frame: Optional[EncodedFrame]) -> List[Dict[str, Any]]:
+    """
+    Copy {"op", "args"} actions with x/y mapped from encoded-image to screen space.
+
+    Raises:
+        ValueError: A verbatim ("raw") call passes numbers while the frame is
+            scaled or cropped; its coordinates cannot be mapped, so it is not run
+    """
+    from .actions import action_dicts
+
+    mapped = action_dicts(actions)
+    if frame is None:
+        return mapped
+    for action in mapped:
+        args = action["args"]
+        if action["op"] == "raw":
+            if not frame.identity and _has_numeric_args(str(args.get("code", ""))):
+                raise ValueError(f"Cannot map coordinates of a verbatim call on a transformed frame: {args.get('code')}")
+        elif args.get("x") is not None and args.get("y") is not None:
+            args["x"], args["y"] = frame.to_screen(args["x"], args["y"])
+    return mapped
@@ -1,6 +1,8 @@
-import os, time, base64, io, uuid, json, sys, subprocess, glob, logging
+import os, time, io, uuid, json, sys, subprocess, glob, logging, asyncio
 from typing import Dict, Any, Generator
 from PIL import Image, ImageDraw, ImageFont
+from .artifacts import ArtifactWriter
+from .timeline import StepTimer, action_record
 
 logger = logging.getLogger(__name__)
 
@@ -19,13 +21,19 @@ OSWORLD_MAX_STEPS = int(
 )
 OSWORLD_SLEEP_AFTER_EXEC = int(os.environ.get("OSWORLD_SLEEP_AFTER_EXECUTION", 3))
 OSWORLD_RESULT_SUBDIR = os.environ.get("OSWORLD_RESULT_SUBDIR", "osworld")
+OSWORLD_PERSISTENT_EXECUTOR = os.environ.get("OSWORLD_PERSISTENT_EXECUTOR", "0") == "1"
+# Frame diffing between steps: off, flag (mark unchanged observations), tiles (send changed tiles only)
+OSWORLD_FRAME_DELTA = os.environ.get("OSWORLD_FRAME_DELTA", "flag")
+OSWORLD_TILE_DELTA_MAX_RATIO = float(os.environ.get("OSWORLD_TILE_DELTA_MAX_RATIO", 0.5))
+# In tiles mode, send a full frame every N steps regardless (0 = never)
+OSWORLD_TILE_KEYFRAME_INTERVAL = int(os.environ.get("OSWORLD_TILE_KEYFRAME_INTERVAL", 10))
 
 
 # --- Fake runner simulates an OS desktop and task progression ---
-def _png_b64(img: Image.Image) -> str:
+def _png_bytes(img: Image.Image) -> bytes:
     buf = io.BytesIO()
     img.save(buf, format="PNG")
-    return base64.b64encode(buf.getvalue()).decode("ascii")
+    return buf.getvalue()
 
 
 def _fake_frames(hints: list[str]) -> Generator[Dict[str, Any], None, None]:
@@ -37,43 +45,47 @@ def _fake_frames(hints: list[str]) -> Generator[Dict[str, Any], None, None]:
         drw.text((60, H - 110), "Writer", fill=(10, 10, 10))
         drw.text((40, 40), f"Step {i}", fill=(0, 0, 0))
         hint = hints[min(i - 1, len(hints) - 1)] if hints else None
-        yield {"frame_id": i, "png": _png_b64(img), "hint": hint, "done": i == steps}
+        yield {"frame_id": i, "png": _png_bytes(img), "hint": hint, "done": i == steps}
 
 
 def run_osworld_like(
-    task: Dict[str, Any], white_decide, artifacts_dir: str | None = None
+    task: Dict[str, Any], white_decide, artifacts_dir: str | None = None, record_step=None
 ) -> Dict[str, Any]:
     """Fake OSWorld loop: emit frames, ask white agent for actions, mark success at the end."""
     t0 = time.time()
     steps = 0
     failure = None
-    frames_dir = None
-    if artifacts_dir:
-        frames_dir = os.path.join(artifacts_dir, "frames")
-        os.makedirs(frames_dir, exist_ok=True)
+    writer = ArtifactWriter(artifacts_dir) if artifacts_dir else None
+    mark = time.perf_counter()
     for fr in _fake_frames(task.get("hints", [])):
+        timer = StepTimer()
+        # Rendering the fake frame stands in for the screenshot
+        timer.add("capture", time.perf_counter() - mark)
         obs = {
             "frame_id": fr["frame_id"],
-            "image_png_b64": fr["png"],
+            "image_bytes": fr["png"],
             "ui_hint": fr.get("hint"),
             "done": False,
         }
-        # Save frame artifact if requested
-        if frames_dir:
-            try:
-                with open(
-                    os.path.join(frames_dir, f"{fr['frame_id']:04d}.png"), "wb"
-                ) as fh:
-                    fh.write(base64.b64decode(fr["png"]))
-            except Exception:
-                # Artifacts are best-effort in MVP
-                pass
+        # Save frame artifact if requested (best-effort, written in the background)
+        if writer:
+            with timer.phase("artifact"):
+                writer.write(f"frames/{fr['frame_id']:04d}.png", fr["png"])
         try:
-            _ = white_decide(obs)  # we ignore the action in fake mode
+            with timer.phase("decide"):
+                action = white_decide(obs)  # the action is not executed in fake mode
         except Exception as e:
             failure = f"white_decide_error: {e}"
+            if record_step:
+                record_step(fr["frame_id"], "error", {"error": str(e)}, 0, timer.to_dict())
             break
+        if record_step:
+            op, args = action_record(action or {})
+            record_step(fr["frame_id"], op, args, 1, timer.to_dict())
         steps += 1
+        mark = time.perf_counter()
+    if writer:
+        writer.close()
     done = failure is None
     dt = time.time() - t0
     return {
@@ -86,136 +98,348 @@ def run_osworld_like(
 
 
 # --- Native OSWorld adapter (REST API) ---
+async def _none():
+    return None
+
+
+def _replay_recorder(writer):
+    """Recorder for the screenshot stream: every distinct frame plus an index."""
+
+    def record(frame: bytes, seq: int, captured_at: float):
+        # Best effort: replay frames are dropped rather than stalling the feed
+        name = f"{seq:06d}.png"
+        if writer.write(f"replay/{name}", frame, wait=False):
+            entry = json.dumps({"seq": seq, "file": name, "captured_at": captured_at}) + "\n"
+            writer.write("replay/index.jsonl", entry.encode(), append=True, wait=False)
+
+    return record
+
+
 def run_osworld_native(
     task: Dict[str, Any],
     white_decide,
     artifacts_dir: str | None = None,
-    white_agent_url: str | None = None
+    white_agent_url: str | None = None,
+    encoding=None,
+    record_step=None,
 ) -> Dict[str, Any]:
     """
     Run OSWorld assessment using native REST API (port 5000).
 
+    Blocking wrapper around run_osworld_native_async for thread-based callers
+    (the assessment job queue, scripts).
+
     Args:
         task: Task dictionary with 'instruction' and 'id'
         white_decide: Callback function(obs) -> action
         artifacts_dir: Directory to save screenshots
         white_agent_url: URL of White Agent (unused, kept for compatibility)
+        encoding: EncodingConfig for observations (default: env + task settings)
+        record_step: Optional callback(step, op, args, ok, timings) per step
 
     Returns:
         Dictionary with success, steps, time_sec, etc.
     """
-    from .osworld_client import OSWorldClient, create_observation
+    return asyncio.run(
+        run_osworld_native_async(
+            task, white_decide, artifacts_dir, white_agent_url,
+            encoding=encoding, record_step=record_step,
+        )
+    )
 
-    logger.info(f"Starting native OSWorld for task: {task.get('id', 'unknown')}")
-    logger.info(f"OSWorld server: {OSWORLD_SERVER_URL}")
 
-    # Connect to OSWorld server
-    client = OSWorldClient(base_url=OSWORLD_SERVER_URL)
+async def run_osworld_native_async(
+    task: Dict[str, Any],
+    white_decide,
+    artifacts_dir: str | None = None,
+    white_agent_url: str | None = None,
+    http_client=None,
+    encoding=None,
+    record_step=None,
+) -> Dict[str, Any]:
+    """
+    Run OSWorld assessment using native REST API on the current event loop.
+
+    Several runs can share one loop (and one connection pool via http_client)
+    without a thread per VM. A blocking white_decide callback is run in a
+    worker thread so it does not stall other runs on the loop; a coroutine
+    function (such as AsyncWhiteClient.decide) is awaited directly.
 
-    # Health check
-    if not client.health_check():
+    Args:
+        task: Task dictionary with 'instruction' and 'id'
+        white_decide: Callback function(obs) -> action
+        artifacts_dir: Directory to save screenshots
+        white_agent_url: URL of White Agent (unused, kept for compatibility)
+        http_client: Shared httpx.AsyncClient from create_async_http_client()
+        encoding: EncodingConfig for observations (default: env + task settings).
+            Coordinates in the agent's actions are mapped back through the
+            encoded frame's scale and crop offset.
+        record_step: Optional callback(step, op, args, ok, timings) called
+            once per step with the action, its outcome and phase timings
+            (see timeline); storage.record_action fits it.
+
+    Returns:
+        Dictionary with success, steps, time_sec, etc.
+    """
+    from .osworld_client import AsyncOSWorldClient, create_observation_async
+    from .action_parser import parse_many
+    from .frame_diff import FrameDiffer
+    from .settle import OSWORLD_SETTLE_MODE, wait_for_settle_async
+    from .screen_stream import OSWORLD_SCREENSHOT_STREAM
+    from .obs_encoding import resolve_config, encode_frame, active_window_box, map_action_coords
+    from .vm_pool import get_pool, NoVMAvailableError
+
+    logger.info(f"Starting native OSWorld for task: {task.get('id', 'unknown')}")
+
+    # Lease an exclusive VM from the pool (health-checked before it is handed out)
+    pool = get_pool()
+    try:
+        lease = await asyncio.to_thread(pool.acquire, task.get("domain"))
+    except NoVMAvailableError as e:
         return {
             "success": 0,
             "steps": 0,
             "time_sec": 0.0,
-            "failure_reason": f"OSWorld server at {OSWORLD_SERVER_URL} is not responding",
+            "failure_reason": str(e),
             "artifacts": {}
         }
 
-    logger.info("OSWorld server health check passed")
+    logger.info(f"OSWorld server: {lease.url}")
+
+    # Connect to OSWorld server
+    client = AsyncOSWorldClient(base_url=lease.url, http_client=http_client)
 
-    # Create artifacts directory
+    # Artifacts are written by a background writer, off the step loop
     if artifacts_dir:
         frames_dir = os.path.join(artifacts_dir, "frames")
-        os.makedirs(frames_dir, exist_ok=True)
+        writer = ArtifactWriter(artifacts_dir)
     else:
         frames_dir = None
+        writer = None
 
     t0 = time.time()
     steps = 0
     failure = None
     max_steps = OSWORLD_MAX_STEPS
+    differ = FrameDiffer() if OSWORLD_FRAME_DELTA != "off" else None
+    stream = None
+    encoding = encoding or resolve_config(task)
+    next_obs = None
 
     try:
         # Initial screenshot to verify display is working
-        initial_screenshot = client.screenshot()
+        initial_screenshot = await client.screenshot()
         logger.info(f"Initial screenshot: {len(initial_screenshot)} bytes")
-
-        # Main interaction loop
-        for step in range(1, max_steps + 1):
-            logger.info(f"Step {step}/{max_steps}")
-
-            # Get observation from OSWorld
-            include_a11y = OSWORLD_OBS_TYPE in ["a11y_tree", "screenshot_a11y_tree"]
-            obs_obj = create_observation(client, include_a11y=include_a11y)
-
-            # Save screenshot artifact
-            if frames_dir:
-                try:
-                    screenshot_bytes = base64.b64decode(obs_obj.screenshot_b64)
-                    screenshot_path = os.path.join(frames_dir, f"step_{step:04d}.png")
-                    with open(screenshot_path, "wb") as f:
-                        f.write(screenshot_bytes)
-                    logger.debug(f"Saved screenshot: {screenshot_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to save screenshot: {e}")
-
-            # Prepare observation for white agent
+        last_action_at = time.time()
+
+        if OSWORLD_SCREENSHOT_STREAM:
+            # Keep the latest frame local and record every distinct frame for replay
+            recorder = _replay_recorder(writer) if writer else None
+            stream = client.screenshot_stream(recorder=recorder)
+            await stream.start()
+
+        if OSWORLD_PERSISTENT_EXECUTOR:
+            # Keep pyautogui loaded on the VM; falls back to /run_python if unavailable
+            await client.start_action_executor()
+
+        include_a11y = OSWORLD_OBS_TYPE in ["a11y_tree", "screenshot_a11y_tree"]
+
+        async def prepare(step: int, settle_kind, after: float):
+            """Wait for the UI, capture, diff and encode the observation for step."""
+            timer = StepTimer()
+            frame_bytes = None
+            # Give the UI time to update
+            if settle_kind is not None:
+                with timer.phase("settle"):
+                    if OSWORLD_SETTLE_MODE == "adaptive":
+                        settled = await wait_for_settle_async(stream or client, settle_kind)
+                        logger.debug(f"Settle wait: {settled.to_dict()}")
+                        # The settled frame is the current screen; reuse it as the observation
+                        frame_bytes = settled.last_frame
+                    elif OSWORLD_SLEEP_AFTER_EXEC > 0:
+                        await asyncio.sleep(OSWORLD_SLEEP_AFTER_EXEC)
+
+            with timer.phase("capture"):
+                if frame_bytes is None and stream is not None:
+                    # Latest frame from the feed that postdates the last action
+                    frame_bytes = await stream.frame_after(after)
+
+                observe = create_observation_async(
+                    client,
+                    include_a11y=include_a11y,
+                    screen_size=lease.screen_size,
+                    screenshot=frame_bytes,
+                )
+                if encoding.crop == "active_window":
+                    obs_obj, crop_box = await asyncio.gather(observe, active_window_box(client))
+                else:
+                    obs_obj, crop_box = await observe, None
+            # Screen size never changes during a run; cache it on the lease
+            lease.screen_size = obs_obj.screen_size
+            logger.debug(f"Observation timings: {obs_obj.timings}")
+
+            # Frame diff and encoding both only read the screenshot: run them side by side.
+            # The encoding stage keeps the scale and offset needed to map the agent's
+            # coordinates back to the screen.
+            reencoded = not (encoding.passthrough and crop_box is None)
+            diff_job = (
+                asyncio.to_thread(differ.diff, obs_obj.screenshot_bytes, step)
+                if differ is not None else _none()
+            )
+            encode_job = (
+                asyncio.to_thread(encode_frame, obs_obj.screenshot_bytes, encoding, crop_box)
+                if reencoded else _none()
+            )
+            with timer.phase("encode"):
+                delta, frame = await asyncio.gather(diff_job, encode_job)
+                if frame is None:
+                    frame = encode_frame(obs_obj.screenshot_bytes, encoding)
+
+            # Observation for the white agent (raw bytes; WhiteClient
+            # base64-encodes them only for JSON-only agents)
             obs_for_white = {
                 "frame_id": step,
-                "image_png_b64": obs_obj.screenshot_b64,
+                "image_bytes": frame.data,
                 "instruction": task.get("instruction", ""),
                 "done": False,
             }
+            if reencoded:
+                obs_for_white["image_mime"] = frame.mime
+                obs_for_white["image_transform"] = frame.meta()
+            if delta is not None:
+                logger.debug(f"Frame delta: {delta.to_dict()}")
+                obs_for_white["unchanged"] = delta.unchanged
+                obs_for_white["prev_frame_id"] = delta.prev_frame_id
+                if (
+                    OSWORLD_FRAME_DELTA == "tiles"
+                    and not reencoded
+                    and delta.prev_frame_id is not None
+                    and delta.changed_ratio <= OSWORLD_TILE_DELTA_MAX_RATIO
+                    and not (OSWORLD_TILE_KEYFRAME_INTERVAL and step % OSWORLD_TILE_KEYFRAME_INTERVAL == 0)
+                ):
+                    # Previous frame + changed tiles instead of the full screenshot
+                    obs_for_white["image_bytes"] = b""
+                    with timer.phase("encode"):
+                        obs_for_white["tiles"] = await asyncio.to_thread(differ.tile_payload, delta)
+            return obs_obj, frame, obs_for_white, timer
+
+        # Main interaction loop. The next observation is prepared in a task
+        # started as soon as the action returns, while the loop finishes the
+        # step's bookkeeping; artifact writes are queued to the writer thread
+        # and overlap with the white agent's decision.
+        next_obs = asyncio.create_task(prepare(1, None, last_action_at))
+        for step in range(1, max_steps + 1):
+            logger.info(f"Step {step}/{max_steps}")
+
+            waited = time.perf_counter()
+            obs_obj, frame, obs_for_white, timer = await next_obs
+            timer.add("obs_wait", time.perf_counter() - waited)
+            next_obs = None
+
+            # Save screenshot artifact (raw PNG as received from the VM)
+            if writer:
+                with timer.phase("artifact"):
+                    await writer.write_async(f"frames/step_{step:04d}.png", obs_obj.screenshot_bytes)
 
             # Get action from white agent
             try:
-                action = white_decide(obs_for_white)
+                with timer.phase("decide"):
+                    if asyncio.iscoroutinefunction(white_decide):
+                        # e.g. AsyncWhiteClient.decide: no worker thread needed
+                        action = await white_decide(obs_for_white)
+                    else:
+                        action = await asyncio.to_thread(white_decide, obs_for_white)
                 logger.info(f"White agent action: {action.get('action_type', 'unknown')}")
             except Exception as e:
                 failure = f"white_agent_error: {e}"
                 logger.error(f"White agent error: {e}")
+                if record_step:
+                    record_step(step, "error", {"error": str(e)}, 0, timer.to_dict())
                 break
 
             # Execute action in OSWorld
             action_type = action.get("action_type", "")
+            settle_kind = action_type
+            outcome = None
+            ok = True
+            executing = time.perf_counter()
 
             if action_type == "DONE":
                 logger.info("White agent signaled DONE")
+                if record_step:
+                    record_step(step, "DONE", {}, 1, timer.to_dict())
                 break
             elif action_type == "execute":
                 # Execute shell command
                 command = action.get("command", "")
                 if command:
                     try:
-                        result = client.execute(command, shell=True)
-                        logger.info(f"Executed: {command}, result: {result.get('status')}")
+                        result = await client.execute(command, shell=True)
+                        outcome = f"Executed: {command}, result: {result.get('status')}"
                     except Exception as e:
+                        ok = False
                         logger.warning(f"Execute failed: {e}")
             elif action_type == "click":
                 # Click at coordinates
-                x = action.get("x", 0)
-                y = action.get("y", 0)
+                x, y = frame.to_screen(action.get("x", 0), action.get("y", 0))
                 try:
-                    client.click_at(x, y)
-                    logger.info(f"Clicked at ({x}, {y})")
+                    await client.click_at(x, y)
+                    outcome = f"Clicked at ({x}, {y})"
                 except Exception as e:
+                    ok = False
                     logger.warning(f"Click failed: {e}")
             elif action_type == "type":
                 # Type text
                 text = action.get("text", "")
                 if text:
                     try:
-                        client.type_text(text)
-                        logger.info(f"Typed: {text[:50]}")
+                        await client.type_text(text)
+                        outcome = f"Typed: {text[:50]}"
                     except Exception as e:
+                        ok = False
                         logger.warning(f"Type failed: {e}")
+            elif action_type == "pyautogui":
+                # Raw pyautogui code (string or list of strings) from the agent
+                code = action.get("code", "")
+                parsed = parse_many([code] if isinstance(code, str) else code)
+                if parsed.actions:
+                    settle_kind = parsed.actions[-1].op
+                for source in parsed.unparsed:
+                    logger.warning(f"Unsupported pyautogui statement (not executed): {source}")
+                try:
+                    results = await client.run_actions(map_action_coords(parsed.actions, frame))
+                    n_ok = sum(1 for r in results if r.get("ok"))
+                    ok = n_ok == len(parsed.actions) and not parsed.unparsed
+                    outcome = f"Executed pyautogui: {n_ok}/{len(parsed.actions)} actions ok"
+                except Exception as e:
+                    ok = False
+                    logger.warning(f"pyautogui execution failed: {e}")
+            elif action_type == "batch":
+                # Several {"op", "args"} actions in one /run_python round trip
+                batch = action.get("actions", [])
+                if batch:
+                    settle_kind = batch[-1].get("op")
+                try:
+                    results = await client.run_actions(map_action_coords(batch, frame))
+                    n_ok = sum(1 for r in results if r.get("ok"))
+                    ok = n_ok == len(batch)
+                    outcome = f"Executed batch: {n_ok}/{len(batch)} actions ok"
+                except Exception as e:
+                    ok = False
+                    logger.warning(f"Batch failed: {e}")
 
-            steps += 1
+            timer.add("execute", time.perf_counter() - executing)
+            last_action_at = time.time()
+            if step < max_steps:
+                # Start settling and capturing the next observation right away
+                next_obs = asyncio.create_task(prepare(step + 1, settle_kind, last_action_at))
 
-            # Sleep after execution (give UI time to update)
-            if OSWORLD_SLEEP_AFTER_EXEC > 0:
-                time.sleep(OSWORLD_SLEEP_AFTER_EXEC)
+            steps += 1
+            if outcome:
+                logger.info(outcome)
+            if record_step:
+                op, args = action_record(action)
+                record_step(step, op, args, int(ok), timer.to_dict())
 
         # Check if task was successful (simplified - would need actual evaluation)
         success = 1 if failure is None and steps > 0 else 0
@@ -225,7 +449,17 @@ def run_osworld_native(
         failure = f"native_osworld_error: {e}"
         success = 0
     finally:
-        client.close()
+        if next_obs is not None:
+            next_obs.cancel()
+            await asyncio.gather(next_obs, return_exceptions=True)
+        if stream is not None:
+            await stream.stop()
+            logger.info(f"Screenshot stream: {stream.stats()}")
+        if writer:
+            await asyncio.to_thread(writer.close)
+            logger.info(f"Artifact writer: {writer.stats()}")
+        await client.close()
+        await asyncio.to_thread(pool.release, lease)
 
     dt = time.time() - t0
 
@@ -236,7 +470,8 @@ def run_osworld_native(
         "steps": steps,
         "time_sec": round(dt, 3),
         "failure_reason": failure,
-        "artifacts": {"frames_dir": frames_dir} if frames_dir else {}
+        "artifacts": {"frames_dir": frames_dir, "writer": writer.stats()} if writer else {},
+        "osworld_url": lease.url,
     }
 
 
@@ -268,11 +503,62 @@ def _parse_basic_result(result_dir: str, rc: int, t0: float) -> Dict[str, Any]:
     }
 
 
+def _parse_osworld_timestamp(value) -> float | None:
+    from datetime import datetime
+
+    for fmt in ("%Y%m%d@%H%M%S%f", "%Y%m%d@%H%M%S"):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _record_trajectory(result_dir: str, record_step) -> None:
+    """
+    Record the steps OSWorld's runner logged to traj.jsonl.
+
+    The legacy runner drives the loop inside OSWorld, so only whole-step
+    durations (from consecutive action timestamps) are available.
+    """
+    path = os.path.join(result_dir, "traj.jsonl")
+    if record_step is None or not os.path.exists(path):
+        return
+    prev = None
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            ts = _parse_osworld_timestamp(entry.get("action_timestamp"))
+            timings = {"step": round(ts - prev, 4)} if ts is not None and prev is not None else {}
+            prev = ts
+            action = entry.get("action")
+            if isinstance(action, dict):
+                op, args = action_record(action)
+            else:
+                op, args = "pyautogui", {"code": action}
+            record_step(int(entry.get("step_num", 0)), op, args, 0 if entry.get("Error") else 1, timings)
+
+
+def max_steps_for(task: Dict[str, Any]) -> int:
+    """Step budget the active runner will use for a task (for progress reporting)."""
+    if USE_FAKE:
+        return min(10, MAX_STEPS)
+    if USE_NATIVE or OSWORLD_PROVIDER == "native":
+        return OSWORLD_MAX_STEPS
+    return int(task.get("constraints", {}).get("max_steps", OSWORLD_MAX_STEPS))
+
+
 def run_osworld(
     task: Dict[str, Any],
     white_decide,
     artifacts_dir: str | None = None,
-    white_agent_url: str | None = None
+    white_agent_url: str | None = None,
+    encoding=None,
+    record_step=None,
+    on_step=None,
 ) -> Dict[str, Any]:
     """
     Run OSWorld assessment with White Agent.
@@ -282,6 +568,11 @@ def run_osworld(
         white_decide: Callback function (unused in real mode, kept for compatibility)
         artifacts_dir: Directory to save artifacts
         white_agent_url: URL of White Agent HTTP API (required for Docker mode)
+        encoding: Observation EncodingConfig (native mode only)
+        record_step: Optional callback(step, op, args, ok, timings) per step
+        on_step: Optional callback() as each step starts, for live progress in
+            Docker mode, where the agent is driven without white_decide (the
+            other modes report progress through white_decide)
 
     Returns:
         Dictionary with assessment results
@@ -293,11 +584,14 @@ def run_osworld(
 
     if USE_FAKE:
         logger.info("Using FAKE OSWorld mode")
-        return run_osworld_like(task, white_decide, artifacts_dir)
+        return run_osworld_like(task, white_decide, artifacts_dir, record_step=record_step)
 
     if USE_NATIVE or OSWORLD_PROVIDER == "native":
         logger.info("Using NATIVE OSWorld mode (REST API)")
-        return run_osworld_native(task, white_decide, artifacts_dir, white_agent_url)
+        return run_osworld_native(
+            task, white_decide, artifacts_dir, white_agent_url,
+            encoding=encoding, record_step=record_step,
+        )
 
     # Real OSWorld path: use OSWorld as a library
     # Use absolute path relative to this file's location
@@ -354,6 +648,15 @@ def run_osworld(
             action_space="pyautogui",
             platform="ubuntu"
         )
+        if on_step is not None:
+            # lib_run_single asks the agent once per step
+            predict = agent.predict
+
+            def predict_and_count(*args, **kwargs):
+                on_step()
+                return predict(*args, **kwargs)
+
+            agent.predict = predict_and_count
 
         # Create OSWorld environment
         env = DesktopEnv(
@@ -397,6 +700,7 @@ def run_osworld(
 
         # Clean up environment
         env.close()
+        _record_trajectory(result_dir, record_step)
 
         # Parse results
         dt = time.time() - t0
@@ -426,6 +730,10 @@ def run_osworld(
                 log_f.write(f"Full traceback:\n{full_traceback}\n")
         except Exception:
             pass
+        try:
+            _record_trajectory(result_dir, record_step)
+        except Exception as record_error:
+            logger.warning(f"Could not record OSWorld trajectory: {record_error}")
 
         return {
             "success": 0,
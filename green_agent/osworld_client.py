@@ -5,12 +5,68 @@ This client communicates with the OSWorld server running natively on GCE VMs
 via the REST API on port 5000.
 """
 
+import os
+import time
+import asyncio
+import logging
 import requests
+import httpx
 import base64
 from typing import Dict, Any, Optional, List
 from io import BytesIO
 from PIL import Image
 
+from .actions import compile_batch, parse_batch_result, action_dicts
+from .screen_stream import AsyncScreenshotStream, ScreenshotStream
+from .vm_executor import (
+    OSWORLD_EXECUTOR_PORT,
+    ActionExecutorSession,
+    AsyncActionExecutorSession,
+    ExecutorReplyError,
+    ExecutorSendError,
+    bootstrap_command,
+    executor_host,
+    results_to_response,
+    stop_command,
+    unconfirmed_results,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# --- pyautogui script builders shared by the sync and async clients ---
+def _type_text_code(text: str) -> str:
+    # Escape single quotes in text
+    escaped_text = text.replace("'", "\\'")
+    return f"import pyautogui\npyautogui.write('{escaped_text}')"
+
+
+def _mouse_move_code(x: int, y: int) -> str:
+    return f"import pyautogui\npyautogui.moveTo({x}, {y})"
+
+
+def _click_code(x: Optional[int], y: Optional[int]) -> str:
+    if x is None or y is None:
+        return "import pyautogui\npyautogui.click()"
+    return f"import pyautogui\npyautogui.click({x}, {y})"
+
+
+def _double_click_code(x: int, y: int) -> str:
+    return f"import pyautogui\npyautogui.doubleClick({x}, {y})"
+
+
+def _right_click_code(x: int, y: int) -> str:
+    return f"import pyautogui\npyautogui.rightClick({x}, {y})"
+
+
+def _press_key_code(key: str) -> str:
+    return f"import pyautogui\npyautogui.press('{key}')"
+
+
+def _hotkey_code(*keys: str) -> str:
+    keys_str = ", ".join([f"'{k}'" for k in keys])
+    return f"import pyautogui\npyautogui.hotkey({keys_str})"
+
 
 class OSWorldClient:
     """Client for OSWorld native REST API (port 5000)"""
@@ -24,6 +80,11 @@ class OSWorldClient:
         """
         self.base_url = base_url.rstrip("/")
         self._session = requests.Session()
+        self._executor: Optional[ActionExecutorSession] = None
+
+    def screenshot_stream(self, **kwargs) -> "ScreenshotStream":
+        """Background frame feed for this VM (see green_agent.screen_stream)."""
+        return ScreenshotStream(self, **kwargs)
 
     def health_check(self) -> bool:
         """
@@ -193,10 +254,7 @@ class OSWorldClient:
         Returns:
             Execution result
         """
-        # Escape single quotes in text
-        escaped_text = text.replace("'", "\\'")
-        code = f"import pyautogui\npyautogui.write('{escaped_text}')"
-        return self.run_python(code)
+        return self._act("type", {"text": text}, _type_text_code(text))
 
     def mouse_move(self, x: int, y: int) -> Dict[str, Any]:
         """
@@ -209,8 +267,7 @@ class OSWorldClient:
         Returns:
             Execution result
         """
-        code = f"import pyautogui\npyautogui.moveTo({x}, {y})"
-        return self.run_python(code)
+        return self._act("move", {"x": x, "y": y}, _mouse_move_code(x, y))
 
     def click_at(self, x: int, y: int) -> Dict[str, Any]:
         """
@@ -223,11 +280,7 @@ class OSWorldClient:
         Returns:
             Execution result
         """
-        if x is None or y is None:
-            code = "import pyautogui\npyautogui.click()"
-        else:
-            code = f"import pyautogui\npyautogui.click({x}, {y})"
-        return self.run_python(code)
+        return self._act("click", {"x": x, "y": y}, _click_code(x, y))
 
     def double_click_at(self, x: int, y: int) -> Dict[str, Any]:
         """
@@ -240,8 +293,7 @@ class OSWorldClient:
         Returns:
             Execution result
         """
-        code = f"import pyautogui\npyautogui.doubleClick({x}, {y})"
-        return self.run_python(code)
+        return self._act("double_click", {"x": x, "y": y}, _double_click_code(x, y))
 
     def right_click_at(self, x: int, y: int) -> Dict[str, Any]:
         """
@@ -254,8 +306,7 @@ class OSWorldClient:
         Returns:
             Execution result
         """
-        code = f"import pyautogui\npyautogui.rightClick({x}, {y})"
-        return self.run_python(code)
+        return self._act("right_click", {"x": x, "y": y}, _right_click_code(x, y))
 
     def press_key(self, key: str) -> Dict[str, Any]:
         """
@@ -267,8 +318,7 @@ class OSWorldClient:
         Returns:
             Execution result
         """
-        code = f"import pyautogui\npyautogui.press('{key}')"
-        return self.run_python(code)
+        return self._act("press", {"key": key}, _press_key_code(key))
 
     def hotkey(self, *keys: str) -> Dict[str, Any]:
         """
@@ -280,10 +330,94 @@ class OSWorldClient:
         Returns:
             Execution result
         """
-        keys_str = ", ".join([f"'{k}'" for k in keys])
-        code = f"import pyautogui\npyautogui.hotkey({keys_str})"
+        return self._act("hotkey", {"keys": list(keys)}, _hotkey_code(*keys))
+
+    def run_actions(self, actions: List[Any], stop_on_error: bool = True) -> List[Dict[str, Any]]:
+        """
+        Execute a list of actions in a single /run_python round trip.
+
+        Args:
+            actions: Actions as {"op": ..., "args": {...}} (see green_agent.actions)
+            stop_on_error: Skip remaining actions after the first failure
+
+        Returns:
+            One result dict per action with 'index', 'op', 'ok' and
+            'time_sec' or 'error'
+        """
+        if not actions:
+            return []
+        if self._executor is not None:
+            messages = action_dicts(actions)
+            try:
+                return self._executor.run_actions(messages, stop_on_error)
+            except ExecutorSendError as e:
+                # Never reached the VM; safe to run through /run_python
+                self._executor_failed(e)
+            except ExecutorReplyError as e:
+                # May already have run; running it again could type or click twice
+                self._executor_failed(e)
+                return unconfirmed_results(messages, e)
+        result = self.run_python(compile_batch(actions, stop_on_error=stop_on_error))
+        return parse_batch_result(result, actions)
+
+    def _act(self, op: str, args: Dict[str, Any], code: str) -> Dict[str, Any]:
+        """Run one action as a typed message if the executor is up, else as a script."""
+        if self._executor is not None:
+            messages = [{"op": op, "args": args}]
+            try:
+                return results_to_response(self._executor.run_actions(messages))
+            except ExecutorSendError as e:
+                self._executor_failed(e)
+            except ExecutorReplyError as e:
+                self._executor_failed(e)
+                return results_to_response(unconfirmed_results(messages, e))
         return self.run_python(code)
 
+    def _executor_failed(self, error: Exception):
+        logger.warning(f"Persistent executor failed ({error}); falling back to /run_python")
+        self._executor.close()
+        self._executor = None
+
+    def start_action_executor(self, port: int = OSWORLD_EXECUTOR_PORT, wait: float = 10.0) -> bool:
+        """
+        Attach to the persistent pyautogui executor on the VM, starting it
+        through /execute if it is not running yet. Once attached, action
+        methods and run_actions send typed messages instead of scripts.
+
+        Args:
+            port: TCP port the executor listens on
+            wait: Seconds to wait for a freshly started executor
+
+        Returns:
+            True if actions now go through the executor
+        """
+        host = executor_host(self.base_url)
+        deadline = time.time() + wait
+        started = False
+        while True:
+            try:
+                session = ActionExecutorSession(host, port)
+                if session.ping():
+                    self._executor = session
+                    logger.info(f"Attached to persistent executor at {host}:{port}")
+                    return True
+                session.close()
+            except (OSError, ExecutorReplyError):
+                pass
+            if not started:
+                try:
+                    # Replace any executor left running with another session token
+                    self.execute(stop_command(), timeout=10)
+                    self.execute(bootstrap_command(port), shell=True, timeout=10)
+                except Exception as e:
+                    logger.warning(f"Could not start persistent executor: {e}")
+                    return False
+                started = True
+            if time.time() >= deadline:
+                logger.warning(f"Persistent executor at {host}:{port} did not come up")
+                return False
+            time.sleep(0.2)
+
     def get_terminal_output(self) -> str:
         """
         Get terminal output (if terminal is open).
@@ -297,9 +431,305 @@ class OSWorldClient:
 
     def close(self):
         """Close the session."""
+        if self._executor is not None:
+            self._executor.close()
+            self._executor = None
         self._session.close()
 
 
+# --- Async client ---
+OSWORLD_HTTP_MAX_CONNECTIONS = int(os.environ.get("OSWORLD_HTTP_MAX_CONNECTIONS", 100))
+OSWORLD_HTTP_MAX_KEEPALIVE = int(os.environ.get("OSWORLD_HTTP_MAX_KEEPALIVE", 20))
+OSWORLD_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("OSWORLD_HTTP_KEEPALIVE_EXPIRY", 30))
+OSWORLD_HTTP2 = os.environ.get("OSWORLD_HTTP2", "0") == "1"
+
+# Per-endpoint request timeouts (seconds). /execute and /run_python keep the
+# timeouts the sync client uses; reads of the desktop state fail fast.
+DEFAULT_TIMEOUTS: Dict[str, float] = {
+    "platform": 5,
+    "screenshot": 30,
+    "execute": 120,
+    "accessibility": 30,
+    "cursor_position": 10,
+    "screen_size": 10,
+    "run_python": 30,
+    "terminal": 10,
+}
+
+
+def create_async_http_client(
+    max_connections: int = OSWORLD_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections: int = OSWORLD_HTTP_MAX_KEEPALIVE,
+    keepalive_expiry: float = OSWORLD_HTTP_KEEPALIVE_EXPIRY,
+    http2: bool = OSWORLD_HTTP2,
+) -> httpx.AsyncClient:
+    """
+    Create a size-limited, keep-alive connection pool that several
+    AsyncOSWorldClient instances (one per VM) can share.
+
+    Args:
+        max_connections: Upper bound on open connections across all VMs
+        max_keepalive_connections: Idle connections kept open for reuse
+        keepalive_expiry: Seconds an idle connection is kept
+        http2: Negotiate HTTP/2 (requires the optional 'h2' package)
+
+    Returns:
+        httpx.AsyncClient; the caller owns it and must close it
+    """
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("OSWORLD_HTTP2=1 but 'h2' is not installed; using HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        http2=http2,
+    )
+
+
+class AsyncOSWorldClient:
+    """
+    Async client for OSWorld native REST API (port 5000).
+
+    Mirrors OSWorldClient method for method, so one event loop can drive many
+    VMs concurrently. Pass a client from create_async_http_client() to share
+    one connection pool across VMs.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:5000",
+        http_client: Optional[httpx.AsyncClient] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Initialize async OSWorld client.
+
+        Args:
+            base_url: Base URL of OSWorld server (e.g., "http://34.10.199.148:5000")
+            http_client: Shared connection pool (a private one is created if omitted)
+            timeouts: Per-endpoint timeout overrides, keyed like DEFAULT_TIMEOUTS
+        """
+        self.base_url = base_url.rstrip("/")
+        self._owns_client = http_client is None
+        self._client = http_client or create_async_http_client()
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self._executor: Optional[AsyncActionExecutorSession] = None
+
+    async def __aenter__(self) -> "AsyncOSWorldClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _get(self, endpoint: str, timeout: Optional[float] = None) -> httpx.Response:
+        response = await self._client.get(
+            f"{self.base_url}/{endpoint}",
+            timeout=timeout or self.timeouts[endpoint],
+        )
+        response.raise_for_status()
+        return response
+
+    async def _post(
+        self, endpoint: str, payload: Dict[str, Any], timeout: Optional[float] = None
+    ) -> httpx.Response:
+        response = await self._client.post(
+            f"{self.base_url}/{endpoint}",
+            json=payload,
+            timeout=timeout or self.timeouts[endpoint],
+        )
+        response.raise_for_status()
+        return response
+
+    def stream_get(self, endpoint: str):
+        """Streaming GET (async context manager) for long-lived responses."""
+        return self._client.stream("GET", f"{self.base_url}/{endpoint}", timeout=None)
+
+    def screenshot_stream(self, **kwargs) -> "AsyncScreenshotStream":
+        """Background frame feed for this VM (see green_agent.screen_stream)."""
+        return AsyncScreenshotStream(self, **kwargs)
+
+    async def health_check(self) -> bool:
+        """Check if OSWorld server is responding."""
+        try:
+            response = await self._client.get(
+                f"{self.base_url}/platform", timeout=self.timeouts["platform"]
+            )
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    async def get_platform(self) -> str:
+        """Get platform information (e.g., "Linux")."""
+        response = await self._get("platform")
+        return response.text.strip()
+
+    async def screenshot(self) -> bytes:
+        """Capture screenshot and return PNG bytes."""
+        response = await self._get("screenshot")
+        return response.content
+
+    async def screenshot_base64(self) -> str:
+        """Capture screenshot and return base64-encoded PNG."""
+        png_bytes = await self.screenshot()
+        return base64.b64encode(png_bytes).decode("ascii")
+
+    async def screenshot_image(self) -> Image.Image:
+        """Capture screenshot and return PIL Image."""
+        png_bytes = await self.screenshot()
+        return Image.open(BytesIO(png_bytes))
+
+    async def execute(
+        self,
+        command: List[str] | str,
+        shell: bool = False,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Execute a command in the desktop environment (see OSWorldClient.execute)."""
+        response = await self._post(
+            "execute", {"command": command, "shell": shell}, timeout=timeout
+        )
+        return response.json()
+
+    async def get_accessibility_tree(self) -> Dict[str, Any]:
+        """Get UI element tree (windows, buttons, text fields, etc.)."""
+        response = await self._get("accessibility")
+        return response.json()
+
+    async def get_cursor_position(self) -> tuple[int, int]:
+        """Get current cursor position as (x, y)."""
+        response = await self._get("cursor_position")
+        data = response.json()
+        return (data[0], data[1])
+
+    async def get_screen_size(self) -> Dict[str, int]:
+        """Get screen dimensions ('width' and 'height')."""
+        response = await self._post("screen_size", {})
+        return response.json()
+
+    async def launch_chrome(self, url: Optional[str] = None) -> Dict[str, Any]:
+        """Launch Google Chrome, optionally opening a URL."""
+        command = ["google-chrome", "--no-sandbox", "--new-window"]
+        if url:
+            command.append(url)
+        return await self.execute(command)
+
+    async def run_python(self, code: str) -> Dict[str, Any]:
+        """Execute Python code on the OSWorld VM."""
+        response = await self._post("run_python", {"code": code})
+        return response.json()
+
+    async def type_text(self, text: str) -> Dict[str, Any]:
+        """Type text using pyautogui."""
+        return await self._act("type", {"text": text}, _type_text_code(text))
+
+    async def mouse_move(self, x: int, y: int) -> Dict[str, Any]:
+        """Move mouse to specific coordinates."""
+        return await self._act("move", {"x": x, "y": y}, _mouse_move_code(x, y))
+
+    async def click_at(self, x: int, y: int) -> Dict[str, Any]:
+        """Click at specific coordinates (None to click at current position)."""
+        return await self._act("click", {"x": x, "y": y}, _click_code(x, y))
+
+    async def double_click_at(self, x: int, y: int) -> Dict[str, Any]:
+        """Double-click at specific coordinates."""
+        return await self._act("double_click", {"x": x, "y": y}, _double_click_code(x, y))
+
+    async def right_click_at(self, x: int, y: int) -> Dict[str, Any]:
+        """Right-click at specific coordinates."""
+        return await self._act("right_click", {"x": x, "y": y}, _right_click_code(x, y))
+
+    async def press_key(self, key: str) -> Dict[str, Any]:
+        """Press a keyboard key."""
+        return await self._act("press", {"key": key}, _press_key_code(key))
+
+    async def hotkey(self, *keys: str) -> Dict[str, Any]:
+        """Press a combination of keys simultaneously."""
+        return await self._act("hotkey", {"keys": list(keys)}, _hotkey_code(*keys))
+
+    async def run_actions(
+        self, actions: List[Any], stop_on_error: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Execute a list of actions in a single /run_python round trip."""
+        if not actions:
+            return []
+        if self._executor is not None:
+            messages = action_dicts(actions)
+            try:
+                return await self._executor.run_actions(messages, stop_on_error)
+            except ExecutorSendError as e:
+                await self._executor_failed(e)
+            except ExecutorReplyError as e:
+                await self._executor_failed(e)
+                return unconfirmed_results(messages, e)
+        result = await self.run_python(compile_batch(actions, stop_on_error=stop_on_error))
+        return parse_batch_result(result, actions)
+
+    async def _act(self, op: str, args: Dict[str, Any], code: str) -> Dict[str, Any]:
+        """Run one action as a typed message if the executor is up, else as a script."""
+        if self._executor is not None:
+            messages = [{"op": op, "args": args}]
+            try:
+                return results_to_response(await self._executor.run_actions(messages))
+            except ExecutorSendError as e:
+                await self._executor_failed(e)
+            except ExecutorReplyError as e:
+                await self._executor_failed(e)
+                return results_to_response(unconfirmed_results(messages, e))
+        return await self.run_python(code)
+
+    async def _executor_failed(self, error: Exception):
+        logger.warning(f"Persistent executor failed ({error!r}); falling back to /run_python")
+        await self._executor.close()
+        self._executor = None
+
+    async def start_action_executor(self, port: int = OSWORLD_EXECUTOR_PORT, wait: float = 10.0) -> bool:
+        """Attach to (starting if needed) the persistent executor; see OSWorldClient."""
+        host = executor_host(self.base_url)
+        deadline = time.time() + wait
+        started = False
+        while True:
+            try:
+                session = await AsyncActionExecutorSession.connect(host, port)
+                if await session.ping():
+                    self._executor = session
+                    logger.info(f"Attached to persistent executor at {host}:{port}")
+                    return True
+                await session.close()
+            except (OSError, ExecutorReplyError, asyncio.TimeoutError):
+                pass
+            if not started:
+                try:
+                    await self.execute(stop_command(), timeout=10)
+                    await self.execute(bootstrap_command(port), shell=True, timeout=10)
+                except Exception as e:
+                    logger.warning(f"Could not start persistent executor: {e}")
+                    return False
+                started = True
+            if time.time() >= deadline:
+                logger.warning(f"Persistent executor at {host}:{port} did not come up")
+                return False
+            await asyncio.sleep(0.2)
+
+    async def get_terminal_output(self) -> str:
+        """Get terminal output (if terminal is open)."""
+        response = await self._get("terminal")
+        return response.text
+
+    async def close(self):
+        """Close the executor channel, and the connection pool if this client created it."""
+        if self._executor is not None:
+            await self._executor.close()
+            self._executor = None
+        if self._owns_client:
+            await self._client.aclose()
+
+
 class OSWorldObservation:
     """
     Observation from OSWorld for the White Agent.
@@ -308,15 +738,28 @@ class OSWorldObservation:
 
     def __init__(
         self,
-        screenshot_b64: str,
+        screenshot_b64: Optional[str],
         accessibility_tree: Optional[Dict[str, Any]] = None,
         cursor_position: Optional[tuple[int, int]] = None,
         screen_size: Optional[Dict[str, int]] = None,
+        timings: Optional[Dict[str, float]] = None,
+        screenshot_bytes: Optional[bytes] = None,
     ):
-        self.screenshot_b64 = screenshot_b64
+        self._screenshot_b64 = screenshot_b64
+        # Raw PNG as received from the VM (when available), to avoid re-decoding
+        self.screenshot_bytes = screenshot_bytes
         self.accessibility_tree = accessibility_tree
         self.cursor_position = cursor_position
         self.screen_size = screen_size
+        # Seconds spent fetching each component (plus "total")
+        self.timings = timings or {}
+
+    @property
+    def screenshot_b64(self) -> str:
+        """Base64 screenshot, encoded on first use (binary transports never need it)."""
+        if self._screenshot_b64 is None:
+            self._screenshot_b64 = base64.b64encode(self.screenshot_bytes or b"").decode("ascii")
+        return self._screenshot_b64
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for White Agent."""
@@ -367,3 +810,79 @@ def create_observation(client: OSWorldClient, include_a11y: bool = False) -> OSW
         cursor_position=cursor_position,
         screen_size=screen_size,
     )
+
+
+
+async def _timed(timings: Dict[str, float], name: str, coro):
+    """Await coro, recording its wall time in timings[name] (seconds)."""
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = round(time.perf_counter() - t0, 4)
+
+
+async def _optional(coro):
+    """Await an optional observation component, yielding None on failure."""
+    try:
+        return await coro
+    except Exception:
+        return None
+
+
+async def create_observation_async(
+    client: AsyncOSWorldClient,
+    include_a11y: bool = False,
+    screen_size: Optional[Dict[str, int]] = None,
+    screenshot: Optional[bytes] = None,
+) -> OSWorldObservation:
+    """
+    Create an observation from an async OSWorld client.
+
+    The screenshot, accessibility tree, cursor position and screen size are
+    requested concurrently, so a step pays one round trip instead of four.
+
+    Args:
+        client: Async OSWorld client
+        include_a11y: Whether to include accessibility tree (slower)
+        screen_size: Known screen size (e.g., cached on the VM lease); skips the request
+        screenshot: Frame captured moments ago (e.g., by the settle wait); skips the request
+
+    Returns:
+        OSWorldObservation object, with per-component timings
+    """
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+
+    async def _screenshot() -> bytes:
+        return screenshot if screenshot is not None else await client.screenshot()
+
+    requests_ = [
+        _timed(timings, "screenshot", _screenshot()),
+        # Cursor position and a11y tree are optional
+        _timed(timings, "cursor_position", _optional(client.get_cursor_position())),
+    ]
+    if include_a11y:
+        requests_.append(
+            _timed(timings, "accessibility_tree", _optional(client.get_accessibility_tree()))
+        )
+    if screen_size is None:
+        requests_.append(_timed(timings, "screen_size", _optional(client.get_screen_size())))
+
+    results = await asyncio.gather(*requests_)
+    screenshot_bytes, cursor_position = results[0], results[1]
+    rest = iter(results[2:])
+    accessibility_tree = next(rest) if include_a11y else None
+    if screen_size is None:
+        screen_size = next(rest)
+
+    timings["total"] = round(time.perf_counter() - t0, 4)
+
+    return OSWorldObservation(
+        screenshot_b64=None,
+        accessibility_tree=accessibility_tree,
+        cursor_position=cursor_position,
+        screen_size=screen_size,
+        timings=timings,
+        screenshot_bytes=screenshot_bytes,
+    )
@@ -0,0 +1,260 @@
+"""
+Screenshot Streaming
+
+Keeps the latest frame of a VM available locally so screenshot latency is
+off the critical path of each step. A background task consumes a
+multipart/x-mixed-replace stream from the OSWorld server when it offers
+one (/screenshot/stream), and otherwise pulls /screenshot back to back.
+
+Every new frame can be handed to a recorder callback, which gives a
+continuous replay of the run at no extra request cost.
+"""
+
+import os
+import time
+import asyncio
+import threading
+import logging
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OSWORLD_SCREENSHOT_STREAM = os.environ.get("OSWORLD_SCREENSHOT_STREAM", "0") == "1"
+OSWORLD_STREAM_INTERVAL = float(os.environ.get("OSWORLD_STREAM_INTERVAL", 0.2))
+STREAM_ENDPOINT = "screenshot/stream"
+
+# recorder(frame_bytes, seq, captured_at)
+FrameRecorder = Callable[[bytes, int, float], None]
+
+
+class _FrameState:
+    """Latest frame plus the bookkeeping shared by both stream flavours."""
+
+    def __init__(self, recorder: Optional[FrameRecorder]):
+        self.recorder = recorder
+        self.frame: Optional[bytes] = None
+        self.seq = 0
+        self.captured_at = 0.0
+        self.frames_seen = 0
+
+    def publish(self, frame: bytes, captured_at: float) -> bool:
+        """Store a frame; returns True if it differs from the previous one."""
+        self.frames_seen += 1
+        if frame == self.frame:
+            self.captured_at = captured_at
+            return False
+        self.frame = frame
+        self.seq += 1
+        self.captured_at = captured_at
+        if self.recorder is not None:
+            try:
+                self.recorder(frame, self.seq, captured_at)
+            except Exception as e:
+                logger.warning(f"Frame recorder failed: {e}")
+        return True
+
+
+def parse_multipart_frames(buffer: bytearray, boundary: bytes):
+    """
+    Pop complete parts from a multipart/x-mixed-replace buffer.
+
+    Yields the body of each complete part and removes it from the buffer;
+    an incomplete trailing part is left for the next chunk.
+    """
+    delimiter = b"--" + boundary
+    while True:
+        start = buffer.find(delimiter)
+        if start < 0:
+            return
+        header_end = buffer.find(b"\r\n\r\n", start)
+        if header_end < 0:
+            return
+        headers = bytes(buffer[start + len(delimiter):header_end]).decode("latin-1")
+        length = None
+        for line in headers.split("\r\n"):
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value.strip())
+        body_start = header_end + 4
+        if length is not None:
+            if len(buffer) < body_start + length:
+                return
+            body = bytes(buffer[body_start:body_start + length])
+            del buffer[:body_start + length]
+        else:
+            end = buffer.find(delimiter, body_start)
+            if end < 0:
+                return
+            body = bytes(buffer[body_start:end]).rstrip(b"\r\n")
+            del buffer[:end]
+        yield body
+
+
+class AsyncScreenshotStream:
+    """
+    Background frame feed for an AsyncOSWorldClient.
+
+    Usage:
+        stream = AsyncScreenshotStream(client, recorder=...)
+        await stream.start()
+        frame = await stream.frame_after(t_action_done)
+        ...
+        await stream.stop()
+    """
+
+    def __init__(
+        self,
+        client,
+        interval: float = OSWORLD_STREAM_INTERVAL,
+        recorder: Optional[FrameRecorder] = None,
+    ):
+        self.client = client
+        self.interval = interval
+        self._state = _FrameState(recorder)
+        self._cond = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self.mode = "poll"
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _publish(self, frame: bytes, captured_at: float):
+        async with self._cond:
+            self._state.publish(frame, captured_at)
+            self._cond.notify_all()
+
+    async def _run(self):
+        try:
+            await self._consume_stream()
+            return
+        except Exception as e:
+            logger.info(f"Screenshot stream unavailable ({e}); polling /screenshot")
+        self.mode = "poll"
+        while True:
+            started = time.time()
+            try:
+                # Stamp with the request start: the frame cannot predate it
+                await self._publish(await self.client.screenshot(), started)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"Screenshot poll failed: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.time() - started)))
+
+    async def _consume_stream(self):
+        async with self.client.stream_get(STREAM_ENDPOINT) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "")
+            if "multipart" not in content_type or "boundary=" not in content_type:
+                raise ValueError(f"unexpected content type '{content_type}'")
+            boundary = content_type.split("boundary=", 1)[1].strip().strip('"').encode()
+            if boundary.startswith(b"--"):
+                boundary = boundary[2:]
+            self.mode = "stream"
+            buffer = bytearray()
+            async for chunk in response.aiter_bytes():
+                buffer.extend(chunk)
+                for frame in parse_multipart_frames(buffer, boundary):
+                    await self._publish(frame, time.time())
+        raise ConnectionError("screenshot stream ended")
+
+    @property
+    def latest(self) -> Tuple[Optional[bytes], float]:
+        """Most recent frame and the time it was (last) seen."""
+        return self._state.frame, self._state.captured_at
+
+    async def frame_after(self, t: float, timeout: float = 10.0) -> bytes:
+        """
+        Return the first frame captured after time t (e.g. after an action
+        finished), waiting for the feed if needed. Falls back to a direct
+        screenshot if the feed stalls.
+        """
+        async def wait():
+            async with self._cond:
+                await self._cond.wait_for(
+                    lambda: self._state.frame is not None and self._state.captured_at > t
+                )
+                return self._state.frame
+
+        try:
+            return await asyncio.wait_for(wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Screenshot feed stalled; fetching frame directly")
+            return await self.client.screenshot()
+
+    async def screenshot(self) -> bytes:
+        """Next frame from the feed (lets the stream stand in for a client, e.g. in settle waits)."""
+        return await self.frame_after(time.time())
+
+    def stats(self):
+        return {"mode": self.mode, "frames_seen": self._state.frames_seen, "distinct_frames": self._state.seq}
+
+
+class ScreenshotStream:
+    """Thread-based polling feed for the blocking OSWorldClient."""
+
+    def __init__(
+        self,
+        client,
+        interval: float = OSWORLD_STREAM_INTERVAL,
+        recorder: Optional[FrameRecorder] = None,
+    ):
+        self.client = client
+        self.interval = interval
+        self._state = _FrameState(recorder)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="screenshot-stream", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                frame = self.client.screenshot()
+                with self._cond:
+                    self._state.publish(frame, started)
+                    self._cond.notify_all()
+            except Exception as e:
+                logger.debug(f"Screenshot poll failed: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.time() - started)))
+
+    @property
+    def latest(self) -> Tuple[Optional[bytes], float]:
+        return self._state.frame, self._state.captured_at
+
+    def frame_after(self, t: float, timeout: float = 10.0) -> bytes:
+        """First frame captured after time t; direct screenshot if the feed stalls."""
+        with self._cond:
+            ok = self._cond.wait_for(
+                lambda: self._state.frame is not None and self._state.captured_at > t,
+                timeout=timeout,
+            )
+            if ok:
+                return self._state.frame
+        logger.warning("Screenshot feed stalled; fetching frame directly")
+        return self.client.screenshot()
+
+    def screenshot(self) -> bytes:
+        return self.frame_after(time.time())
@@ -0,0 +1,148 @@
+"""
+UI Settle Wait
+
+Replaces fixed post-action sleeps with a "wait until the screen stops
+changing" loop: poll screenshots, compare each with the previous one using
+the frame-diff thumbnails, and return once two consecutive frames match or
+the per-action-type ceiling is reached.
+
+The OSWorld server only serves full-resolution PNGs, so frames are reduced
+to low-resolution thumbnails on our side before comparing.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from .frame_diff import FrameDiffer
+
+logger = logging.getLogger(__name__)
+
+# fixed: sleep OSWORLD_SLEEP_AFTER_EXECUTION; adaptive: wait for the UI to settle
+OSWORLD_SETTLE_MODE = os.environ.get("OSWORLD_SETTLE_MODE", "fixed")
+OSWORLD_SETTLE_INTERVAL = float(os.environ.get("OSWORLD_SETTLE_INTERVAL", 0.25))
+
+# Upper bound (seconds) on the settle wait per action type
+SETTLE_CEILINGS: Dict[str, float] = {
+    "move": 1.0,
+    "scroll": 2.0,
+    "type": 2.0,
+    "press": 3.0,
+    "hotkey": 3.0,
+    "click": 3.0,
+    "double_click": 3.0,
+    "right_click": 2.0,
+    "drag": 3.0,
+    "execute": 10.0,
+    "setup": 15.0,
+    "default": 3.0,
+}
+
+
+def ceiling_for(action_type: Optional[str]) -> float:
+    return SETTLE_CEILINGS.get(action_type or "default", SETTLE_CEILINGS["default"])
+
+
+class SettleResult:
+    def __init__(self, settled: bool, waited: float, frames: int, last_frame: Optional[bytes]):
+        self.settled = settled
+        self.waited = waited
+        self.frames = frames
+        # Latest screenshot; the caller can reuse it as the next observation
+        self.last_frame = last_frame
+
+    def to_dict(self):
+        return {"settled": self.settled, "waited": round(self.waited, 3), "frames": self.frames}
+
+
+class _SettleTracker:
+    """Shared decision logic for the sync and async wait loops."""
+
+    def __init__(self, require_change: bool):
+        self.differ = FrameDiffer()
+        self.require_change = require_change
+        self.changed = False
+        self.frames = 0
+        self.last_frame: Optional[bytes] = None
+
+    def observe(self, frame: bytes) -> bool:
+        """Feed the next frame; True once the screen is considered settled."""
+        self.frames += 1
+        self.last_frame = frame
+        delta = self.differ.diff(frame, self.frames)
+        if delta.prev_frame_id is None:
+            return False
+        if not delta.similar:
+            self.changed = True
+            return False
+        return self.changed or not self.require_change
+
+
+def wait_for_settle(
+    client,
+    action_type: Optional[str] = None,
+    ceiling: Optional[float] = None,
+    interval: float = OSWORLD_SETTLE_INTERVAL,
+    require_change: bool = False,
+) -> SettleResult:
+    """
+    Block until two consecutive screenshots match or the ceiling passes.
+
+    Args:
+        client: OSWorldClient
+        action_type: Kind of action just executed (selects the ceiling)
+        ceiling: Explicit upper bound in seconds (overrides action_type)
+        interval: Seconds between polls
+        require_change: Only settle after the screen changed at least once
+            (for launches, where the window appears after a delay)
+    """
+    ceiling = ceiling_for(action_type) if ceiling is None else ceiling
+    tracker = _SettleTracker(require_change)
+    t0 = time.time()
+    deadline = t0 + ceiling
+    while True:
+        try:
+            if tracker.observe(client.screenshot()):
+                return SettleResult(True, time.time() - t0, tracker.frames, tracker.last_frame)
+        except Exception as e:
+            logger.debug(f"Settle poll failed: {e}")
+        if time.time() + interval > deadline:
+            return SettleResult(False, time.time() - t0, tracker.frames, tracker.last_frame)
+        time.sleep(interval)
+
+
+async def wait_for_settle_async(
+    client,
+    action_type: Optional[str] = None,
+    ceiling: Optional[float] = None,
+    interval: float = OSWORLD_SETTLE_INTERVAL,
+    require_change: bool = False,
+) -> SettleResult:
+    """Async variant of wait_for_settle for AsyncOSWorldClient."""
+    ceiling = ceiling_for(action_type) if ceiling is None else ceiling
+    tracker = _SettleTracker(require_change)
+    t0 = time.time()
+    deadline = t0 + ceiling
+    while True:
+        try:
+            frame = await client.screenshot()
+            if await asyncio.to_thread(tracker.observe, frame):
+                return SettleResult(True, time.time() - t0, tracker.frames, tracker.last_frame)
+        except Exception as e:
+            logger.debug(f"Settle poll failed: {e}")
+        if time.time() + interval > deadline:
+            return SettleResult(False, time.time() - t0, tracker.frames, tracker.last_frame)
+        await asyncio.sleep(interval)
+
+
+def settle(client, action_type: Optional[str] = None, fixed_sleep: float = 1.0, **kwargs) -> Optional[SettleResult]:
+    """Post-action wait for sync callers honoring OSWORLD_SETTLE_MODE."""
+    if OSWORLD_SETTLE_MODE == "adaptive":
+        result = wait_for_settle(client, action_type, **kwargs)
+        logger.debug(f"Settle wait: {result.to_dict()}")
+        return result
+    if fixed_sleep > 0:
+        time.sleep(fixed_sleep)
+    return None
@@ -1,10 +1,35 @@
-import os, sqlite3, json, pathlib, time
-from typing import Optional, Dict, Any
+"""
+Run Storage
+
+SQLite-backed record of runs and their actions.
+
+Each thread keeps one long-lived connection (the job queue's workers and
+the API threads all reuse theirs), the database runs in WAL mode so
+readers never block the writer, and action rows, which arrive once per
+step from every concurrent run, are buffered and inserted in batches by
+a single background writer.
+
+The schema is versioned with PRAGMA user_version; MIGRATIONS are applied
+in order on startup. Listings page with opaque keyset cursors, so a page
+costs the same on the millionth row as on the first.
+"""
+
+import os, sqlite3, json, pathlib, time, queue, atexit, base64, threading, logging
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
 
 DB_PATH = os.environ.get("RUNS_DB", "runs.db")
 RUNS_DIR = os.environ.get("RUNS_DIR", "runs")
 pathlib.Path(RUNS_DIR).mkdir(parents=True, exist_ok=True)
 
+# NORMAL is durable across application crashes in WAL mode; FULL also survives power loss
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+# Action rows are inserted once this many are buffered, or after ACTION_FLUSH_INTERVAL seconds
+ACTION_BATCH_SIZE = int(os.environ.get("ACTION_BATCH_SIZE", 64))
+ACTION_FLUSH_INTERVAL = float(os.environ.get("ACTION_FLUSH_INTERVAL", 0.5))
+
 SCHEMA = {
     "runs": (
         "CREATE TABLE IF NOT EXISTS runs ("
@@ -30,31 +55,156 @@ SCHEMA = {
     ),
 }
 
+# MIGRATIONS[i] brings the schema from user_version i to i + 1. Append only.
+MIGRATIONS: List[List[str]] = [
+    list(SCHEMA.values()),
+    [
+        "CREATE INDEX IF NOT EXISTS idx_runs_created ON runs(created_at, assessment_id)",
+        "CREATE INDEX IF NOT EXISTS idx_runs_task ON runs(task_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_runs_white_agent ON runs(white_agent, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_runs_status ON runs(status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_actions_assessment ON actions(assessment_id, step)",
+    ],
+    # Per-step phase timings (JSON, see timeline)
+    ["ALTER TABLE actions ADD COLUMN timings TEXT"],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+RUN_FIELDS = {"task_id", "white_agent", "success", "steps", "time_sec", "failure_reason", "artifacts_dir"}
+
+# Statements are kept as constants so sqlite3's per-connection cache reuses the prepared form
+INSERT_RUN = (
+    "INSERT OR REPLACE INTO runs(assessment_id, task_id, white_agent, status, success, steps, time_sec, failure_reason, artifacts_dir, created_at)"
+    " VALUES(?,?,?,?,?,?,?,?,?,?)"
+)
+INSERT_ACTION = "INSERT INTO actions(assessment_id, step, op, args, ok, ts, timings) VALUES(?,?,?,?,?,?,?)"
+SELECT_RUN = "SELECT * FROM runs WHERE assessment_id = ?"
+MAX_PAGE_SIZE = 1000
 
-def _conn():
-    conn = sqlite3.connect(DB_PATH)
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=256,
+        check_same_thread=False,
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
     return conn
 
 
+def _conn() -> sqlite3.Connection:
+    """This thread's connection (opened on first use, reopened after fork)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = _local.conn = _connect()
+        _local.pid = os.getpid()
+    return conn
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending MIGRATIONS; returns the resulting schema version."""
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return schema_version(conn)
+    with conn:
+        # Take the write lock first so concurrent processes migrate one at a time
+        conn.execute("BEGIN IMMEDIATE")
+        version = schema_version(conn)
+        for target in range(version, SCHEMA_VERSION):
+            for stmt in MIGRATIONS[target]:
+                conn.execute(stmt)
+            logger.info(f"Migrated {DB_PATH} to schema version {target + 1}")
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return SCHEMA_VERSION
+
+
 # init
-with _conn() as c:
-    for ddl in SCHEMA.values():
-        c.execute(ddl)
+migrate(_conn())
+
+
+class _ActionWriter:
+    """Buffers action rows and inserts them in batches from one thread."""
+
+    def __init__(self, batch_size: int = ACTION_BATCH_SIZE, interval: float = ACTION_FLUSH_INTERVAL):
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def put(self, row: Tuple):
+        self._ensure_started()
+        self._queue.put(row)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every row queued so far is committed."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="action-writer", daemon=True)
+                self._thread.start()
 
+    def _commit(self, rows: List[Tuple]):
+        if not rows:
+            return
+        try:
+            with _conn() as c:
+                c.executemany(INSERT_ACTION, rows)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to record {len(rows)} actions: {e}")
+        rows.clear()
 
-def create_run(assessment_id: str, task_id: str, white_agent: str) -> str:
+    def _run(self):
+        rows: List[Tuple] = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self.interval if rows else None)
+            except queue.Empty:
+                self._commit(rows)
+                continue
+            if isinstance(item, threading.Event):
+                self._commit(rows)
+                item.set()
+                continue
+            rows.append(item)
+            if len(rows) >= self.batch_size:
+                self._commit(rows)
+
+
+_actions = _ActionWriter()
+atexit.register(_actions.flush, 5)
+
+
+def create_run(
+    assessment_id: str, task_id: str, white_agent: str, status: str = "running"
+) -> str:
     artifacts = os.path.join(RUNS_DIR, assessment_id)
     os.makedirs(artifacts, exist_ok=True)
     with _conn() as c:
         c.execute(
-            "INSERT OR REPLACE INTO runs(assessment_id, task_id, white_agent, status, success, steps, time_sec, failure_reason, artifacts_dir, created_at)"
-            " VALUES(?,?,?,?,?,?,?,?,?,?)",
+            INSERT_RUN,
             (
                 assessment_id,
                 task_id,
                 white_agent,
-                "running",
+                status,
                 None,
                 None,
                 None,
@@ -70,6 +220,8 @@ def update_status(assessment_id: str, status: str, **fields):
     sets = ["status = ?"]
     vals = [status]
     for k, v in fields.items():
+        if k not in RUN_FIELDS:
+            raise ValueError(f"Unknown run field '{k}'")
         sets.append(f"{k} = ?")
         vals.append(v)
     vals.append(assessment_id)
@@ -77,27 +229,172 @@ def update_status(assessment_id: str, status: str, **fields):
         c.execute(f"UPDATE runs SET {', '.join(sets)} WHERE assessment_id = ?", vals)
 
 
-def record_action(
-    assessment_id: str, step: int, op: str, args: Dict[str, Any], ok: int
-):
+def fail_unfinished_runs(reason: str) -> int:
+    """
+    Mark runs left "queued" or "running" (by a process that has exited) as "failed".
+
+    Call once at startup, before this process queues anything; returns the
+    number of runs marked.
+    """
     with _conn() as c:
-        c.execute(
-            "INSERT INTO actions(assessment_id, step, op, args, ok, ts) VALUES(?,?,?,?,?,?)",
-            (assessment_id, step, op, json.dumps(args), ok, time.time()),
+        cur = c.execute(
+            "UPDATE runs SET status = 'failed', failure_reason = ? WHERE status IN ('queued', 'running')",
+            (reason,),
         )
+    return cur.rowcount
+
+
+def record_action(
+    assessment_id: str,
+    step: int,
+    op: str,
+    args: Dict[str, Any],
+    ok: int,
+    timings: Optional[Dict[str, float]] = None,
+):
+    """Queue an action row; it is committed within ACTION_FLUSH_INTERVAL (see flush_actions)."""
+    _actions.put((
+        assessment_id, step, op, json.dumps(args, default=str), int(ok), time.time(),
+        json.dumps(timings) if timings else None,
+    ))
+
+
+def flush_actions(timeout: Optional[float] = None) -> bool:
+    """Block until queued action rows are committed (e.g. before reading them back)."""
+    return _actions.flush(timeout)
 
 
 def fetch_run(assessment_id: str) -> Optional[Dict[str, Any]]:
-    with _conn() as c:
-        row = c.execute(
-            "SELECT * FROM runs WHERE assessment_id = ?", (assessment_id,)
-        ).fetchone()
-        return dict(row) if row else None
+    row = _conn().execute(SELECT_RUN, (assessment_id,)).fetchone()
+    return dict(row) if row else None
 
 
-def list_runs(limit: int = 50) -> list[Dict[str, Any]]:
-    with _conn() as c:
-        rows = c.execute(
-            "SELECT * FROM runs ORDER BY created_at DESC LIMIT ?", (limit,)
-        ).fetchall()
-        return [dict(row) for row in rows]
+def encode_cursor(*key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> list:
+    """
+    Decode a cursor made by encode_cursor.
+
+    Args:
+        cursor: The encoded cursor
+        *types: Expected type (or tuple of types) of each key element
+
+    Raises:
+        ValueError: If the cursor is malformed or its key does not match types
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(key, list) or len(key) != len(types):
+        raise ValueError("invalid cursor")
+    for value, expected in zip(key, types):
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise ValueError("invalid cursor")
+    return key
+
+
+def _page_size(limit: int) -> int:
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def query_runs(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    task_id: Optional[str] = None,
+    white_agent: Optional[str] = None,
+    status: Optional[str] = None,
+    success: Optional[bool] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of runs, newest first.
+
+    Args:
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        cursor: next_cursor from the previous page
+        task_id, white_agent, status, success: Exact-match filters
+        since, until: created_at range (epoch seconds, until exclusive)
+
+    Returns:
+        (runs, next_cursor); next_cursor is None on the last page
+
+    Raises:
+        ValueError: If cursor is malformed
+    """
+    limit = _page_size(limit)
+    where, vals = [], []
+    for column, value in (("task_id", task_id), ("white_agent", white_agent), ("status", status)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            vals.append(value)
+    if success is not None:
+        where.append("success = ?")
+        vals.append(int(success))
+    if since is not None:
+        where.append("created_at >= ?")
+        vals.append(since)
+    if until is not None:
+        where.append("created_at < ?")
+        vals.append(until)
+    if cursor:
+        created_at, assessment_id = decode_cursor(cursor, (int, float), str)
+        where.append("(created_at, assessment_id) < (?, ?)")
+        vals.extend([created_at, assessment_id])
+    sql = "SELECT * FROM runs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, assessment_id DESC LIMIT ?"
+    rows = [dict(r) for r in _conn().execute(sql, (*vals, limit + 1)).fetchall()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["assessment_id"])
+    return rows, next_cursor
+
+
+def list_runs(limit: int = 50, **filters) -> list[Dict[str, Any]]:
+    return query_runs(limit=limit, **filters)[0]
+
+
+def list_actions(
+    assessment_id: str, limit: int = 200, cursor: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of a run's actions in step order (see query_runs for paging).
+
+    Raises:
+        ValueError: If cursor is malformed
+    """
+    limit = _page_size(limit)
+    sql = "SELECT rowid, * FROM actions WHERE assessment_id = ?"
+    vals: list = [assessment_id]
+    if cursor:
+        step, rowid = decode_cursor(cursor, int, int)
+        sql += " AND (step, rowid) > (?, ?)"
+        vals.extend([step, rowid])
+    sql += " ORDER BY step, rowid LIMIT ?"
+    rows = _conn().execute(sql, (*vals, limit + 1)).fetchall()
+    actions = [_action_row(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(actions[-1]["step"], actions[-1]["rowid"])
+    return actions, next_cursor
+
+
+def fetch_actions(assessment_id: str) -> List[Dict[str, Any]]:
+    """Every recorded action of a run in step order (for timelines; a run has at most max_steps)."""
+    rows = _conn().execute(
+        "SELECT rowid, * FROM actions WHERE assessment_id = ? ORDER BY step, rowid", (assessment_id,)
+    ).fetchall()
+    return [_action_row(row) for row in rows]
+
+
+def _action_row(row: sqlite3.Row) -> Dict[str, Any]:
+    action = dict(row)
+    action["args"] = json.loads(action["args"]) if action["args"] else {}
+    action["timings"] = json.loads(action["timings"]) if action.get("timings") else {}
+    return action
@@ -0,0 +1,499 @@
+"""
+Benchmark Sweeps
+
+Runs a list of benchmark tasks across a pool of OSWorld VMs: one worker
+per VM, each leasing a VM from a VMPool (so health checks and resets
+apply), taking the next task from a shared queue ordered longest expected
+duration first. Finishing the long tasks early keeps the tail of the sweep
+short, so total time scales with the number of VMs.
+
+Results are appended as each task finishes, to a JSONL file or (for
+*.db / *.sqlite paths) a SQLite table. Previous results in the same file
+provide the duration estimates for the next sweep.
+
+A SweepManifest persists each task's state (pending/running/done/failed)
+with atomic rewrites, so an interrupted sweep can be resumed: finished
+tasks are skipped and "running" tasks whose lease expired (their process
+died) are queued again. Infrastructure failures (VM unreachable, no VM
+available) can be retried a bounded number of times; task failures are not.
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import tempfile
+import threading
+import logging
+from typing import Dict, Any, Callable, Iterable, List, Optional
+
+import httpx
+import requests
+
+from .vm_pool import OSWORLD_POOL_RECHECK_SEC, VMPool, NoVMAvailableError
+
+logger = logging.getLogger(__name__)
+
+# Expected duration for tasks with no history in their domain either
+SWEEP_DEFAULT_TASK_SEC = float(os.environ.get("SWEEP_DEFAULT_TASK_SEC", 300))
+# A running task whose lease is older than this is considered abandoned on --resume;
+# live sweeps renew their leases every third of it
+SWEEP_LEASE_TIMEOUT = float(os.environ.get("SWEEP_LEASE_TIMEOUT", 600))
+# Delay before retrying a task after an infrastructure failure; at least the pool's
+# recheck interval, so the failed VM is health-checked again before the retry
+SWEEP_RETRY_DELAY = max(
+    float(os.environ.get("SWEEP_RETRY_DELAY", OSWORLD_POOL_RECHECK_SEC)), OSWORLD_POOL_RECHECK_SEC
+)
+
+# Errors meaning the environment, not the task, failed
+# (requests' errors derive from OSError, not the builtin ConnectionError)
+INFRASTRUCTURE_ERRORS = (
+    NoVMAvailableError,
+    ConnectionError,
+    TimeoutError,
+    httpx.TransportError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+
+def is_infrastructure_error(exc: BaseException) -> bool:
+    return isinstance(exc, INFRASTRUCTURE_ERRORS)
+
+
+class SweepTask:
+    """One benchmark task in a sweep."""
+
+    def __init__(self, domain: str, task_id: str, expected_sec: float = 0.0):
+        self.domain = domain
+        self.task_id = task_id
+        self.expected_sec = expected_sec
+        self.attempts = 0
+        # Not dispatched before this time (set when an infrastructure failure is retried)
+        self.not_before = 0.0
+        # Set while running: the leased VM was pre-warmed for this task
+        self.warm = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.domain}/{self.task_id}"
+
+
+def read_pool_file(path: str) -> List[str]:
+    """OSWorld URLs from a pool file: a JSON list, or one URL per line (# comments)."""
+    with open(path) as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return [str(u) for u in json.loads(text)]
+    return [line.split("#", 1)[0].strip() for line in text.splitlines() if line.split("#", 1)[0].strip()]
+
+
+# --- Result sinks ---
+class JSONLResults:
+    """Append-only JSONL results file; every record is flushed as it is written."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class SQLiteResults:
+    """Results table in a SQLite file (one row per finished task)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sweep_results ("
+                "task_id TEXT, domain TEXT, status TEXT, time_sec REAL, finished_at REAL, record TEXT)"
+            )
+
+    def write(self, record: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sweep_results(task_id, domain, status, time_sec, finished_at, record)"
+                " VALUES(?,?,?,?,?,?)",
+                (record.get("task_id"), record.get("domain"), record.get("status"),
+                 record.get("time_sec"), record.get("finished_at"), json.dumps(record, default=str)),
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+def _is_sqlite(path: str) -> bool:
+    return path.endswith((".db", ".sqlite", ".sqlite3"))
+
+
+def open_results(path: str):
+    """Result sink for path (SQLite for .db/.sqlite, JSONL otherwise)."""
+    return SQLiteResults(path) if _is_sqlite(path) else JSONLResults(path)
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """Every record in a results file ([] if it does not exist)."""
+    if not os.path.exists(path):
+        return []
+    if _is_sqlite(path):
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute("SELECT record FROM sweep_results").fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        finally:
+            conn.close()
+        return [json.loads(r[0]) for r in rows]
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Torn last line from an interrupted sweep
+                continue
+    return records
+
+
+# --- Manifest ---
+class SweepManifest:
+    """
+    Per-task sweep state in a JSON file, rewritten atomically (temp file +
+    fsync + rename) on every transition, so it is never half-written.
+
+    Entries: {"domain", "task_id", "state", "attempts", "owner",
+    "lease_until", "error", "infrastructure", "updated_at"}.
+    """
+
+    def __init__(self, path: str, lease_timeout: float = SWEEP_LEASE_TIMEOUT):
+        self.path = path
+        self.lease_timeout = lease_timeout
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f).get("tasks", {})
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".manifest-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": 1, "updated_at": time.time(), "tasks": self.entries}, f, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _set(self, task: SweepTask, **fields):
+        entry = self.entries.setdefault(task.key, {"domain": task.domain, "task_id": task.task_id})
+        entry.update(fields, attempts=task.attempts, updated_at=time.time())
+
+    def plan(self, tasks: List[SweepTask], resume: bool = False, max_retries: int = 0) -> List[SweepTask]:
+        """
+        Register tasks and return the ones to run.
+
+        Without resume every task starts over as pending. With resume, done
+        tasks are skipped, failed tasks are re-run only after an
+        infrastructure failure with retries left, and running tasks only
+        once their lease has expired.
+        """
+        now = time.time()
+        todo = []
+        with self._lock:
+            if not resume:
+                unfinished = sum(1 for e in self.entries.values() if e.get("state") in ("pending", "running"))
+                if unfinished:
+                    logger.warning(f"Starting over; {unfinished} unfinished tasks in {self.path} (use --resume to keep them)")
+                self.entries = {}
+            for task in tasks:
+                entry = self.entries.get(task.key)
+                if entry is None:
+                    self._set(task, state="pending")
+                    todo.append(task)
+                    continue
+                task.attempts = entry.get("attempts", 0)
+                state = entry.get("state")
+                if state == "done":
+                    continue
+                if state == "failed" and not (entry.get("infrastructure") and task.attempts <= max_retries):
+                    continue
+                if state == "running" and entry.get("lease_until", 0) > now:
+                    logger.warning(f"Skipping {task.key}: still leased by {entry.get('owner')}")
+                    continue
+                if state == "running":
+                    logger.info(f"Re-queueing {task.key}: lease held by {entry.get('owner')} expired")
+                self._set(task, state="pending")
+                todo.append(task)
+            self._save()
+        return todo
+
+    def start(self, task: SweepTask):
+        with self._lock:
+            self._set(task, state="running", owner=self.owner, lease_until=time.time() + self.lease_timeout)
+            self._save()
+
+    def renew(self, tasks: Iterable[SweepTask]):
+        """Extend the leases of tasks this process is still running."""
+        with self._lock:
+            until = time.time() + self.lease_timeout
+            for task in tasks:
+                entry = self.entries.get(task.key)
+                if entry and entry.get("state") == "running" and entry.get("owner") == self.owner:
+                    entry["lease_until"] = until
+            self._save()
+
+    def finish(self, task: SweepTask, record: Dict[str, Any], retry: bool = False):
+        with self._lock:
+            if retry:
+                self._set(task, state="pending", error=record.get("error"), infrastructure=True)
+            else:
+                self._set(
+                    task,
+                    state=record["status"],
+                    error=record.get("error"),
+                    infrastructure=bool(record.get("infrastructure")),
+                    lease_until=None,
+                )
+            self._save()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for entry in self.entries.values():
+                counts[entry.get("state")] = counts.get(entry.get("state"), 0) + 1
+            return counts
+
+
+# --- Scheduling ---
+def estimate_durations(
+    tasks: Iterable[SweepTask], history: Iterable[Dict[str, Any]], default: float = SWEEP_DEFAULT_TASK_SEC
+) -> None:
+    """
+    Set expected_sec on each task: its mean past duration, else its domain's
+    mean, else default.
+    """
+    per_task: Dict[str, List[float]] = {}
+    per_domain: Dict[str, List[float]] = {}
+    for record in history:
+        if record.get("status") != "done" or not record.get("time_sec"):
+            continue
+        per_task.setdefault(f"{record.get('domain')}/{record.get('task_id')}", []).append(record["time_sec"])
+        per_domain.setdefault(record.get("domain"), []).append(record["time_sec"])
+    for task in tasks:
+        samples = per_task.get(task.key) or per_domain.get(task.domain)
+        task.expected_sec = sum(samples) / len(samples) if samples else default
+
+
+def longest_first(tasks: List[SweepTask]) -> List[SweepTask]:
+    return sorted(tasks, key=lambda t: t.expected_sec, reverse=True)
+
+
+# --- Engine ---
+class Sweep:
+    """
+    Run tasks on a VM pool with one worker per VM.
+
+    Usage:
+        sweep = Sweep(pool, run_task, open_results("results/sweep.jsonl"))
+        summary = sweep.run(tasks)
+
+    run_task(task, osworld_url) returns a result dict; exceptions are
+    recorded as failed tasks and the sweep carries on. With a manifest,
+    task state is persisted for resuming, and infrastructure failures are
+    retried up to max_retries times. With prewarm(task, osworld_url), each
+    task start also warms an idle VM for the next queued task; run fewer
+    workers than VMs to keep spare VMs warming.
+    """
+
+    def __init__(
+        self,
+        pool: VMPool,
+        run_task: Callable[[SweepTask, str], Dict[str, Any]],
+        results,
+        workers: Optional[int] = None,
+        manifest: Optional[SweepManifest] = None,
+        max_retries: int = 0,
+        prewarm: Optional[Callable[[SweepTask, str], Any]] = None,
+    ):
+        self.pool = pool
+        self.run_task = run_task
+        self.results = results
+        self.workers = workers or len(pool.vms)
+        self.manifest = manifest
+        self.max_retries = max_retries
+        self.prewarm = prewarm
+        self._lock = threading.Lock()
+        self._queue: List[SweepTask] = []
+        self._running: Dict[str, SweepTask] = {}
+        # Keys of queued tasks a VM has been (or is being) warmed for
+        self._warmed: set = set()
+        self._stop = threading.Event()
+        # Final record of every task, in completion order
+        self.records: List[Dict[str, Any]] = []
+        self._done = 0
+        self._failed = 0
+        self._total = 0
+        self._started = 0.0
+
+    def _next(self) -> Optional[SweepTask]:
+        """First queued task that may run now, waiting out retry delays; None when empty."""
+        while True:
+            with self._lock:
+                if not self._queue:
+                    return None
+                now = time.time()
+                for i, task in enumerate(self._queue):
+                    if task.not_before <= now:
+                        return self._queue.pop(i)
+                wait = min(t.not_before for t in self._queue) - now
+            time.sleep(min(wait, 1.0))
+
+    def _run_one(self, task: SweepTask) -> Dict[str, Any]:
+        record: Dict[str, Any] = {"task_id": task.task_id, "domain": task.domain}
+        task.attempts += 1
+        record["attempt"] = task.attempts
+        if self.manifest:
+            self.manifest.start(task)
+        started = time.time()
+        try:
+            lease = self.pool.acquire(task.domain, key=task.key)
+        except NoVMAvailableError as e:
+            record.update(status="failed", error=str(e), infrastructure=True)
+        else:
+            record["osworld_url"] = lease.url
+            task.warm = lease.warm
+            if self.prewarm:
+                self._prewarm_next()
+            try:
+                result = self.run_task(task, lease.url)
+                record.update(result or {})
+                record["status"] = "failed" if record.get("error") else "done"
+            except Exception as e:
+                logger.error(f"Task {task.key} failed: {e}", exc_info=True)
+                record.update(
+                    status="failed",
+                    error=f"{type(e).__name__}: {e}",
+                    infrastructure=is_infrastructure_error(e),
+                )
+            finally:
+                self.pool.release(lease)
+            if lease.reset_report:
+                record["reset"] = lease.reset_report
+        record["started_at"] = started
+        record["finished_at"] = time.time()
+        record["time_sec"] = round(record["finished_at"] - started, 3)
+        record["expected_sec"] = round(task.expected_sec, 1)
+        return record
+
+    def _prewarm_next(self):
+        """Warm an idle VM for the next queued task nobody has warmed yet."""
+        with self._lock:
+            task = next((t for t in self._queue if t.key not in self._warmed), None)
+            if task is None:
+                return
+            self._warmed.add(task.key)
+        if not self.pool.prewarm(task.key, task.domain, lambda url: self.prewarm(task, url)):
+            # No idle VM right now; a later task start may find one
+            with self._lock:
+                self._warmed.discard(task.key)
+
+    def _worker(self):
+        while True:
+            task = self._next()
+            if task is None:
+                return
+            with self._lock:
+                self._running[task.key] = task
+            record = self._run_one(task)
+            retry = (
+                record["status"] == "failed"
+                and record.get("infrastructure")
+                and task.attempts <= self.max_retries
+            )
+            self.results.write(record)
+            if self.manifest:
+                self.manifest.finish(task, record, retry=retry)
+            with self._lock:
+                del self._running[task.key]
+                if retry:
+                    # Held back until the pool has rechecked the failed VM
+                    task.not_before = time.time() + SWEEP_RETRY_DELAY
+                    self._queue.append(task)
+                    logger.warning(
+                        f"Infrastructure failure on {task.key}; retry {task.attempts}/{self.max_retries} "
+                        f"in {SWEEP_RETRY_DELAY:.0f}s"
+                    )
+                    continue
+                self.records.append(record)
+                self._done += 1
+                self._failed += record["status"] != "done"
+                done, total = self._done, self._total
+            elapsed = time.time() - self._started
+            logger.info(
+                f"[{done}/{total}] {task.key}: {record['status']} in {record['time_sec']:.1f}s "
+                f"(sweep elapsed {elapsed:.0f}s)"
+            )
+
+    def _heartbeat(self):
+        interval = max(1.0, self.manifest.lease_timeout / 3)
+        while not self._stop.wait(interval):
+            with self._lock:
+                running = list(self._running.values())
+            if running:
+                self.manifest.renew(running)
+
+    def run(self, tasks: List[SweepTask]) -> Dict[str, Any]:
+        """Run every task; returns a summary once all workers finish."""
+        self._queue = longest_first(tasks)
+        self._total = len(self._queue)
+        self._started = time.time()
+        workers = min(self.workers, self._total) or 1
+        logger.info(f"Sweeping {self._total} tasks with {workers} workers on {len(self.pool.vms)} VMs")
+        threads = [
+            threading.Thread(target=self._worker, name=f"sweep-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in threads:
+            t.start()
+        heartbeat = None
+        if self.manifest:
+            heartbeat = threading.Thread(target=self._heartbeat, name="sweep-heartbeat", daemon=True)
+            heartbeat.start()
+        for t in threads:
+            t.join()
+        self._stop.set()
+        if heartbeat:
+            heartbeat.join()
+        return {
+            "tasks": self._total,
+            "done": self._done - self._failed,
+            "failed": self._failed,
+            "workers": workers,
+            "time_sec": round(time.time() - self._started, 3),
+            "reset": self.pool.stats()["reset"],
+        }
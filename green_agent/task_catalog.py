@@ -0,0 +1,250 @@
+"""
+Task Catalog
+
+In-memory index of every task the Green Agent can run:
+
+    <TASKS_DIR>/*.json                              Green Agent tasks (or single OSWorld examples)
+    <OSWORLD_EXAMPLES_DIR>/<domain>/<id>.json       OSWorld evaluation examples
+
+Each entry keeps the parsed JSON and its Green Agent form (OSWorld
+examples go through task_converter). Directories are rescanned only when
+their mtime changes, and a lookup re-parses an entry only when its file's
+mtime changes, so steady-state lookups cost one stat.
+
+Tasks are keyed by (domain, task_id), since OSWorld reuses ids across
+domains. Tasks in TASKS_DIR take precedence over OSWorld examples with the
+same domain and id. A lookup without a domain prefers TASKS_DIR, then the
+first domain in name order.
+"""
+
+import os
+import json
+import threading
+import logging
+from typing import Dict, Any, List, Optional
+
+from .task_converter import convert_from_osworld_format, is_green_format
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TASKS_DIR = os.environ.get("TASKS_DIR", os.path.join(_PROJECT_ROOT, "tasks"))
+OSWORLD_EXAMPLES_DIR = os.environ.get(
+    "OSWORLD_EXAMPLES_DIR",
+    os.path.join(_PROJECT_ROOT, "vendor", "OSWorld", "evaluation_examples", "examples"),
+)
+
+
+class TaskNotFoundError(KeyError):
+    pass
+
+
+class TaskEntry:
+    """One catalogued task file."""
+
+    def __init__(self, path: str, source: str, domain: Optional[str], mtime: float, config: Dict[str, Any]):
+        self.path = path
+        # "tasks" (TASKS_DIR) or "osworld" (evaluation examples)
+        self.source = source
+        self.mtime = mtime
+        # Task JSON as stored on disk
+        self.config = config
+        if is_green_format(config):
+            self.task = config
+        else:
+            self.task = convert_from_osworld_format(config, domain or "")
+        self.task_id = self.task.get("task_id") or os.path.splitext(os.path.basename(path))[0]
+        self.domain = domain or self.task.get("domain")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "domain": self.domain,
+            "source": self.source,
+            "goal": self.task.get("goal", ""),
+        }
+
+
+def _load(path: str, source: str, domain: Optional[str]) -> Optional[TaskEntry]:
+    try:
+        mtime = os.stat(path).st_mtime
+        with open(path) as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Skipping unreadable task file {path}: {e}")
+        return None
+    if not isinstance(config, dict):
+        # e.g. test_small.json style id lists
+        return None
+    return TaskEntry(path, source, domain, mtime, config)
+
+
+class TaskCatalog:
+    """Thread-safe task index with mtime-based invalidation."""
+
+    def __init__(self, tasks_dir: str = TASKS_DIR, examples_dir: str = OSWORLD_EXAMPLES_DIR):
+        self.tasks_dir = tasks_dir
+        self.examples_dir = examples_dir
+        self._lock = threading.RLock()
+        # (source, domain, task_id) -> entry; lookups go through the indexes (source precedence applied)
+        self._entries: Dict[tuple, TaskEntry] = {}
+        # (domain, task_id) -> entry, and task_id -> entry for lookups without a domain
+        self._index: Dict[tuple, TaskEntry] = {}
+        self._by_id: Dict[str, TaskEntry] = {}
+        # directory -> mtime at its last scan
+        self._dir_mtimes: Dict[str, float] = {}
+        self._scanned = False
+
+    def _scan_dir(self, directory: str, source: str, domain: Optional[str]) -> bool:
+        """Rescan one directory if it changed; returns True if it was rescanned."""
+        try:
+            mtime = os.stat(directory).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if directory in self._dir_mtimes and self._dir_mtimes[directory] == mtime:
+            return False
+        # Entries from this directory, by path; whatever is left at the end was removed
+        known = {e.path: k for k, e in self._entries.items() if os.path.dirname(e.path) == directory}
+        if mtime is not None:
+            for name in os.listdir(directory):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(directory, name)
+                if not os.path.isfile(path):
+                    continue
+                key = known.pop(path, None)
+                if key is not None and os.stat(path).st_mtime == self._entries[key].mtime:
+                    continue
+                if key is not None:
+                    del self._entries[key]
+                entry = _load(path, source, domain)
+                if entry is not None:
+                    self._entries[(source, entry.domain, entry.task_id)] = entry
+        for key in known.values():
+            self._entries.pop(key, None)
+        self._dir_mtimes[directory] = mtime
+        return True
+
+    def refresh(self) -> None:
+        """Pick up added, changed and removed task files."""
+        with self._lock:
+            changed = self._scan_dir(self.tasks_dir, "tasks", None)
+            if os.path.isdir(self.examples_dir):
+                for domain in sorted(os.listdir(self.examples_dir)):
+                    directory = os.path.join(self.examples_dir, domain)
+                    if os.path.isdir(directory):
+                        changed |= self._scan_dir(directory, "osworld", domain)
+            if changed or not self._scanned:
+                index: Dict[tuple, TaskEntry] = {}
+                for (source, domain, task_id), entry in sorted(self._entries.items(), key=lambda kv: kv[0][0] == "tasks"):
+                    # "tasks" entries sort last, so they win
+                    index[(domain, task_id)] = entry
+                for (source, domain, task_id), entry in self._entries.items():
+                    # TASKS_DIR files are also reachable by file name (tasks/<task_id>.json)
+                    stem = os.path.splitext(os.path.basename(entry.path))[0]
+                    if source == "tasks":
+                        index.setdefault((domain, stem), entry)
+                by_id: Dict[str, TaskEntry] = {}
+                for (domain, task_id), entry in sorted(
+                    index.items(), key=lambda kv: (kv[1].source != "tasks", kv[0][0] or "")
+                ):
+                    by_id.setdefault(task_id, entry)
+                self._index = index
+                self._by_id = by_id
+                self._scanned = True
+                logger.info(f"Task catalog: {len(self._entries)} tasks")
+
+    def _ensure_scanned(self):
+        if not self._scanned:
+            self.refresh()
+
+    def _lookup(self, task_id: str, domain: Optional[str]) -> Optional[TaskEntry]:
+        if domain:
+            # A TASKS_DIR file only answers for the domain it declares
+            return self._index.get((domain, task_id))
+        return self._by_id.get(task_id)
+
+    def _replace(self, old: TaskEntry, new: TaskEntry) -> None:
+        self._entries[(new.source, new.domain, new.task_id)] = new
+        for index in (self._index, self._by_id):
+            for key in [k for k, e in index.items() if e is old]:
+                index[key] = new
+
+    def get(self, task_id: str, domain: Optional[str] = None) -> TaskEntry:
+        """
+        Look up a task, re-reading its file if it changed since it was indexed.
+
+        Raises:
+            TaskNotFoundError: If no task has this id (in this domain, when given)
+        """
+        with self._lock:
+            self._ensure_scanned()
+            entry = self._lookup(task_id, domain)
+            if entry is None:
+                # Possibly a file added since the last scan
+                self.refresh()
+                entry = self._lookup(task_id, domain)
+            if entry is None:
+                raise TaskNotFoundError(task_id)
+            try:
+                mtime = os.stat(entry.path).st_mtime
+            except FileNotFoundError:
+                self.refresh()
+                raise TaskNotFoundError(task_id)
+            if mtime != entry.mtime:
+                fresh = _load(entry.path, entry.source, entry.domain if entry.source == "osworld" else None)
+                if fresh is None:
+                    raise TaskNotFoundError(task_id)
+                if (fresh.domain, fresh.task_id) != (entry.domain, entry.task_id):
+                    # The edit moved the task to another key; index it from scratch
+                    self._dir_mtimes.pop(os.path.dirname(entry.path), None)
+                    self.refresh()
+                    entry = self._lookup(task_id, domain)
+                    if entry is None:
+                        raise TaskNotFoundError(task_id)
+                    return entry
+                self._replace(entry, fresh)
+                entry = fresh
+            return entry
+
+    def list(
+        self,
+        domain: Optional[str] = None,
+        source: Optional[str] = None,
+        query: Optional[str] = None,
+    ) -> List[TaskEntry]:
+        """Catalogued tasks, optionally filtered by domain, source and goal substring."""
+        self.refresh()
+        with self._lock:
+            # One entry per task (file-name aliases share it)
+            entries = list({id(e): e for e in self._index.values()}.values())
+        if domain:
+            entries = [e for e in entries if e.domain == domain]
+        if source:
+            entries = [e for e in entries if e.source == source]
+        if query:
+            q = query.lower()
+            entries = [e for e in entries if q in e.task.get("goal", "").lower() or q in e.task_id.lower()]
+        return sorted(entries, key=lambda e: (e.domain or "", e.task_id))
+
+    def domains(self) -> Dict[str, int]:
+        self.refresh()
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for entry in {id(e): e for e in self._index.values()}.values():
+                counts[entry.domain or ""] = counts.get(entry.domain or "", 0) + 1
+            return counts
+
+
+_catalog: Optional[TaskCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> TaskCatalog:
+    """Process-wide catalog over TASKS_DIR and OSWORLD_EXAMPLES_DIR."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = TaskCatalog()
+        return _catalog
@@ -93,3 +93,42 @@ def extract_max_time(green_task: Dict[str, Any], default: int = 600) -> int:
     """
     constraints = green_task.get("constraints", {})
     return constraints.get("max_time_sec", default)
+
+
+def convert_from_osworld_format(osworld_task: Dict[str, Any], domain: str = "") -> Dict[str, Any]:
+    """
+    Convert an OSWorld evaluation example to Green Agent format.
+
+    The OSWorld setup ("config") and evaluator are kept under "osworld" so
+    runners that execute the real setup can find them. "id" and
+    "instruction" are kept as well, since the native runner reads them.
+
+    Args:
+        osworld_task: Task in OSWorld format
+        domain: Example domain (its directory under evaluation_examples/examples)
+
+    Returns:
+        Task in Green Agent format
+    """
+    instruction = osworld_task.get("instruction", "")
+    return {
+        "task_id": osworld_task.get("id", "unknown_task"),
+        "environment": "OSWorld:Ubuntu:22.04",
+        "goal": instruction,
+        "domain": domain or osworld_task.get("domain"),
+        "constraints": dict(osworld_task.get("constraints", {})),
+        "hints": list(osworld_task.get("hints", [])),
+        "id": osworld_task.get("id", "unknown_task"),
+        "instruction": instruction,
+        "osworld": {
+            "config": osworld_task.get("config", []),
+            "evaluator": osworld_task.get("evaluator", {}),
+            "related_apps": osworld_task.get("related_apps", []),
+            "snapshot": osworld_task.get("snapshot"),
+        },
+    }
+
+
+def is_green_format(task: Dict[str, Any]) -> bool:
+    """True for Green Agent tasks ("task_id"/"goal"), False for OSWorld examples ("id"/"instruction")."""
+    return "task_id" in task or "goal" in task
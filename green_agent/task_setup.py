@@ -0,0 +1,367 @@
+"""
+Task Setup Engine
+
+Runs a task's OSWorld "config" steps (launch / execute / command / sleep)
+against an OSWorld VM:
+
+- launch steps start the application in the background and are followed by
+  a readiness probe (process running, window mapped, port open) instead of
+  a fixed sleep; consecutive launches run concurrently
+- execute steps keep their order and wait for every step before them,
+  including the readiness of earlier launches (they often configure the
+  app just started); a launch waits for the execute steps before it (e.g.
+  a download of the file it opens)
+- a sleep step waits for the pending probes; it only sleeps when a launch
+  before it has nothing to probe or an execute step ran since the last
+  sleep (it may have started async work, e.g. a download or a restart)
+
+Probes run as one polling loop on the VM per launch, so waiting costs one
+request. prewarm() starts a task's leading launch steps ahead of time (see
+Sweep); when the task's setup later runs on a VM warmed for it, those
+launches are skipped if their probes already pass.
+"""
+
+import os
+import re
+import shlex
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Optional, List
+
+from .osworld_client import OSWorldClient
+from .settle import OSWORLD_SETTLE_MODE, settle, wait_for_settle
+
+logger = logging.getLogger(__name__)
+
+# Max seconds a launch is given to become ready
+SETUP_PROBE_TIMEOUT = float(os.environ.get("SETUP_PROBE_TIMEOUT", 30))
+SETUP_PROBE_INTERVAL = float(os.environ.get("SETUP_PROBE_INTERVAL", 0.2))
+SETUP_EXECUTE_TIMEOUT = int(os.environ.get("SETUP_EXECUTE_TIMEOUT", 120))
+SETUP_MAX_WORKERS = int(os.environ.get("SETUP_MAX_WORKERS", 8))
+
+# Launch command (argv[0] basename) -> (process name for pgrep -x, window class for xdotool)
+APP_PROBES: Dict[str, tuple] = {
+    "google-chrome": ("chrome", "google-chrome"),
+    "google-chrome-stable": ("chrome", "google-chrome"),
+    "chromium": ("chromium", "chromium"),
+    "chromium-browser": ("chromium", "chromium"),
+    "libreoffice": ("soffice.bin", "libreoffice"),
+    "soffice": ("soffice.bin", "libreoffice"),
+    "gimp": ("gimp.*", "gimp"),
+    "thunderbird": ("thunderbird", "thunderbird"),
+    "vlc": ("vlc", "vlc"),
+    "code": ("code", "code"),
+    "nautilus": ("nautilus", "nautilus"),
+    "gnome-terminal": ("gnome-terminal-server", "gnome-terminal"),
+    "gedit": ("gedit", "gedit"),
+}
+
+_PORT_PATTERNS = [
+    re.compile(r"--remote-debugging-port=(\d+)"),
+    # socat tcp-listen:9222,fork ... (OSWorld's Chrome DevTools forwarder)
+    re.compile(r"tcp-listen:(\d+)", re.IGNORECASE),
+]
+
+_PROBE_SCRIPT = """
+import shutil, socket, subprocess, sys, time
+P, W, PORT, T, I = {process!r}, {window!r}, {port!r}, {timeout!r}, {interval!r}
+XDO = shutil.which("xdotool")
+def ready():
+    if P and subprocess.run(["pgrep", "-x", P], stdout=subprocess.DEVNULL).returncode:
+        return False
+    if W and XDO and subprocess.run(["xdotool", "search", "--onlyvisible", "--class", W],
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode:
+        return False
+    if PORT:
+        try:
+            socket.create_connection(("127.0.0.1", PORT), 0.5).close()
+        except OSError:
+            return False
+    return True
+deadline = time.time() + T
+while not ready():
+    if time.time() >= deadline:
+        sys.exit(1)
+    time.sleep(I)
+"""
+
+
+class Readiness:
+    """What "started" means for one launched application."""
+
+    def __init__(self, process: Optional[str] = None, window: Optional[str] = None, port: Optional[int] = None):
+        self.process = process
+        self.window = window
+        self.port = port
+
+    def __bool__(self) -> bool:
+        return bool(self.process or self.window or self.port)
+
+    def command(self, timeout: float, interval: float = SETUP_PROBE_INTERVAL) -> List[str]:
+        """Polling loop run on the VM; exits 0 once ready, 1 after the timeout."""
+        script = _PROBE_SCRIPT.format(
+            process=self.process, window=self.window, port=self.port,
+            timeout=timeout, interval=interval,
+        )
+        return ["python3", "-c", script]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"process": self.process, "window": self.window, "port": self.port}
+
+
+def infer_readiness(command, ready: Optional[Dict[str, Any]] = None) -> Readiness:
+    """
+    Readiness probe for a launch command.
+
+    Args:
+        command: Launch command (argv list or shell string)
+        ready: Explicit probe from the step's "ready" parameter
+            ({"process": ..., "window": ..., "port": ...}), overriding inference
+    """
+    argv = shlex.split(command) if isinstance(command, str) else [str(c) for c in command]
+    process = window = port = None
+    if argv:
+        process, window = APP_PROBES.get(os.path.basename(argv[0]), (None, None))
+    joined = " ".join(argv)
+    for pattern in _PORT_PATTERNS:
+        match = pattern.search(joined)
+        if match:
+            port = int(match.group(1))
+            break
+    if ready:
+        process = ready.get("process", process)
+        window = ready.get("window", window)
+        port = ready.get("port", port)
+    return Readiness(process, window, port)
+
+
+class SetupStep:
+    def __init__(self, index: int, config: Dict[str, Any]):
+        self.index = index
+        self.type = config.get("type")
+        self.params = config.get("parameters", {}) or {}
+        self.readiness = (
+            infer_readiness(self.params.get("command", []), self.params.get("ready"))
+            if self.type == "launch" else Readiness()
+        )
+
+    def describe(self) -> str:
+        command = self.params.get("command", "")
+        return command if isinstance(command, str) else " ".join(map(str, command))
+
+
+def parse_setup(config_list: List[Dict[str, Any]]) -> List[SetupStep]:
+    return [SetupStep(i, config) for i, config in enumerate(config_list or [])]
+
+
+def leading_launches(steps: List[SetupStep]) -> List[SetupStep]:
+    """Launch steps that do not come after an execute step (safe to start early)."""
+    launches = []
+    for step in steps:
+        if step.type in ("execute", "command"):
+            break
+        if step.type == "launch":
+            launches.append(step)
+    return launches
+
+
+class SetupRunner:
+    """Runs setup steps for one VM; each worker thread uses its own client."""
+
+    def __init__(
+        self,
+        base_url: str,
+        probe_timeout: float = SETUP_PROBE_TIMEOUT,
+        max_workers: int = SETUP_MAX_WORKERS,
+    ):
+        self.base_url = base_url
+        self.probe_timeout = probe_timeout
+        self.max_workers = max_workers
+        self._local = threading.local()
+        self._clients: List[OSWorldClient] = []
+        self._clients_lock = threading.Lock()
+
+    def _client(self) -> OSWorldClient:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = OSWorldClient(self.base_url)
+            with self._clients_lock:
+                self._clients.append(client)
+        return client
+
+    def close(self):
+        for client in self._clients:
+            client.close()
+        self._clients = []
+
+    def probe(self, readiness: Readiness, timeout: float) -> bool:
+        result = self._client().execute(readiness.command(timeout), timeout=int(timeout) + 10)
+        return result.get("returncode") == 0
+
+    @staticmethod
+    def _wait(after: List[Future]):
+        """Wait for the steps this one depends on; their failures are reported by them."""
+        for future in after:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def _launch(self, step: SetupStep, after: List[Future]) -> Dict[str, Any]:
+        self._wait(after)
+        t0 = time.perf_counter()
+        command = step.params.get("command", [])
+        command_str = command if isinstance(command, str) else shlex.join(map(str, command))
+        logger.info(f"Launching in background: {command_str}")
+        try:
+            self._client().execute(f"{command_str} >/dev/null 2>&1 &", shell=True, timeout=10)
+        except Exception as e:
+            # The launch may time out while the app keeps starting in the background
+            logger.debug(f"Launch request for '{command_str}' did not return cleanly: {e}")
+        ready = None
+        if step.readiness:
+            ready = self.probe(step.readiness, self.probe_timeout)
+            if not ready:
+                logger.warning(f"'{command_str}' not ready after {self.probe_timeout:.0f}s ({step.readiness.to_dict()})")
+        return {"type": "launch", "command": command_str, "ready": ready, "time_sec": round(time.perf_counter() - t0, 3)}
+
+    def _execute(self, step: SetupStep, after: List[Future]) -> Dict[str, Any]:
+        self._wait(after)
+        t0 = time.perf_counter()
+        command = step.params.get("command", [])
+        logger.info(f"Executing: {step.describe()}")
+        result = self._client().execute(command, shell=step.params.get("shell", False), timeout=SETUP_EXECUTE_TIMEOUT)
+        logger.debug(f"Result: {result}")
+        return {"type": step.type, "command": step.describe(), "time_sec": round(time.perf_counter() - t0, 3)}
+
+    def run(
+        self,
+        config_list: List[Dict[str, Any]],
+        only_leading_launches: bool = False,
+        warm: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Run setup steps.
+
+        Args:
+            config_list: The task's OSWorld "config" list
+            only_leading_launches: Start just the launches that can run before
+                any execute step (pre-warming)
+            warm: The VM was pre-warmed for this task; leading launches whose
+                probes already pass are not repeated. On any other VM a
+                running instance (e.g. with other arguments) is not enough
+
+        Returns:
+            Report with time_sec, ready (every launch passed its probe; None
+            if some launch had nothing to probe) and per-step entries
+        """
+        t0 = time.perf_counter()
+        steps = parse_setup(config_list)
+        leading = leading_launches(steps)
+        if only_leading_launches:
+            steps = leading
+        entries: List[Dict[str, Any]] = []
+        futures: List[Future] = []
+        unprobed_launch = False
+        # Execute steps submitted since the last sleep; a launch waits for them
+        executes: List[Future] = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="task-setup") as pool:
+            skip = set()
+            if warm and not only_leading_launches:
+                # Applications this task's pre-warm already started are not launched again
+                probed = [s for s in leading if s.readiness]
+                already = list(pool.map(lambda s: self._safe_probe(s.readiness), probed))
+                skip = {s.index for s, up in zip(probed, already) if up}
+
+            def wait_pending():
+                for future in futures:
+                    try:
+                        entries.append(future.result())
+                    except Exception as e:
+                        logger.warning(f"Setup command failed (continuing anyway): {e}")
+                        entries.append({"error": f"{type(e).__name__}: {e}"})
+                futures.clear()
+
+            for step in steps:
+                if step.type == "launch":
+                    if step.index in skip:
+                        entries.append({"type": "launch", "command": step.describe(), "ready": True, "skipped": True, "time_sec": 0.0})
+                        continue
+                    unprobed_launch |= not step.readiness
+                    futures.append(pool.submit(self._launch, step, list(executes)))
+                elif step.type in ("execute", "command"):
+                    # Everything before it, including launches and their probes
+                    future = pool.submit(self._execute, step, list(futures))
+                    futures.append(future)
+                    executes.append(future)
+                elif step.type == "sleep":
+                    # Probes replace the sleep; keep it for launches we cannot probe
+                    # and for async work that execute steps may have started
+                    wait_pending()
+                    seconds = step.params.get("seconds", 1)
+                    if unprobed_launch or executes:
+                        logger.info(f"Sleeping for {seconds} seconds")
+                        time.sleep(seconds)
+                    else:
+                        logger.info(f"Skipping {seconds}s sleep: every launch before it passed its probe")
+                    entries.append({"type": "sleep", "seconds": seconds, "skipped": not (unprobed_launch or executes)})
+                    unprobed_launch = False
+                    executes = []
+                else:
+                    logger.warning(f"Unsupported setup step type '{step.type}', skipping")
+            wait_pending()
+
+        launches = [e for e in entries if e.get("type") == "launch"]
+        if any(e.get("ready") is None for e in launches):
+            ready = None
+        else:
+            ready = all(e.get("ready") for e in launches)
+        report = {
+            "time_sec": round(time.perf_counter() - t0, 3),
+            "ready": ready,
+            "steps": entries,
+        }
+        logger.info(f"Setup finished in {report['time_sec']:.1f}s (ready={ready})")
+        return report
+
+    def _safe_probe(self, readiness: Readiness) -> bool:
+        try:
+            return self.probe(readiness, 0)
+        except Exception:
+            return False
+
+
+def run_setup(client: OSWorldClient, config_list: List[Dict[str, Any]], warm: bool = False) -> Dict[str, Any]:
+    """
+    Run a task's setup on the client's VM and wait until it is usable.
+
+    Pass warm=True only when the VM was pre-warmed for this task
+    (SweepTask.warm).
+
+    When every launched application passed its probe there is nothing left
+    to wait for (adaptive mode still lets the first frames settle);
+    otherwise falls back to the settle wait.
+    """
+    runner = SetupRunner(client.base_url)
+    try:
+        report = runner.run(config_list, warm=warm)
+    finally:
+        runner.close()
+    if report["ready"]:
+        if OSWORLD_SETTLE_MODE == "adaptive":
+            wait_for_settle(client, "setup")
+    elif config_list:
+        settle(client, "setup", fixed_sleep=2, require_change=True)
+    return report
+
+
+def prewarm(base_url: str, config_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Start a task's leading launch steps on an idle VM ahead of the task."""
+    runner = SetupRunner(base_url)
+    try:
+        return runner.run(config_list, only_leading_launches=True)
+    finally:
+        runner.close()
@@ -0,0 +1,72 @@
+"""
+Step Timelines
+
+Per-step phase timings recorded by the runners alongside each action, and
+the per-run summary served by /assessments/{id}/timeline.
+
+Phases (seconds, wall clock; a phase a runner does not have is omitted):
+    settle     wait for the UI after the previous action
+    capture    screenshot (+ accessibility tree) for this step
+    encode     frame diff and observation encoding
+    obs_wait   time the step loop blocked on the pipelined observation
+    artifact   queueing the frame for the artifact writer
+    decide     white agent round trip
+    execute    running the action on the VM
+    step       whole step, when only coarse timestamps exist (legacy runner)
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple
+
+PHASES = ("settle", "capture", "encode", "obs_wait", "artifact", "decide", "execute", "step")
+
+
+class StepTimer:
+    """Accumulates phase durations for one step."""
+
+    def __init__(self):
+        self._phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    def to_dict(self) -> Dict[str, float]:
+        return {name: round(sec, 4) for name, sec in self._phases.items()}
+
+
+def action_record(action: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """(op, args) to store for a white agent action in either action format."""
+    if action.get("op"):
+        return action["op"], action.get("args") or {}
+    op = action.get("action_type") or "unknown"
+    return op, {k: v for k, v in action.items() if k != "action_type"}
+
+
+def summarize(steps: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-phase total/mean/max over a run's recorded steps."""
+    phases: Dict[str, Dict[str, float]] = {}
+    for step in steps:
+        for name, sec in (step.get("timings") or {}).items():
+            p = phases.setdefault(name, {"total_sec": 0.0, "max_sec": 0.0, "count": 0})
+            p["total_sec"] += sec
+            p["max_sec"] = max(p["max_sec"], sec)
+            p["count"] += 1
+    for p in phases.values():
+        p["mean_sec"] = round(p["total_sec"] / p["count"], 4)
+        p["total_sec"] = round(p["total_sec"], 4)
+    ordered = {name: phases[name] for name in PHASES if name in phases}
+    ordered.update({name: p for name, p in phases.items() if name not in ordered})
+    return {
+        "steps": len(steps),
+        "failed_steps": sum(1 for s in steps if not s.get("ok")),
+        "phases": ordered,
+    }
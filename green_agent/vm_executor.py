@@ -0,0 +1,271 @@
+"""
+Persistent pyautogui Executor
+
+Optional long-lived action executor that runs on the OSWorld VM. It is
+started once through the /execute endpoint, keeps pyautogui (and the X
+display connection) loaded, and accepts typed action messages over a TCP
+channel instead of a freshly generated script per /run_python call.
+
+Protocol: newline-delimited JSON.
+    request:  {"id": 1, "actions": [{"op": "click", "args": {...}}, ...], "stop_on_error": true}
+    response: {"id": 1, "results": [{"index": 0, "op": "click", "ok": true, "time_sec": 0.01}, ...]}
+A request of {"id": n, "ping": true} is answered with {"id": n, "pong": true}.
+Every request carries the session token the executor was started with
+("token"); requests without it are answered with {"error": "unauthorized"}
+and never run.
+
+A request that could not be sent (ExecutorSendError) never ran and may be
+retried through /run_python. Once it was sent, a lost or malformed reply
+(ExecutorReplyError) means the actions may have run, so they are not retried.
+"""
+
+import os
+import json
+import shlex
+import secrets
+import socket
+import asyncio
+import logging
+import itertools
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+OSWORLD_PERSISTENT_EXECUTOR = os.environ.get("OSWORLD_PERSISTENT_EXECUTOR", "0") == "1"
+OSWORLD_EXECUTOR_PORT = int(os.environ.get("OSWORLD_EXECUTOR_PORT", 5050))
+OSWORLD_EXECUTOR_TIMEOUT = float(os.environ.get("OSWORLD_EXECUTOR_TIMEOUT", 30))
+# Shared secret the executor requires on every request (default: random per process)
+OSWORLD_EXECUTOR_TOKEN = os.environ.get("OSWORLD_EXECUTOR_TOKEN") or secrets.token_hex(16)
+
+# Matches the executor's command line (pkill -f) without matching itself
+EXECUTOR_PROCESS_PATTERN = "green[-]agent[-]executor"
+
+
+class ExecutorSendError(ConnectionError):
+    """The request did not reach the executor; nothing ran."""
+
+
+class ExecutorReplyError(Exception):
+    """The request was sent but no valid reply came back; actions may have run."""
+
+# Runs on the VM with its own interpreter; must stay dependency-free apart from pyautogui.
+EXECUTOR_SOURCE = r'''
+# green-agent-executor
+import hmac, json, os, socketserver, sys, threading, time
+import pyautogui
+
+TOKEN = os.environ.pop("GREEN_EXECUTOR_TOKEN", "")
+if not TOKEN:
+    sys.exit("GREEN_EXECUTOR_TOKEN is not set")
+
+pyautogui.FAILSAFE = False
+LOCK = threading.Lock()
+
+
+def _xy(a):
+    return (a["x"], a["y"]) if a.get("x") is not None and a.get("y") is not None else ()
+
+
+OPS = {
+    "click": lambda a: pyautogui.click(*_xy(a), clicks=a.get("clicks", 1), button=a.get("button", "left")),
+    "double_click": lambda a: pyautogui.doubleClick(*_xy(a)),
+    "right_click": lambda a: pyautogui.rightClick(*_xy(a)),
+    "move": lambda a: pyautogui.moveTo(*_xy(a)),
+    "drag": lambda a: pyautogui.dragTo(a["x"], a["y"], duration=a.get("duration", 0.5), button=a.get("button", "left")),
+    "mouse_down": lambda a: pyautogui.mouseDown(*_xy(a), button=a.get("button", "left")),
+    "mouse_up": lambda a: pyautogui.mouseUp(*_xy(a), button=a.get("button", "left")),
+    "type": lambda a: pyautogui.write(a.get("text", ""), interval=a.get("interval") or 0.0),
+    "press": lambda a: pyautogui.press(a["key"], presses=a.get("presses") or 1, interval=a.get("interval") or 0.0),
+    "key_down": lambda a: pyautogui.keyDown(a["key"]),
+    "key_up": lambda a: pyautogui.keyUp(a["key"]),
+    "hotkey": lambda a: pyautogui.hotkey(*a.get("keys", [])),
+    "scroll": lambda a: pyautogui.scroll(a.get("amount", 0), *_xy(a)),
+    "wait": lambda a: time.sleep(a.get("seconds", a.get("duration", 1.0))),
+    "raw": lambda a: eval(a["code"], {"pyautogui": pyautogui, "time": time}),
+}
+
+
+def run(actions, stop_on_error):
+    results = []
+    for i, action in enumerate(actions):
+        op = action.get("op", "")
+        if stop_on_error and any(not r["ok"] for r in results):
+            results.append({"index": i, "op": op, "ok": False, "skipped": True})
+            continue
+        t0 = time.time()
+        try:
+            OPS[op](action.get("args") or {})
+            results.append({"index": i, "op": op, "ok": True, "time_sec": round(time.time() - t0, 4)})
+        except Exception as e:
+            results.append({"index": i, "op": op, "ok": False, "error": repr(e)})
+    return results
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            msg = json.loads(line)
+            if not hmac.compare_digest(str(msg.get("token", "")), TOKEN):
+                self.wfile.write((json.dumps({"id": msg.get("id"), "error": "unauthorized"}) + "\n").encode())
+                return
+            if msg.get("ping"):
+                reply = {"id": msg.get("id"), "pong": True}
+            else:
+                with LOCK:
+                    reply = {"id": msg.get("id"), "results": run(msg.get("actions", []), msg.get("stop_on_error", True))}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+            self.wfile.flush()
+
+
+socketserver.ThreadingTCPServer.allow_reuse_address = True
+socketserver.ThreadingTCPServer.daemon_threads = True
+socketserver.ThreadingTCPServer(("0.0.0.0", int(sys.argv[1])), Handler).serve_forever()
+'''
+
+
+def bootstrap_command(port: int, token: str = OSWORLD_EXECUTOR_TOKEN) -> str:
+    """Shell command that starts the executor in the background on the VM."""
+    return (
+        f"GREEN_EXECUTOR_TOKEN={shlex.quote(token)} DISPLAY=${{DISPLAY:-:0}} "
+        f"nohup python3 -c {shlex.quote(EXECUTOR_SOURCE)} {port} "
+        f"> /tmp/green_agent_executor.log 2>&1 &"
+    )
+
+
+def stop_command() -> List[str]:
+    """Stops an executor left running (e.g. one started with another token)."""
+    return ["pkill", "-f", EXECUTOR_PROCESS_PATTERN]
+
+
+def executor_host(base_url: str) -> str:
+    return urlparse(base_url).hostname or "localhost"
+
+
+def results_to_response(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Shape a single-action result like a /run_python response."""
+    failed = [r for r in results if not r.get("ok")]
+    return {
+        "status": "error" if failed else "success",
+        "output": "",
+        "error": failed[0].get("error", "skipped") if failed else "",
+        "results": results,
+    }
+
+
+def unconfirmed_results(actions: List[Dict[str, Any]], error: Exception) -> List[Dict[str, Any]]:
+    """Results for actions whose reply was lost; they may have run, so they are not retried."""
+    return [
+        {"index": i, "op": a.get("op", ""), "ok": False, "error": f"executor reply lost ({error}); not retried"}
+        for i, a in enumerate(actions)
+    ]
+
+
+def _parse_reply(line: bytes) -> Dict[str, Any]:
+    if not line:
+        raise ExecutorReplyError("executor closed the connection")
+    try:
+        reply = json.loads(line)
+    except ValueError as e:
+        raise ExecutorReplyError(f"malformed reply: {e}") from e
+    if not isinstance(reply, dict):
+        raise ExecutorReplyError("malformed reply")
+    if reply.get("error") == "unauthorized":
+        # Rejected before anything ran
+        raise ExecutorSendError("executor rejected the session token")
+    return reply
+
+
+def _results(reply: Dict[str, Any]) -> List[Dict[str, Any]]:
+    results = reply.get("results")
+    if not isinstance(results, list):
+        raise ExecutorReplyError("reply has no results")
+    return results
+
+
+class ActionExecutorSession:
+    """Blocking connection to the persistent executor."""
+
+    def __init__(self, host: str, port: int = OSWORLD_EXECUTOR_PORT,
+                 timeout: float = OSWORLD_EXECUTOR_TIMEOUT, token: str = OSWORLD_EXECUTOR_TOKEN):
+        self._token = token
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.settimeout(timeout)
+        self._reader = self._sock.makefile("rb")
+        self._ids = itertools.count(1)
+
+    def _request(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        msg["id"] = next(self._ids)
+        msg["token"] = self._token
+        try:
+            # A partial line is never run: the executor only acts on complete JSON lines
+            self._sock.sendall((json.dumps(msg) + "\n").encode())
+        except OSError as e:
+            raise ExecutorSendError(str(e)) from e
+        try:
+            line = self._reader.readline()
+        except OSError as e:
+            raise ExecutorReplyError(f"no reply: {e!r}") from e
+        return _parse_reply(line)
+
+    def ping(self) -> bool:
+        return bool(self._request({"ping": True}).get("pong"))
+
+    def run_actions(self, actions: List[Dict[str, Any]], stop_on_error: bool = True) -> List[Dict[str, Any]]:
+        return _results(self._request({"actions": actions, "stop_on_error": stop_on_error}))
+
+    def close(self):
+        try:
+            self._reader.close()
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class AsyncActionExecutorSession:
+    """asyncio connection to the persistent executor."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 timeout: float = OSWORLD_EXECUTOR_TIMEOUT, token: str = OSWORLD_EXECUTOR_TOKEN):
+        self._token = token
+        self._reader = reader
+        self._writer = writer
+        self._timeout = timeout
+        self._ids = itertools.count(1)
+        # One request in flight at a time; replies are matched by order
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def connect(cls, host: str, port: int = OSWORLD_EXECUTOR_PORT,
+                      timeout: float = OSWORLD_EXECUTOR_TIMEOUT,
+                      token: str = OSWORLD_EXECUTOR_TOKEN) -> "AsyncActionExecutorSession":
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        return cls(reader, writer, timeout, token)
+
+    async def _request(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        async with self._lock:
+            msg["id"] = next(self._ids)
+            msg["token"] = self._token
+            try:
+                self._writer.write((json.dumps(msg) + "\n").encode())
+                await self._writer.drain()
+            except OSError as e:
+                raise ExecutorSendError(str(e)) from e
+            try:
+                line = await asyncio.wait_for(self._reader.readline(), self._timeout)
+            except (OSError, asyncio.TimeoutError, ValueError) as e:
+                raise ExecutorReplyError(f"no reply: {e!r}") from e
+        return _parse_reply(line)
+
+    async def ping(self) -> bool:
+        return bool((await self._request({"ping": True})).get("pong"))
+
+    async def run_actions(self, actions: List[Dict[str, Any]], stop_on_error: bool = True) -> List[Dict[str, Any]]:
+        return _results(await self._request({"actions": actions, "stop_on_error": stop_on_error}))
+
+    async def close(self):
+        try:
+            self._writer.close()
+            await self._writer.wait_closed()
+        except (OSError, ConnectionError):
+            pass
@@ -0,0 +1,362 @@
+"""
+OSWorld VM Pool
+
+Keeps a set of OSWorld REST endpoints (one per golden-image VM) and hands
+each assessment an exclusive lease on one of them. VMs are health-checked
+through OSWorldClient.health_check before being leased and go back into the
+pool only after a reset (see green_agent.vm_reset), so concurrent runs never
+share a desktop.
+
+Which idle VM a lease gets is decided by a pluggable scheduler. An idle VM
+can also be pre-warmed for a specific upcoming task (prewarm); that task's
+acquire then gets it, and any other lease resets it first.
+"""
+
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Callable, Iterator
+
+from .osworld_client import OSWorldClient
+from .vm_reset import get_resetter, kill_warmed_apps
+
+logger = logging.getLogger(__name__)
+
+OSWORLD_SERVER_URL = os.environ.get("OSWORLD_SERVER_URL", "http://localhost:5000")
+# Comma-separated list of OSWorld endpoints; falls back to the single server URL
+OSWORLD_SERVER_URLS = os.environ.get("OSWORLD_SERVER_URLS", "")
+OSWORLD_POOL_SCHEDULER = os.environ.get("OSWORLD_POOL_SCHEDULER", "lru")
+OSWORLD_LEASE_TIMEOUT = float(os.environ.get("OSWORLD_LEASE_TIMEOUT", 600))
+OSWORLD_POOL_RECHECK_SEC = float(os.environ.get("OSWORLD_POOL_RECHECK_SEC", 30))
+
+
+class NoVMAvailableError(Exception):
+    """Raised when no healthy VM could be leased before the timeout."""
+
+
+class PooledVM:
+    """Book-keeping for one OSWorld endpoint in the pool."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.leased = False
+        self.last_released = 0.0
+        self.last_checked = 0.0
+        self.last_domain: Optional[str] = None
+        self.lease_count = 0
+        # Key of the task this idle VM was pre-warmed for, and that task's domain
+        self.warm_key: Optional[str] = None
+        self.warm_domain: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "leased": self.leased,
+            "last_domain": self.last_domain,
+            "lease_count": self.lease_count,
+            "warm_key": self.warm_key,
+        }
+
+
+class VMLease:
+    """Exclusive use of one pooled VM by one assessment."""
+
+    def __init__(self, vm: PooledVM, domain: Optional[str] = None):
+        self.vm = vm
+        self.domain = domain
+        self.acquired_at = time.time()
+        self.released = False
+        # Per-lease cache of facts that do not change during a run
+        self.screen_size: Optional[Dict[str, int]] = None
+        # Set by the reset function on release (strategy, cost)
+        self.reset_report: Optional[Dict[str, Any]] = None
+        # The VM was pre-warmed for this lease's task (see VMPool.prewarm)
+        self.warm = False
+
+    @property
+    def url(self) -> str:
+        return self.vm.url
+
+
+# --- Schedulers ---
+class Scheduler:
+    """Picks which idle, healthy VM a new lease gets."""
+
+    def choose(self, candidates: List[PooledVM], domain: Optional[str] = None) -> PooledVM:
+        raise NotImplementedError
+
+
+class LRUScheduler(Scheduler):
+    """Lease the VM that has been idle the longest, spreading wear evenly."""
+
+    def choose(self, candidates: List[PooledVM], domain: Optional[str] = None) -> PooledVM:
+        return min(candidates, key=lambda vm: vm.last_released)
+
+
+class DomainAffinityScheduler(Scheduler):
+    """
+    Prefer a VM that last ran a task from the same domain (its applications
+    and caches are likely warm), falling back to least-recently-used.
+    """
+
+    def choose(self, candidates: List[PooledVM], domain: Optional[str] = None) -> PooledVM:
+        if domain:
+            same = [vm for vm in candidates if vm.last_domain == domain]
+            if same:
+                return min(same, key=lambda vm: vm.last_released)
+        return min(candidates, key=lambda vm: vm.last_released)
+
+
+SCHEDULERS: Dict[str, Callable[[], Scheduler]] = {
+    "lru": LRUScheduler,
+    "domain_affinity": DomainAffinityScheduler,
+}
+
+
+def register_scheduler(name: str, factory: Callable[[], Scheduler]) -> None:
+    """Make a custom scheduler selectable via OSWORLD_POOL_SCHEDULER."""
+    SCHEDULERS[name] = factory
+
+
+def get_scheduler(name: str) -> Scheduler:
+    try:
+        return SCHEDULERS[name]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown pool scheduler '{name}'. Available: {', '.join(SCHEDULERS)}"
+        )
+
+
+def _health_check(url: str) -> bool:
+    client = OSWorldClient(base_url=url)
+    try:
+        return client.health_check()
+    finally:
+        client.close()
+
+
+class VMPool:
+    """Thread-safe pool of OSWorld VMs with exclusive leases."""
+
+    def __init__(
+        self,
+        urls: List[str],
+        scheduler: Optional[Scheduler] = None,
+        reset_fn: Optional[Callable[[VMLease], bool]] = None,
+        health_check_fn: Callable[[str], bool] = _health_check,
+        unwarm_fn: Callable[[str], bool] = kill_warmed_apps,
+    ):
+        """
+        Args:
+            urls: OSWorld REST endpoints (e.g., ["http://10.128.0.10:5000", ...])
+            scheduler: Lease scheduler (default: least-recently-used)
+            reset_fn: Called with the lease on release; returns False if the VM
+                could not be restored and should be taken out of rotation
+                (default: the process-wide VMResetter)
+            health_check_fn: Probe used before leasing a VM
+            unwarm_fn: Closes a pre-warmed VM's apps before it goes to another
+                task (always, then reset_fn runs as on release)
+        """
+        if not urls:
+            raise ValueError("VMPool needs at least one OSWorld endpoint")
+        self.vms = [PooledVM(url) for url in dict.fromkeys(urls)]
+        self.scheduler = scheduler or LRUScheduler()
+        self.reset_fn = reset_fn or get_resetter()
+        self._health_check = health_check_fn
+        self._unwarm = unwarm_fn
+        self._cond = threading.Condition()
+
+    def _candidates(self) -> List[PooledVM]:
+        now = time.time()
+        return [
+            vm for vm in self.vms
+            if not vm.leased
+            and (vm.healthy or now - vm.last_checked >= OSWORLD_POOL_RECHECK_SEC)
+        ]
+
+    def _choose(self, candidates: List[PooledVM], domain: Optional[str], key: Optional[str]) -> PooledVM:
+        if key:
+            warm = [vm for vm in candidates if vm.warm_key == key]
+            if warm:
+                return warm[0]
+        # Leave VMs warmed for other tasks alone while there are cold ones
+        cold = [vm for vm in candidates if vm.warm_key is None]
+        return self.scheduler.choose(cold or candidates, domain)
+
+    def acquire(
+        self,
+        domain: Optional[str] = None,
+        timeout: Optional[float] = None,
+        key: Optional[str] = None,
+    ) -> VMLease:
+        """
+        Lease a healthy VM, blocking until one is free.
+
+        Args:
+            domain: Task domain (used by affinity-aware schedulers)
+            timeout: Seconds to wait (default: OSWORLD_LEASE_TIMEOUT)
+            key: Task key; a VM pre-warmed for this task is preferred
+
+        Raises:
+            NoVMAvailableError: If no healthy VM became free in time
+        """
+        timeout = OSWORLD_LEASE_TIMEOUT if timeout is None else timeout
+        deadline = time.time() + timeout
+        while True:
+            with self._cond:
+                while True:
+                    candidates = self._candidates()
+                    if candidates:
+                        break
+                    if not any(vm.leased for vm in self.vms):
+                        # Nothing will be released; every VM failed its last check
+                        raise NoVMAvailableError(
+                            f"All {len(self.vms)} OSWorld VMs are not responding"
+                        )
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise NoVMAvailableError(
+                            f"No healthy OSWorld VM available after {timeout:.0f}s "
+                            f"({len(self.vms)} in pool)"
+                        )
+                    # Wake up periodically so unhealthy VMs get rechecked
+                    self._cond.wait(timeout=min(remaining, OSWORLD_POOL_RECHECK_SEC))
+                vm = self._choose(candidates, domain, key)
+                vm.leased = True
+                stale_warm = vm.warm_key is not None and vm.warm_key != key
+                warm = vm.warm_key is not None and vm.warm_key == key
+                warm_domain = vm.warm_domain
+                vm.warm_key = vm.warm_domain = None
+
+            # Probe outside the lock so a slow VM does not stall other leases
+            if stale_warm:
+                # Warmed for another task; close its pre-launched apps first
+                try:
+                    healthy = bool(self._unwarm(vm.url)) and bool(self.reset_fn(VMLease(vm, warm_domain)))
+                except Exception as e:
+                    logger.warning(f"Reset of pre-warmed OSWorld VM {vm.url} failed: {e}")
+                    healthy = False
+            else:
+                healthy = self._health_check(vm.url)
+            with self._cond:
+                vm.last_checked = time.time()
+                vm.healthy = healthy
+                if healthy:
+                    vm.lease_count += 1
+                    logger.info(f"Leased OSWorld VM {vm.url} (domain={domain}, warm={warm})")
+                    lease = VMLease(vm, domain)
+                    lease.warm = warm
+                    return lease
+                vm.leased = False
+                logger.warning(f"OSWorld VM {vm.url} failed health check, skipping")
+                self._cond.notify_all()
+
+    def release(self, lease: VMLease, reset: bool = True) -> None:
+        """
+        Return a leased VM to the pool, resetting it first.
+
+        A VM whose reset fails is marked unhealthy and only rejoins the pool
+        after a later health check succeeds.
+        """
+        if lease.released:
+            return
+        lease.released = True
+        vm = lease.vm
+        ok = True
+        if reset:
+            try:
+                ok = bool(self.reset_fn(lease))
+            except Exception as e:
+                logger.warning(f"Reset of OSWorld VM {vm.url} failed: {e}")
+                ok = False
+        with self._cond:
+            vm.leased = False
+            vm.healthy = ok
+            vm.last_checked = time.time()
+            vm.last_released = time.time()
+            vm.last_domain = lease.domain
+            self._cond.notify_all()
+        logger.info(f"Released OSWorld VM {vm.url} (healthy={ok})")
+
+    def prewarm(self, key: str, domain: Optional[str], warm_fn: Callable[[str], Any]) -> bool:
+        """
+        Prepare an idle VM for an upcoming task in the background.
+
+        Takes an idle, healthy, cold VM (never waits for one), runs
+        warm_fn(url) on a background thread and returns the VM to the pool
+        marked warm for key. A failed warm-up resets the VM.
+
+        Returns:
+            True if a VM was taken for warming
+        """
+        with self._cond:
+            idle = [vm for vm in self.vms if not vm.leased and vm.healthy and vm.warm_key is None]
+            if not idle:
+                return False
+            vm = self.scheduler.choose(idle, domain)
+            vm.leased = True
+
+        def warm():
+            lease = VMLease(vm, domain)
+            try:
+                warm_fn(vm.url)
+            except Exception as e:
+                logger.warning(f"Pre-warming OSWorld VM {vm.url} for {key} failed: {e}")
+                self.release(lease)
+                return
+            with self._cond:
+                vm.leased = False
+                vm.warm_key = key
+                vm.warm_domain = domain
+                self._cond.notify_all()
+            logger.info(f"Pre-warmed OSWorld VM {vm.url} for {key}")
+
+        threading.Thread(target=warm, name=f"prewarm-{key}", daemon=True).start()
+        return True
+
+    @contextmanager
+    def lease(self, domain: Optional[str] = None, timeout: Optional[float] = None) -> Iterator[VMLease]:
+        """Context manager form of acquire/release."""
+        lease = self.acquire(domain=domain, timeout=timeout)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def stats(self) -> Dict[str, Any]:
+        reset_stats = getattr(self.reset_fn, "stats", None)
+        with self._cond:
+            return {
+                "size": len(self.vms),
+                "leased": sum(1 for vm in self.vms if vm.leased),
+                "healthy": sum(1 for vm in self.vms if vm.healthy),
+                "scheduler": type(self.scheduler).__name__,
+                "reset": reset_stats() if reset_stats else None,
+                "vms": [vm.to_dict() for vm in self.vms],
+            }
+
+
+def configured_urls() -> List[str]:
+    """OSWorld endpoints from OSWORLD_SERVER_URLS, or the single OSWORLD_SERVER_URL."""
+    urls = [u.strip() for u in OSWORLD_SERVER_URLS.split(",") if u.strip()]
+    return urls or [OSWORLD_SERVER_URL]
+
+
+_pool: Optional[VMPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> VMPool:
+    """Process-wide pool built from the environment on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = VMPool(
+                configured_urls(),
+                scheduler=get_scheduler(OSWORLD_POOL_SCHEDULER),
+            )
+        return _pool
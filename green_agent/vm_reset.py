@@ -0,0 +1,475 @@
+"""
+VM Reset Strategies
+
+Restores a pooled OSWorld VM to a clean state between tasks. Strategies,
+from cheapest to strongest:
+
+    apps       kill the known desktop applications and, if configured,
+               restore or wipe their profiles
+    overlay    roll back a filesystem overlay on the VM (needs
+               OSWORLD_RESET_OVERLAY_COMMAND, a rollback script on the VM)
+    snapshot   restore the whole VM from a snapshot through a pluggable
+               provider (needs OSWORLD_RESET_SNAPSHOT_COMMAND or a provider
+               registered with register_snapshot_provider)
+
+Each task domain needs a minimum isolation level (apps < filesystem <
+full); VMResetter picks the cheapest available strategy that provides it,
+using measured reset times once it has them, and escalates to a stronger
+strategy if a reset fails. A VMResetter is the default VMPool.reset_fn.
+
+Resetting is opt-in: by default (OSWORLD_RESET=none) a released VM is only
+health-checked, and no profile is touched unless listed in
+OSWORLD_RESET_PROFILE_DIRS.
+"""
+
+import os
+import shlex
+import time
+import threading
+import subprocess
+import logging
+from typing import Dict, Any, Optional, List, Callable
+from urllib.parse import urlparse
+
+from .osworld_client import OSWorldClient
+
+logger = logging.getLogger(__name__)
+
+# none (health check only), auto (cheapest strategy that isolates the task's
+# domain), or a strategy name to always use
+OSWORLD_RESET = os.environ.get("OSWORLD_RESET", "none")
+# Process names (regular expressions, matched exactly) killed by the apps strategy
+OSWORLD_RESET_APPS = os.environ.get(
+    "OSWORLD_RESET_APPS", "chrome,soffice.bin,gimp.*,thunderbird,vlc,code"
+)
+# Profile and scratch paths reset by the apps strategy (expanded by the VM's shell),
+# e.g. "~/.config/google-chrome,/tmp/chrome-*". A path with a "<path>.baseline"
+# copy on the VM is restored from it; a path without one is deleted. Empty: none.
+OSWORLD_RESET_PROFILE_DIRS = os.environ.get("OSWORLD_RESET_PROFILE_DIRS", "")
+OSWORLD_RESET_OVERLAY_COMMAND = os.environ.get("OSWORLD_RESET_OVERLAY_COMMAND", "")
+OSWORLD_RESET_SNAPSHOT_PROVIDER = os.environ.get("OSWORLD_RESET_SNAPSHOT_PROVIDER", "command")
+# Run locally; {url} and {host} are replaced with the VM's OSWorld URL and host
+OSWORLD_RESET_SNAPSHOT_COMMAND = os.environ.get("OSWORLD_RESET_SNAPSHOT_COMMAND", "")
+OSWORLD_RESET_SNAPSHOT_TIMEOUT = float(os.environ.get("OSWORLD_RESET_SNAPSHOT_TIMEOUT", 600))
+# Seconds to wait for the OSWorld server to answer after an overlay or snapshot reset
+OSWORLD_RESET_BOOT_TIMEOUT = float(os.environ.get("OSWORLD_RESET_BOOT_TIMEOUT", 300))
+# Isolation a domain needs, e.g. "chrome=apps,os=full"; merged over DOMAIN_ISOLATION
+OSWORLD_RESET_ISOLATION = os.environ.get("OSWORLD_RESET_ISOLATION", "")
+OSWORLD_RESET_DEFAULT_ISOLATION = os.environ.get("OSWORLD_RESET_DEFAULT_ISOLATION", "filesystem")
+
+ISOLATION_LEVELS = {"none": 0, "apps": 1, "filesystem": 2, "full": 3}
+
+# What each OSWorld domain leaves behind: browser/player state lives in app
+# profiles; office, mail and editor tasks change files in the home directory;
+# os tasks change system settings outside it.
+DOMAIN_ISOLATION: Dict[str, str] = {
+    "chrome": "apps",
+    "gimp": "apps",
+    "vlc": "apps",
+    "libreoffice_calc": "filesystem",
+    "libreoffice_impress": "filesystem",
+    "libreoffice_writer": "filesystem",
+    "thunderbird": "filesystem",
+    "vs_code": "filesystem",
+    "multi_apps": "filesystem",
+    "os": "full",
+}
+
+
+def _split(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def _isolation_overrides(value: str) -> Dict[str, str]:
+    overrides = {}
+    for item in _split(value):
+        domain, _, level = item.partition("=")
+        if level.strip() not in ISOLATION_LEVELS:
+            raise ValueError(
+                f"Unknown isolation level '{level.strip()}' for domain '{domain.strip()}'. "
+                f"Available: {', '.join(ISOLATION_LEVELS)}"
+            )
+        overrides[domain.strip()] = level.strip()
+    return overrides
+
+
+def _health_check(url: str) -> bool:
+    client = OSWorldClient(base_url=url)
+    try:
+        return client.health_check()
+    finally:
+        client.close()
+
+
+def _wait_healthy(url: str, health_check_fn: Callable[[str], bool], timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while True:
+        if health_check_fn(url):
+            return True
+        if time.time() >= deadline:
+            return False
+        time.sleep(2)
+
+
+# --- Strategies ---
+class ResetStrategy:
+    """One way of restoring a VM; reset() returns False if the VM is not clean."""
+
+    name = ""
+    # Isolation the strategy guarantees (key of ISOLATION_LEVELS)
+    isolation = "none"
+    # Expected seconds per reset until real resets have been measured
+    default_cost = 0.0
+
+    def available(self) -> bool:
+        return True
+
+    def reset(self, url: str) -> bool:
+        raise NotImplementedError
+
+
+class KillAppsReset(ResetStrategy):
+    """
+    Kill the known applications and reset the configured profile paths in
+    one /execute call.
+
+    Deleting a browser profile brings back first-run dialogs; record a copy
+    of the golden image's profile next to it (cp -a DIR DIR.baseline) and the
+    reset restores that copy instead of leaving the directory empty.
+    """
+
+    name = "apps"
+    isolation = "apps"
+    default_cost = 3.0
+
+    def __init__(self, apps: Optional[List[str]] = None, profile_dirs: Optional[List[str]] = None):
+        self.apps = apps if apps is not None else _split(OSWORLD_RESET_APPS)
+        self.profile_dirs = profile_dirs if profile_dirs is not None else _split(OSWORLD_RESET_PROFILE_DIRS)
+
+    def command(self) -> str:
+        pattern = shlex.quote("|".join(self.apps))
+        # Paths are left unquoted so ~ and globs expand on the VM
+        wipe = (
+            f"for d in {' '.join(self.profile_dirs)}; do "
+            f'case "$d" in *.baseline) continue;; esac; '
+            f'rm -rf "$d"; if [ -e "$d.baseline" ]; then cp -a "$d.baseline" "$d"; fi; done; '
+        ) if self.profile_dirs else ""
+        return (
+            f"pkill -x {pattern}; "
+            f"for i in $(seq 20); do pgrep -x {pattern} >/dev/null || break; sleep 0.1; done; "
+            f"pkill -9 -x {pattern}; "
+            f"{wipe}true"
+        )
+
+    def reset(self, url: str) -> bool:
+        client = OSWorldClient(base_url=url)
+        try:
+            result = client.execute(self.command(), shell=True, timeout=30)
+        finally:
+            client.close()
+        return result.get("status", "success") == "success"
+
+
+class OverlayRollbackReset(ResetStrategy):
+    """
+    Roll back a filesystem overlay (e.g. an overlayfs over /home/user whose
+    upper layer is emptied and remounted) by running a script on the VM.
+    """
+
+    name = "overlay"
+    isolation = "filesystem"
+    default_cost = 15.0
+
+    def __init__(
+        self,
+        command: str = OSWORLD_RESET_OVERLAY_COMMAND,
+        health_check_fn: Callable[[str], bool] = _health_check,
+    ):
+        self.command = command
+        self._health_check = health_check_fn
+
+    def available(self) -> bool:
+        return bool(self.command)
+
+    def reset(self, url: str) -> bool:
+        # Applications hold files open on the overlay; close them first
+        cmd = f"{KillAppsReset(profile_dirs=[]).command()} && {self.command}"
+        client = OSWorldClient(base_url=url)
+        try:
+            result = client.execute(cmd, shell=True, timeout=120)
+        except Exception as e:
+            # The rollback may restart the session (and the OSWorld server) mid-request
+            logger.info(f"Overlay rollback on {url} dropped the connection ({e}); waiting for the VM")
+            result = {}
+        finally:
+            client.close()
+        if result.get("status", "success") != "success":
+            logger.warning(f"Overlay rollback on {url} failed: {result.get('error')}")
+            return False
+        return _wait_healthy(url, self._health_check, OSWORLD_RESET_BOOT_TIMEOUT)
+
+
+class SnapshotProvider:
+    """Restores a VM (identified by its OSWorld URL) from its snapshot."""
+
+    def available(self) -> bool:
+        return True
+
+    def restore(self, url: str) -> None:
+        raise NotImplementedError
+
+
+class CommandSnapshotProvider(SnapshotProvider):
+    """
+    Restore by running a local command, e.g. a cloud CLI call that recreates
+    the VM's disk from a snapshot:
+
+        OSWORLD_RESET_SNAPSHOT_COMMAND="./scripts/restore_vm.sh {host}"
+    """
+
+    def __init__(self, command: str = OSWORLD_RESET_SNAPSHOT_COMMAND, timeout: float = OSWORLD_RESET_SNAPSHOT_TIMEOUT):
+        self.command = command
+        self.timeout = timeout
+
+    def available(self) -> bool:
+        return bool(self.command)
+
+    def restore(self, url: str) -> None:
+        host = urlparse(url).hostname or url
+        argv = [arg.format(url=url, host=host) for arg in shlex.split(self.command)]
+        proc = subprocess.run(argv, capture_output=True, text=True, timeout=self.timeout)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Snapshot restore exited with {proc.returncode}: {proc.stderr.strip()[-500:]}")
+
+
+SNAPSHOT_PROVIDERS: Dict[str, Callable[[], SnapshotProvider]] = {
+    "command": CommandSnapshotProvider,
+}
+
+
+def register_snapshot_provider(name: str, factory: Callable[[], SnapshotProvider]) -> None:
+    """Make a custom snapshot provider selectable via OSWORLD_RESET_SNAPSHOT_PROVIDER."""
+    SNAPSHOT_PROVIDERS[name] = factory
+
+
+def get_snapshot_provider(name: str) -> SnapshotProvider:
+    try:
+        return SNAPSHOT_PROVIDERS[name]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown snapshot provider '{name}'. Available: {', '.join(SNAPSHOT_PROVIDERS)}"
+        )
+
+
+class SnapshotReset(ResetStrategy):
+    """Restore the whole VM from a snapshot and wait for it to come back."""
+
+    name = "snapshot"
+    isolation = "full"
+    default_cost = 180.0
+
+    def __init__(self, provider: SnapshotProvider, health_check_fn: Callable[[str], bool] = _health_check):
+        self.provider = provider
+        self._health_check = health_check_fn
+
+    def available(self) -> bool:
+        return self.provider.available()
+
+    def reset(self, url: str) -> bool:
+        self.provider.restore(url)
+        return _wait_healthy(url, self._health_check, OSWORLD_RESET_BOOT_TIMEOUT)
+
+
+class ResetStats:
+    """Measured cost of one strategy."""
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total_sec = 0.0
+        self.last_sec: Optional[float] = None
+
+    def record(self, seconds: float, ok: bool):
+        self.last_sec = seconds
+        if ok:
+            self.count += 1
+            self.total_sec += seconds
+        else:
+            self.failures += 1
+
+    @property
+    def mean_sec(self) -> Optional[float]:
+        return self.total_sec / self.count if self.count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "resets": self.count,
+            "failures": self.failures,
+            "total_sec": round(self.total_sec, 3),
+            "mean_sec": None if self.mean_sec is None else round(self.mean_sec, 3),
+            "last_sec": None if self.last_sec is None else round(self.last_sec, 3),
+        }
+
+
+class VMResetter:
+    """
+    Pool reset function: resets a released VM with the cheapest strategy that
+    isolates the lease's domain and records what it cost.
+    """
+
+    def __init__(
+        self,
+        strategies: List[ResetStrategy],
+        mode: str = OSWORLD_RESET,
+        domain_isolation: Optional[Dict[str, str]] = None,
+        default_isolation: str = OSWORLD_RESET_DEFAULT_ISOLATION,
+        health_check_fn: Callable[[str], bool] = _health_check,
+    ):
+        """
+        Args:
+            strategies: Candidate strategies (unavailable ones are skipped)
+            mode: "auto", "none", or the name of a strategy to always use
+            domain_isolation: Isolation level per domain (default: DOMAIN_ISOLATION)
+            default_isolation: Isolation for domains not in the table
+            health_check_fn: Probe run after every reset
+        """
+        names = [s.name for s in strategies]
+        if mode not in ("auto", "none") and mode not in names:
+            raise ValueError(f"Unknown reset strategy '{mode}'. Available: auto, none, {', '.join(names)}")
+        if default_isolation not in ISOLATION_LEVELS:
+            raise ValueError(f"Unknown isolation level '{default_isolation}'")
+        self.strategies = strategies
+        self.mode = mode
+        self.domain_isolation = dict(DOMAIN_ISOLATION if domain_isolation is None else domain_isolation)
+        self.default_isolation = default_isolation
+        self._health_check = health_check_fn
+        self._stats: Dict[str, ResetStats] = {s.name: ResetStats() for s in strategies}
+        self._lock = threading.Lock()
+        # Domains already warned about missing isolation
+        self._warned: set = set()
+
+    def required_isolation(self, domain: Optional[str]) -> str:
+        return self.domain_isolation.get(domain or "", self.default_isolation)
+
+    def estimated_cost(self, strategy: ResetStrategy) -> float:
+        with self._lock:
+            mean = self._stats[strategy.name].mean_sec
+        return strategy.default_cost if mean is None else mean
+
+    def plan(self, domain: Optional[str]) -> List[ResetStrategy]:
+        """
+        Strategies to try for a domain, in order: the cheapest one that
+        provides the required isolation first, then stronger fallbacks.
+        """
+        available = [s for s in self.strategies if s.available()]
+        if self.mode == "none":
+            return []
+        if self.mode != "auto":
+            return [s for s in available if s.name == self.mode]
+        need = ISOLATION_LEVELS[self.required_isolation(domain)]
+        sufficient = [s for s in available if ISOLATION_LEVELS[s.isolation] >= need]
+        if not sufficient and available:
+            # Nothing configured is strong enough; do the best we can
+            strongest = max(available, key=lambda s: ISOLATION_LEVELS[s.isolation])
+            if domain not in self._warned:
+                self._warned.add(domain)
+                logger.warning(
+                    f"No reset strategy provides '{self.required_isolation(domain)}' isolation "
+                    f"for domain '{domain}'; using '{strongest.name}'"
+                )
+            sufficient = [strongest]
+        return sorted(sufficient, key=lambda s: (self.estimated_cost(s), ISOLATION_LEVELS[s.isolation]))
+
+    def reset(self, url: str, domain: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Reset a VM for reuse.
+
+        Returns:
+            Report with ok, strategy (the one that succeeded), domain,
+            isolation (required) and time_sec, plus the attempts made
+        """
+        started = time.perf_counter()
+        attempts = []
+        for strategy in self.plan(domain):
+            t0 = time.perf_counter()
+            try:
+                ok = bool(strategy.reset(url)) and self._health_check(url)
+                error = None if ok else "VM not healthy after reset"
+            except Exception as e:
+                ok, error = False, f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self._stats[strategy.name].record(elapsed, ok)
+            attempts.append({"strategy": strategy.name, "ok": ok, "time_sec": round(elapsed, 3), "error": error})
+            if ok:
+                break
+            logger.warning(f"Reset '{strategy.name}' of {url} failed ({error}), escalating")
+        else:
+            if not attempts:
+                # Nothing to run; the VM goes back only if it still responds
+                ok = self._health_check(url)
+                attempts.append({"strategy": "none", "ok": ok, "time_sec": round(time.perf_counter() - started, 3), "error": None})
+        report = {
+            "ok": attempts[-1]["ok"],
+            "strategy": attempts[-1]["strategy"],
+            "domain": domain,
+            "isolation": self.required_isolation(domain),
+            "time_sec": round(time.perf_counter() - started, 3),
+            "attempts": attempts,
+        }
+        logger.info(
+            f"Reset {url} for domain '{domain}' with '{report['strategy']}' "
+            f"in {report['time_sec']:.1f}s (ok={report['ok']})"
+        )
+        return report
+
+    def __call__(self, lease) -> bool:
+        """VMPool.reset_fn: reset the lease's VM and attach the report to the lease."""
+        report = self.reset(lease.url, lease.domain)
+        lease.reset_report = report
+        return report["ok"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_strategy = {name: s.to_dict() for name, s in self._stats.items()}
+        for strategy in self.strategies:
+            per_strategy[strategy.name].update(
+                isolation=strategy.isolation,
+                available=strategy.available(),
+                estimated_sec=round(self.estimated_cost(strategy), 3),
+            )
+        return {"mode": self.mode, "strategies": per_strategy}
+
+
+def kill_warmed_apps(url: str) -> bool:
+    """
+    Close the apps a pre-warm started, before the VM goes to a different task.
+
+    Runs whatever OSWORLD_RESET is set to: handing one task's pre-launched
+    apps to another breaks isolation even when resets are otherwise off.
+    Profiles are left alone (that stays opt-in via OSWORLD_RESET_PROFILE_DIRS).
+    """
+    return KillAppsReset(profile_dirs=[]).reset(url)
+
+
+def default_strategies(health_check_fn: Callable[[str], bool] = _health_check) -> List[ResetStrategy]:
+    return [
+        KillAppsReset(),
+        OverlayRollbackReset(health_check_fn=health_check_fn),
+        SnapshotReset(get_snapshot_provider(OSWORLD_RESET_SNAPSHOT_PROVIDER), health_check_fn=health_check_fn),
+    ]
+
+
+_resetter: Optional[VMResetter] = None
+_resetter_lock = threading.Lock()
+
+
+def get_resetter() -> VMResetter:
+    """Process-wide resetter configured from the environment on first use."""
+    global _resetter
+    with _resetter_lock:
+        if _resetter is None:
+            isolation = dict(DOMAIN_ISOLATION)
+            isolation.update(_isolation_overrides(OSWORLD_RESET_ISOLATION))
+            _resetter = VMResetter(default_strategies(), domain_isolation=isolation)
+        return _resetter
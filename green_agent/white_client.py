@@ -1,25 +1,366 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import logging
+import threading
 import httpx
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 
+logger = logging.getLogger(__name__)
 
-class WhiteClient:
-    def __init__(self, base_url: str):
+# How frames are sent to /decide:
+#   auto: what the agent advertises on /health ("observation_transports"); without
+#         that, multipart with raw image bytes, falling back to JSON if the agent
+#         rejects the first multipart request (any 4xx)
+#   multipart: always multipart
+#   json: base64 image inside a JSON body (original protocol)
+WHITE_TRANSPORT = os.environ.get("WHITE_TRANSPORT", "auto")
+
+WHITE_HTTP_MAX_CONNECTIONS = int(os.environ.get("WHITE_HTTP_MAX_CONNECTIONS", 50))
+WHITE_HTTP_MAX_KEEPALIVE = int(os.environ.get("WHITE_HTTP_MAX_KEEPALIVE", 20))
+WHITE_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("WHITE_HTTP_KEEPALIVE_EXPIRY", 60))
+WHITE_DECIDE_TIMEOUT = float(os.environ.get("WHITE_DECIDE_TIMEOUT", 60))
+WHITE_RETRIES = int(os.environ.get("WHITE_RETRIES", 2))
+WHITE_RETRY_BACKOFF = float(os.environ.get("WHITE_RETRY_BACKOFF", 0.5))
+# Seconds before a negotiated transport is checked again (the agent may have been upgraded)
+WHITE_RENEGOTIATE_SEC = float(os.environ.get("WHITE_RENEGOTIATE_SEC", 300))
+
+# Responses worth retrying: the agent (or a proxy in front of it) is briefly unavailable
+RETRY_STATUS = {502, 503, 504}
+# Failures where the request never left this process or reached the agent.
+# Read timeouts and protocol errors (e.g. the connection dropped mid-response)
+# are not retried: the agent may already be acting on the observation.
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Transport negotiated per white agent URL, remembered across assessments: (transport, when)
+_negotiated: Dict[str, Tuple[str, float]] = {}
+
+
+def split_observation(observation: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[bytes]]:
+    """Separate the raw frame ("image_bytes") from the JSON-serializable metadata."""
+    meta = {k: v for k, v in observation.items() if k != "image_bytes"}
+    return meta, observation.get("image_bytes")
+
+
+def observation_to_json(observation: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON body for agents that only speak the original protocol (base64 image)."""
+    meta, image = split_observation(observation)
+    if image is not None:
+        meta["image_png_b64"] = base64.b64encode(image).decode("ascii")
+    return meta
+
+
+def observation_to_multipart(observation: Dict[str, Any]) -> Dict[str, Any]:
+    """httpx request kwargs sending metadata as a JSON part and the frame as raw bytes."""
+    meta, image = split_observation(observation)
+    if image is None and meta.get("image_png_b64"):
+        # Caller already produced base64; send it as bytes anyway
+        image = base64.b64decode(meta["image_png_b64"])
+    meta.pop("image_png_b64", None)
+    files = {"observation": (None, json.dumps(meta), "application/json")}
+    if image:
+        files["image"] = ("frame", image, meta.get("image_mime", "image/png"))
+    return {"files": files}
+
+
+def _limits(max_connections: int, max_keepalive_connections: int, keepalive_expiry: float) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+
+
+def create_white_http_client(
+    max_connections: int = WHITE_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections: int = WHITE_HTTP_MAX_KEEPALIVE,
+    keepalive_expiry: float = WHITE_HTTP_KEEPALIVE_EXPIRY,
+) -> httpx.Client:
+    """Keep-alive connection pool for white agent calls (the caller owns it)."""
+    return httpx.Client(limits=_limits(max_connections, max_keepalive_connections, keepalive_expiry))
+
+
+def create_async_white_http_client(
+    max_connections: int = WHITE_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections: int = WHITE_HTTP_MAX_KEEPALIVE,
+    keepalive_expiry: float = WHITE_HTTP_KEEPALIVE_EXPIRY,
+) -> httpx.AsyncClient:
+    """asyncio variant of create_white_http_client."""
+    return httpx.AsyncClient(limits=_limits(max_connections, max_keepalive_connections, keepalive_expiry))
+
+
+_shared_client: Optional[httpx.Client] = None
+_shared_lock = threading.Lock()
+
+
+def shared_http_client() -> httpx.Client:
+    """Process-wide pool reused by every WhiteClient, so connections survive across assessments."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None or _shared_client.is_closed:
+            _shared_client = create_white_http_client()
+        return _shared_client
+
+
+class CallStats:
+    """Latency and error counters for one white agent endpoint."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_sec = 0.0
+        self.max_sec = 0.0
+        self.last_sec = 0.0
+
+    def record(self, elapsed: float, ok: bool, retries: int):
+        self.calls += 1
+        self.errors += 0 if ok else 1
+        self.retries += retries
+        self.total_sec += elapsed
+        self.max_sec = max(self.max_sec, elapsed)
+        self.last_sec = elapsed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_sec": round(self.total_sec / self.calls, 4) if self.calls else 0.0,
+            "max_sec": round(self.max_sec, 4),
+            "last_sec": round(self.last_sec, 4),
+        }
+
+
+class _WhiteClientBase:
+    """Transport negotiation, retry policy and metrics shared by both clients."""
+
+    def __init__(self, base_url: str, transport: str, retries: int, backoff: float):
         self.base_url = base_url.rstrip("/")
+        self.mode = transport
+        self.retries = retries
+        self.backoff = backoff
+        self._stats: Dict[str, CallStats] = {"reset": CallStats(), "decide": CallStats()}
+
+    @property
+    def transport(self) -> str:
+        if self.mode != "auto":
+            return self.mode
+        entry = _negotiated.get(self.base_url)
+        return entry[0] if entry else "multipart"
+
+    def _decide_request(self, transport: str, observation: Dict[str, Any]) -> Dict[str, Any]:
+        if transport == "json":
+            return {"json": observation_to_json(observation)}
+        return observation_to_multipart(observation)
+
+    def _needs_negotiation(self) -> bool:
+        if self.mode != "auto":
+            return False
+        entry = _negotiated.get(self.base_url)
+        return entry is None or time.time() - entry[1] > WHITE_RENEGOTIATE_SEC
+
+    def _from_health(self, response: Optional[httpx.Response]) -> None:
+        """Pick the transport from /health; without an answer, probe with multipart again."""
+        transports = None
+        if response is not None and response.is_success:
+            try:
+                transports = response.json().get("observation_transports")
+            except (ValueError, AttributeError):
+                pass
+        if not isinstance(transports, list):
+            # Forget the old choice: the next /decide tries multipart first
+            _negotiated.pop(self.base_url, None)
+            return
+        transport = "multipart" if "multipart" in transports else "json"
+        if transport != self.transport:
+            logger.info(f"White agent {self.base_url} advertises {transports}; using {transport}")
+        _negotiated[self.base_url] = (transport, time.time())
+
+    def _negotiate(self, response: httpx.Response) -> bool:
+        """Update the remembered transport; True if the call must be repeated as JSON."""
+        if self.mode != "auto" or self.transport != "multipart":
+            return False
+        confirmed = self.base_url in _negotiated
+        status = response.status_code
+        if status == 415 or (400 <= status < 500 and not confirmed):
+            # First multipart request refused: the agent only accepts JSON bodies
+            logger.info(f"White agent {self.base_url} rejected multipart ({status}); using JSON")
+            _negotiated[self.base_url] = ("json", time.time())
+            return True
+        if response.is_success and not confirmed:
+            _negotiated[self.base_url] = ("multipart", time.time())
+        return False
+
+    def _delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-endpoint call latency metrics."""
+        return {
+            "transport": self.transport,
+            **{name: s.to_dict() for name, s in self._stats.items()},
+        }
+
+
+class WhiteClient(_WhiteClientBase):
+    """
+    Blocking client for a white agent.
+
+    Uses a long-lived keep-alive pool (shared process-wide unless http_client
+    is given), retries transient failures with exponential backoff, and
+    records per-call latency (see stats()).
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        transport: str = WHITE_TRANSPORT,
+        http_client: Optional[httpx.Client] = None,
+        retries: int = WHITE_RETRIES,
+        backoff: float = WHITE_RETRY_BACKOFF,
+    ):
+        super().__init__(base_url, transport, retries, backoff)
+        self._client = http_client or shared_http_client()
+
+    def _post(self, name: str, path: str, timeout: float, build) -> httpx.Response:
+        """POST with retries; build() returns request kwargs (re-evaluated per attempt)."""
+        t0 = time.perf_counter()
+        attempt = 0
+        ok = False
+        try:
+            while True:
+                try:
+                    r = self._client.post(f"{self.base_url}/{path}", timeout=timeout, **build())
+                    if r.status_code not in RETRY_STATUS or attempt >= self.retries:
+                        ok = r.is_success
+                        return r
+                except RETRY_ERRORS as e:
+                    if attempt >= self.retries:
+                        raise
+                    logger.warning(f"White agent {path} failed ({e!r}); retrying")
+                time.sleep(self._delay(attempt))
+                attempt += 1
+        finally:
+            self._stats[name].record(time.perf_counter() - t0, ok, attempt)
 
     def reset(self) -> None:
         try:
-            httpx.post(f"{self.base_url}/reset", timeout=10)
+            self._post("reset", "reset", 10, dict)
         except Exception:
             pass
 
+    def _ensure_negotiated(self) -> None:
+        if not self._needs_negotiation():
+            return
+        try:
+            response = self._client.get(f"{self.base_url}/health", timeout=5)
+        except httpx.HTTPError:
+            response = None
+        self._from_health(response)
+
     def decide(self, observation: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ask the white agent for the next action.
+
+        Args:
+            observation: Observation dict; the frame may be given as raw bytes
+                ("image_bytes") or base64 ("image_png_b64")
+        """
         try:
-            r = httpx.post(f"{self.base_url}/decide", json=observation, timeout=60)
+            self._ensure_negotiated()
+            build = lambda: self._decide_request(self.transport, observation)
+            r = self._post("decide", "decide", WHITE_DECIDE_TIMEOUT, build)
+            if self._negotiate(r):
+                r = self._post("decide", "decide", WHITE_DECIDE_TIMEOUT, build)
             r.raise_for_status()
             return r.json()
         except Exception as e:
             # In fake mode, return a dummy action
-            import os
             if os.environ.get("USE_FAKE_OSWORLD", "1") == "1":
                 return {"op": "wait", "args": {}}
             raise
+
+
+class AsyncWhiteClient(_WhiteClientBase):
+    """
+    asyncio client for a white agent, for runners that drive several
+    assessments on one event loop.
+
+    Pass a shared pool from create_async_white_http_client(); without one the
+    client creates its own and closes it in close().
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        transport: str = WHITE_TRANSPORT,
+        http_client: Optional[httpx.AsyncClient] = None,
+        retries: int = WHITE_RETRIES,
+        backoff: float = WHITE_RETRY_BACKOFF,
+    ):
+        super().__init__(base_url, transport, retries, backoff)
+        self._owns_client = http_client is None
+        self._client = http_client or create_async_white_http_client()
+
+    async def __aenter__(self) -> "AsyncWhiteClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _post(self, name: str, path: str, timeout: float, build) -> httpx.Response:
+        t0 = time.perf_counter()
+        attempt = 0
+        ok = False
+        try:
+            while True:
+                try:
+                    r = await self._client.post(f"{self.base_url}/{path}", timeout=timeout, **build())
+                    if r.status_code not in RETRY_STATUS or attempt >= self.retries:
+                        ok = r.is_success
+                        return r
+                except RETRY_ERRORS as e:
+                    if attempt >= self.retries:
+                        raise
+                    logger.warning(f"White agent {path} failed ({e!r}); retrying")
+                await asyncio.sleep(self._delay(attempt))
+                attempt += 1
+        finally:
+            self._stats[name].record(time.perf_counter() - t0, ok, attempt)
+
+    async def reset(self) -> None:
+        try:
+            await self._post("reset", "reset", 10, dict)
+        except Exception:
+            pass
+
+    async def _ensure_negotiated(self) -> None:
+        if not self._needs_negotiation():
+            return
+        try:
+            response = await self._client.get(f"{self.base_url}/health", timeout=5)
+        except httpx.HTTPError:
+            response = None
+        self._from_health(response)
+
+    async def decide(self, observation: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of WhiteClient.decide."""
+        try:
+            await self._ensure_negotiated()
+            build = lambda: self._decide_request(self.transport, observation)
+            r = await self._post("decide", "decide", WHITE_DECIDE_TIMEOUT, build)
+            if self._negotiate(r):
+                r = await self._post("decide", "decide", WHITE_DECIDE_TIMEOUT, build)
+            r.raise_for_status()
+            return r.json()
+        except Exception:
+            if os.environ.get("USE_FAKE_OSWORLD", "1") == "1":
+                return {"op": "wait", "args": {}}
+            raise
+
+    async def close(self):
+        if self._owns_client:
+            await self._client.aclose()
@@ -5,8 +5,13 @@ Run OSWorld benchmarks using native VM + White Agent Bridge
 This script:
 1. Loads OSWorld benchmark tasks
 2. Uses White Agent Bridge to connect to our White Agent
-3. Runs tasks on our native OSWorld VM
+3. Runs tasks on our native OSWorld VMs, one worker per VM, longest tasks first
 4. Evaluates results using OSWorld's evaluation functions
+
+Usage:
+    python run_osworld_benchmark.py --osworld-url http://10.128.0.10:5000 --osworld-url http://10.128.0.11:5000
+    python run_osworld_benchmark.py --pool-file vms.txt --domain chrome,gimp
+    python run_osworld_benchmark.py --pool-file vms.txt --resume   # continue an interrupted sweep
 """
 
 import argparse
@@ -21,6 +26,15 @@ sys.path.insert(0, str(Path(__file__).parent / "vendor" / "OSWorld"))
 
 from mm_agents.white_agent_bridge import WhiteAgentBridge
 from green_agent.osworld_client import OSWorldClient
+from green_agent.action_parser import run_pyautogui
+from green_agent.settle import settle
+from green_agent.task_setup import prewarm, run_setup
+from green_agent.task_catalog import OSWORLD_EXAMPLES_DIR, TaskNotFoundError, get_catalog
+from green_agent.sweep import (
+    SWEEP_LEASE_TIMEOUT, Sweep, SweepManifest, SweepTask, estimate_durations, load_results,
+    open_results, read_pool_file,
+)
+from green_agent.vm_pool import VMPool, configured_urls
 
 # Configure logging
 logging.basicConfig(
@@ -30,74 +44,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def execute_pyautogui_action(osworld_client: OSWorldClient, action_str: str):
-    """
-    Parse and execute a pyautogui action string via REST API.
-
-    Examples:
-        pyautogui.click(100, 200)
-        pyautogui.doubleClick(100, 200)
-        pyautogui.typewrite("hello", interval=0.01)
-        pyautogui.hotkey('ctrl', 's')
-        pyautogui.press('enter')
-        pyautogui.sleep(1.0)
-    """
-    import re
-    import time
-
-    action_str = action_str.strip()
-
-    # Parse click actions
-    if match := re.match(r'pyautogui\.click\((\d+),\s*(\d+)\)', action_str):
-        x, y = int(match.group(1)), int(match.group(2))
-        osworld_client.click_at(x, y)
-
-    elif match := re.match(r'pyautogui\.doubleClick\((\d+),\s*(\d+)\)', action_str):
-        x, y = int(match.group(1)), int(match.group(2))
-        osworld_client.double_click_at(x, y)
-
-    elif match := re.match(r'pyautogui\.rightClick\((\d+),\s*(\d+)\)', action_str):
-        x, y = int(match.group(1)), int(match.group(2))
-        osworld_client.right_click_at(x, y)
-
-    # Parse type/typewrite actions
-    elif match := re.match(r'pyautogui\.typewrite\(["\'](.+?)["\']', action_str):
-        text = match.group(1)
-        osworld_client.type_text(text)
-
-    elif match := re.match(r'pyautogui\.write\(["\'](.+?)["\']', action_str):
-        text = match.group(1)
-        osworld_client.type_text(text)
-
-    # Parse hotkey actions
-    elif 'pyautogui.hotkey' in action_str:
-        # Extract keys from hotkey('ctrl', 's') format
-        keys_match = re.findall(r"'([^']+)'", action_str)
-        if keys_match:
-            # Map common keys
-            key_map = {
-                'ctrl': 'Control_L',
-                'shift': 'Shift_L',
-                'alt': 'Alt_L',
-                'super': 'Super_L'
-            }
-            keys = [key_map.get(k.lower(), k) for k in keys_match]
-            osworld_client.hotkey(*keys)
-
-    # Parse press actions
-    elif match := re.match(r"pyautogui\.press\('([^']+)'\)", action_str):
-        key = match.group(1)
-        osworld_client.press_key(key)
-
-    # Parse sleep/wait
-    elif match := re.match(r'pyautogui\.sleep\(([\d.]+)\)', action_str):
-        duration = float(match.group(1))
-        time.sleep(duration)
-
-    else:
-        logger.warning(f"Unknown pyautogui action: {action_str}")
-
-
 def load_benchmark_tasks(test_file: str) -> dict:
     """Load benchmark tasks from test file"""
     with open(test_file, 'r') as f:
@@ -105,41 +51,11 @@ def load_benchmark_tasks(test_file: str) -> dict:
 
 
 def load_task_config(task_id: str, domain: str) -> dict:
-    """Load specific task configuration"""
-    task_file = Path("vendor/OSWorld/evaluation_examples/examples") / domain / f"{task_id}.json"
-
-    if not task_file.exists():
-        raise FileNotFoundError(f"Task file not found: {task_file}")
-
-    with open(task_file, 'r') as f:
-        return json.load(f)
-
-
-def run_task_setup(osworld_client: OSWorldClient, config_list: list):
-    """Run task setup commands"""
-    for config in config_list:
-        config_type = config.get("type")
-        params = config.get("parameters", {})
-
-        try:
-            if config_type == "launch":
-                command = params.get("command", [])
-                logger.info(f"Launching: {' '.join(command)}")
-                result = osworld_client.execute(command)
-                logger.debug(f"Result: {result}")
-            elif config_type == "execute":
-                command = params.get("command", [])
-                logger.info(f"Executing: {' '.join(command)}")
-                result = osworld_client.execute(command)
-                logger.debug(f"Result: {result}")
-            elif config_type == "sleep":
-                import time
-                seconds = params.get("seconds", 1)
-                logger.info(f"Sleeping for {seconds} seconds")
-                time.sleep(seconds)
-        except Exception as e:
-            logger.warning(f"Setup command failed (continuing anyway): {e}")
-            # Continue with other setup commands
+    """Load specific task configuration (indexed once by the task catalog)"""
+    try:
+        return get_catalog().get(task_id, domain).config
+    except TaskNotFoundError:
+        raise FileNotFoundError(f"Task not found: {domain}/{task_id} (OSWORLD_EXAMPLES_DIR={OSWORLD_EXAMPLES_DIR})")
 
 
 def run_single_task(
@@ -147,9 +63,10 @@ def run_single_task(
     domain: str,
     osworld_url: str,
     white_agent_url: str,
-    max_steps: int = 15
+    max_steps: int = 15,
+    warm: bool = False
 ):
-    """Run a single OSWorld benchmark task"""
+    """Run a single OSWorld benchmark task (warm: the VM was pre-warmed for it)"""
 
     logger.info(f"\n{'='*80}")
     logger.info(f"Running task: {domain}/{task_id}")
@@ -162,59 +79,60 @@ def run_single_task(
 
     # Initialize clients
     osworld_client = OSWorldClient(osworld_url)
-    white_agent = WhiteAgentBridge(
-        white_agent_url=white_agent_url,
-        action_space="pyautogui",
-        platform="ubuntu"
-    )
+    # Close the client however setup and the step loop end (errors included)
+    step = 0
+    try:
+        white_agent = WhiteAgentBridge(
+            white_agent_url=white_agent_url,
+            action_space="pyautogui",
+            platform="ubuntu"
+        )
+
+        # Reset White Agent
+        white_agent.reset()
+
+        # Run task setup (config commands)
+        setup_config = task_config.get("config", [])
+        setup_sec = 0.0
+        if setup_config:
+            logger.info("Running task setup...")
+            # Independent steps run concurrently; launches wait on readiness probes, not sleeps
+            setup_sec = run_setup(osworld_client, setup_config, warm=warm)["time_sec"]
+
+        # Run agent loop
+        logger.info(f"Starting agent loop (max {max_steps} steps)...")
+
+        for step in range(1, max_steps + 1):
+            logger.info(f"\n--- Step {step}/{max_steps} ---")
+
+            # Get observation from OSWorld
+            screenshot = osworld_client.screenshot()
+            obs = {
+                "screenshot": screenshot
+            }
 
-    # Reset White Agent
-    white_agent.reset()
-
-    # Run task setup (config commands)
-    setup_config = task_config.get("config", [])
-    if setup_config:
-        logger.info("Running task setup...")
-        run_task_setup(osworld_client, setup_config)
-        import time
-        time.sleep(2)  # Give setup time to complete
-
-    # Run agent loop
-    logger.info(f"Starting agent loop (max {max_steps} steps)...")
-
-    for step in range(1, max_steps + 1):
-        logger.info(f"\n--- Step {step}/{max_steps} ---")
-
-        # Get observation from OSWorld
-        screenshot = osworld_client.screenshot()
-        obs = {
-            "screenshot": screenshot
-        }
-
-        # Get action from White Agent (via bridge)
-        response_text, actions = white_agent.predict(instruction, obs)
-        logger.info(f"White Agent: {response_text}")
-        logger.info(f"Actions: {actions}")
-
-        # Check if done or failed
-        if "DONE" in actions:
-            logger.info("White Agent signaled DONE")
-            break
-        if "FAIL" in actions:
-            logger.error("White Agent signaled FAIL")
-            break
-
-        # Execute actions - convert pyautogui strings to REST API calls
-        for action in actions:
-            if action in ["DONE", "FAIL", "WAIT"]:
-                continue
-
-            logger.info(f"Executing action: {action}")
-            execute_pyautogui_action(osworld_client, action)
-
-        # Sleep after execution
-        import time
-        time.sleep(1)
+            # Get action from White Agent (via bridge)
+            response_text, actions = white_agent.predict(instruction, obs)
+            logger.info(f"White Agent: {response_text}")
+            logger.info(f"Actions: {actions}")
+
+            # Check if done or failed
+            if "DONE" in actions:
+                logger.info("White Agent signaled DONE")
+                break
+            if "FAIL" in actions:
+                logger.error("White Agent signaled FAIL")
+                break
+
+            # Execute actions - convert pyautogui strings to one batched REST API call
+            action_strs = [a for a in actions if a not in ["DONE", "FAIL", "WAIT"]]
+            logger.info(f"Executing actions: {action_strs}")
+            run_pyautogui(osworld_client, action_strs)
+
+            # Wait for the UI to update after execution
+            settle(osworld_client, fixed_sleep=1)
+    finally:
+        osworld_client.close()
 
     logger.info(f"\nTask completed after {step} steps")
 
@@ -222,78 +140,139 @@ def run_single_task(
     # TODO: Implement OSWorld's evaluation functions
     logger.info("\nEvaluation not yet implemented")
 
-    osworld_client.close()
-
     return {
         "task_id": task_id,
         "domain": domain,
         "steps": step,
-        "instruction": instruction
+        "instruction": instruction,
+        "setup_sec": setup_sec,
     }
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Run OSWorld benchmarks on native VM")
-    parser.add_argument("--osworld-url", type=str, required=True,
-                        help="OSWorld VM REST API URL (e.g., http://10.128.0.10:5000)")
+    parser = argparse.ArgumentParser(description="Run OSWorld benchmarks on native VMs")
+    parser.add_argument("--osworld-url", type=str, action="append", default=[],
+                        help="OSWorld VM REST API URL (e.g., http://10.128.0.10:5000); "
+                             "repeat for several VMs (default: OSWORLD_SERVER_URLS)")
+    parser.add_argument("--pool-file", type=str, default=None,
+                        help="File listing OSWorld VM URLs (one per line, or a JSON list)")
     parser.add_argument("--white-agent-url", type=str, default="http://localhost:9000",
                         help="White Agent URL")
     parser.add_argument("--test-file", type=str,
                         default="vendor/OSWorld/evaluation_examples/test_small.json",
                         help="Test file with task IDs")
-    parser.add_argument("--domain", type=str, default="chrome",
-                        help="Domain to test (chrome, gimp, libreoffice_calc, etc.)")
+    parser.add_argument("--domain", type=str, default="all",
+                        help="Comma-separated domains to test (chrome, gimp, libreoffice_calc, ...) or 'all'")
     parser.add_argument("--task-id", type=str, default=None,
-                        help="Specific task ID to run (if not set, runs all in domain)")
+                        help="Specific task ID to run (requires a single --domain)")
     parser.add_argument("--max-steps", type=int, default=15,
                         help="Maximum steps per task")
+    parser.add_argument("--results", type=str, default="results/osworld_sweep.jsonl",
+                        help="Results file, appended as tasks finish (.jsonl, or .db for SQLite); "
+                             "earlier results in it order the sweep longest-first")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Parallel workers (default: one per VM, or one fewer with --prewarm)")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="Start the next task's apps on an idle VM while tasks run; "
+                             "needs more VMs than workers")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Sweep state file (default: <results>.manifest.json)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip tasks the manifest records as finished; re-run abandoned ones")
+    parser.add_argument("--lease-timeout", type=float, default=SWEEP_LEASE_TIMEOUT,
+                        help="Seconds before another sweep's running task counts as abandoned")
+    parser.add_argument("--max-retries", type=int, default=0,
+                        help="Retries per task after infrastructure failures (VM unreachable)")
 
     args = parser.parse_args()
 
+    urls = list(args.osworld_url)
+    if args.pool_file:
+        urls += read_pool_file(args.pool_file)
+    urls = urls or configured_urls()
+
     # Load test file
     logger.info(f"Loading test file: {args.test_file}")
     test_tasks = load_benchmark_tasks(args.test_file)
 
-    if args.domain not in test_tasks:
-        logger.error(f"Domain '{args.domain}' not found in test file")
+    domains = list(test_tasks) if args.domain == "all" else [d.strip() for d in args.domain.split(",")]
+    unknown = [d for d in domains if d not in test_tasks]
+    if unknown:
+        logger.error(f"Domain(s) not found in test file: {', '.join(unknown)}")
         logger.error(f"Available domains: {', '.join(test_tasks.keys())}")
         return 1
 
     # Get tasks to run
     if args.task_id:
-        task_ids = [args.task_id]
+        if len(domains) != 1:
+            logger.error("--task-id requires a single --domain")
+            return 1
+        tasks = [SweepTask(domains[0], args.task_id)]
     else:
-        task_ids = test_tasks[args.domain]
-
-    logger.info(f"Running {len(task_ids)} tasks from domain '{args.domain}'")
-    logger.info(f"Task IDs: {task_ids[:3]}..." if len(task_ids) > 3 else f"Task IDs: {task_ids}")
-
-    # Run tasks
-    results = []
-    for task_id in task_ids:
-        try:
-            result = run_single_task(
-                task_id=task_id,
-                domain=args.domain,
-                osworld_url=args.osworld_url,
-                white_agent_url=args.white_agent_url,
-                max_steps=args.max_steps
-            )
-            results.append(result)
-        except Exception as e:
-            logger.error(f"Error running task {task_id}: {e}", exc_info=True)
-            results.append({
-                "task_id": task_id,
-                "domain": args.domain,
-                "error": str(e)
-            })
+        tasks = [SweepTask(domain, task_id) for domain in domains for task_id in test_tasks[domain]]
+
+    manifest = SweepManifest(
+        args.manifest or os.path.splitext(args.results)[0] + ".manifest.json",
+        lease_timeout=args.lease_timeout,
+    )
+    selected = len(tasks)
+    tasks = manifest.plan(tasks, resume=args.resume, max_retries=args.max_retries)
+    if args.resume:
+        logger.info(f"Resuming: {len(tasks)}/{selected} tasks left ({manifest.counts()})")
+    if not tasks:
+        logger.info("Nothing to run")
+        return 0
+
+    estimate_durations(tasks, load_results(args.results))
+    logger.info(f"Running {len(tasks)} tasks from {len(domains)} domain(s) on {len(urls)} VM(s)")
+
+    def run_task(task: SweepTask, osworld_url: str) -> dict:
+        return run_single_task(
+            task_id=task.task_id,
+            domain=task.domain,
+            osworld_url=osworld_url,
+            white_agent_url=args.white_agent_url,
+            max_steps=args.max_steps,
+            warm=task.warm
+        )
+
+    def prewarm_task(task: SweepTask, osworld_url: str) -> dict:
+        # Start the next task's apps on an idle VM while this one runs
+        return prewarm(osworld_url, load_task_config(task.task_id, task.domain).get("config", []))
+
+    workers = args.workers
+    if args.prewarm and workers is None:
+        # Pre-warming only happens on VMs no worker holds
+        workers = max(1, len(urls) - 1)
+
+    results = open_results(args.results)
+    try:
+        sweep = Sweep(
+            VMPool(urls), run_task, results, workers=workers,
+            manifest=manifest, max_retries=args.max_retries,
+            prewarm=prewarm_task if args.prewarm else None,
+        )
+        summary = sweep.run(tasks)
+    finally:
+        results.close()
 
     # Summary
     logger.info(f"\n{'='*80}")
-    logger.info(f"SUMMARY: Completed {len(results)}/{len(task_ids)} tasks")
+    logger.info(
+        f"SUMMARY: {summary['done']}/{summary['tasks']} tasks completed, {summary['failed']} failed, "
+        f"{summary['time_sec']:.0f}s with {summary['workers']} workers"
+    )
+    for name, cost in (summary["reset"] or {}).get("strategies", {}).items():
+        if cost["resets"] or cost["failures"]:
+            logger.info(
+                f"VM reset '{name}': {cost['resets']} resets ({cost['failures']} failed), "
+                f"mean {cost['mean_sec']}s, total {cost['total_sec']}s"
+            )
+    logger.info(f"Results: {args.results} (state: {manifest.path})")
     logger.info(f"{'='*80}")
 
-    return 0
+    # Non-zero when any task failed to run, like run_with_gpt4v.py, so CI and wrappers notice
+    return 1 if summary["failed"] else 0
 
 
 if __name__ == "__main__":
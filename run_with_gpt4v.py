@@ -3,6 +3,9 @@
 Run OSWorld benchmarks using GPT-4V PromptAgent with native VM
 
 This integrates OSWorld's official PromptAgent (GPT-4V) with our native OSWorld setup.
+
+Runs one task (--task-id) or every task of --domain in --test-file. Progress
+is kept in a sweep manifest, so an interrupted run continues with --resume.
 """
 
 import argparse
@@ -10,7 +13,6 @@ import json
 import logging
 import os
 import sys
-import time
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -22,6 +24,13 @@ sys.path.insert(0, str(Path(__file__).parent / "vendor" / "OSWorld"))
 
 from mm_agents.agent import PromptAgent
 from green_agent.osworld_client import OSWorldClient
+from green_agent.action_parser import run_pyautogui
+from green_agent.settle import settle
+from green_agent.task_setup import run_setup
+from green_agent.task_catalog import OSWORLD_EXAMPLES_DIR, TaskNotFoundError, get_catalog
+from green_agent.artifacts import ArtifactWriter
+from green_agent.sweep import SWEEP_LEASE_TIMEOUT, Sweep, SweepManifest, SweepTask, open_results
+from green_agent.vm_pool import VMPool
 
 # Configure logging
 logging.basicConfig(
@@ -32,124 +41,24 @@ logger = logging.getLogger(__name__)
 
 
 def load_task_config(task_id: str, domain: str) -> dict:
-    """Load specific task configuration"""
-    task_file = Path("vendor/OSWorld/evaluation_examples/examples") / domain / f"{task_id}.json"
-
-    if not task_file.exists():
-        raise FileNotFoundError(f"Task file not found: {task_file}")
-
-    with open(task_file, 'r') as f:
-        return json.load(f)
-
-
-def run_task_setup(osworld_client: OSWorldClient, config_list: list):
-    """Run task setup commands"""
-    for config in config_list:
-        config_type = config.get("type")
-        params = config.get("parameters", {})
-
-        try:
-            if config_type == "launch":
-                command = params.get("command", [])
-                # Launch GUI apps in background using shell
-                command_str = ' '.join(command) + ' &'
-                logger.info(f"Launching in background: {command_str}")
-                result = osworld_client.execute(command_str, shell=True, timeout=5)
-                logger.debug(f"Result: {result}")
-            elif config_type == "execute":
-                command = params.get("command", [])
-                # Execute commands normally
-                logger.info(f"Executing: {' '.join(command)}")
-                result = osworld_client.execute(command, shell=False, timeout=30)
-                logger.debug(f"Result: {result}")
-            elif config_type == "sleep":
-                seconds = params.get("seconds", 1)
-                logger.info(f"Sleeping for {seconds} seconds")
-                time.sleep(seconds)
-        except Exception as e:
-            logger.warning(f"Setup command failed (continuing anyway): {e}")
-
-
-def execute_pyautogui_action(osworld_client: OSWorldClient, action_str: str):
-    """
-    Parse and execute a pyautogui action string via REST API.
-    Handles both single-line commands and multi-line code blocks.
-    """
-    import re
-
-    action_str = action_str.strip()
-
-    # If it's a multi-line code block, extract individual pyautogui commands
-    if '\n' in action_str or 'import' in action_str:
-        lines = action_str.split('\n')
-        for line in lines:
-            line = line.strip()
-            # Skip empty lines, imports, and comments
-            if not line or line.startswith('#') or line.startswith('import') or line.startswith('time.'):
-                continue
-            # Recursively execute individual pyautogui commands
-            if line.startswith('pyautogui.'):
-                execute_pyautogui_action(osworld_client, line)
-        return
-
-    # Parse moveTo (for compatibility, execute as mouse_move) - support both positional and named args
-    if match := re.match(r'pyautogui\.moveTo\((?:x=)?(\d+),\s*(?:y=)?(\d+)', action_str):
-        x, y = int(match.group(1)), int(match.group(2))
-        osworld_client.mouse_move(x, y)
-
-    # Parse click actions - support both positional and named args
-    elif match := re.match(r'pyautogui\.click\((?:x=)?(\d+),\s*(?:y=)?(\d+)\)', action_str):
-        x, y = int(match.group(1)), int(match.group(2))
-        osworld_client.click_at(x, y)
-
-    elif match := re.match(r'pyautogui\.click\(\)', action_str):
-        # Click at current position
-        osworld_client.click_at(None, None)
-
-    elif match := re.match(r'pyautogui\.doubleClick\((?:x=)?(\d+),\s*(?:y=)?(\d+)\)', action_str):
-        x, y = int(match.group(1)), int(match.group(2))
-        osworld_client.double_click_at(x, y)
-
-    elif match := re.match(r'pyautogui\.rightClick\((?:x=)?(\d+),\s*(?:y=)?(\d+)\)', action_str):
-        x, y = int(match.group(1)), int(match.group(2))
-        osworld_client.right_click_at(x, y)
-
-    # Parse type/typewrite actions
-    elif match := re.match(r'pyautogui\.typewrite\(["\'](.+?)["\']', action_str):
-        text = match.group(1)
-        osworld_client.type_text(text)
-
-    elif match := re.match(r'pyautogui\.write\(["\'](.+?)["\']', action_str):
-        text = match.group(1)
-        osworld_client.type_text(text)
-
-    # Parse hotkey actions
-    elif 'pyautogui.hotkey' in action_str:
-        keys_match = re.findall(r"'([^']+)'", action_str)
-        if keys_match:
-            # Convert OSWorld key names to pyautogui key names
-            key_map = {
-                'control_l': 'ctrl',
-                'shift_l': 'shift',
-                'alt_l': 'alt',
-                'super_l': 'win',
-            }
-            keys = [key_map.get(k.lower(), k) for k in keys_match]
-            osworld_client.hotkey(*keys)
-
-    # Parse press actions
-    elif match := re.match(r"pyautogui\.press\('([^']+)'\)", action_str):
-        key = match.group(1)
-        osworld_client.press_key(key)
-
-    # Parse scroll actions
-    elif match := re.match(r'pyautogui\.scroll\((-?\d+)', action_str):
-        amount = int(match.group(1))
-        # Note: OSWorld API may need scroll implementation
-        logger.warning(f"Scroll not yet implemented: {action_str}")
+    """Load specific task configuration (indexed once by the task catalog)"""
+    try:
+        return get_catalog().get(task_id, domain).config
+    except TaskNotFoundError:
+        raise FileNotFoundError(f"Task not found: {domain}/{task_id} (OSWORLD_EXAMPLES_DIR={OSWORLD_EXAMPLES_DIR})")
 
-    else:
-        logger.warning(f"Unknown pyautogui action: {action_str}")
+
+def task_setup_config(task_id: str, domain: str, task_config: dict) -> list:
+    """Setup steps for a task"""
+    instruction = task_config.get("instruction", "")
+    # For Chrome tasks, skip the OSWorld config and launch Chrome directly with proper flags
+    if "chrome" in domain.lower() or "chrome" in instruction.lower():
+        command = [
+            "google-chrome", "--no-sandbox", f"--user-data-dir=/tmp/chrome-{task_id[:8]}",
+            "https://www.google.com",
+        ]
+        return [{"type": "launch", "parameters": {"command": command}}]
+    return task_config.get("config", [])
 
 
 def run_single_task(
@@ -177,106 +86,89 @@ def run_single_task(
     # Reset agent
     agent.reset()
 
-    # Run task setup (config commands)
-    # For Chrome tasks, skip the OSWorld config and launch Chrome directly with proper flags
-    if "chrome" in domain.lower() or "chrome" in instruction.lower():
-        logger.info("Launching Chrome for Chrome-based task...")
-        try:
-            # Kill any existing Chrome
-            osworld_client.execute(["pkill", "-f", "chrome"], timeout=5)
-            time.sleep(1)
-        except:
-            pass
-
-        # Launch Chrome with proper flags for this environment
-        chrome_cmd = f"google-chrome --no-sandbox --user-data-dir=/tmp/chrome-{task_id[:8]} https://www.google.com &"
-        logger.info(f"Executing: {chrome_cmd}")
-        try:
-            osworld_client.execute(chrome_cmd, shell=True, timeout=10)
-        except Exception as e:
-            # Chrome launch may timeout but that's OK - it runs in background
-            logger.debug(f"Chrome launch timed out (expected): {e}")
-        time.sleep(5)  # Give Chrome time to fully start
-    else:
-        # Run standard task setup for non-Chrome tasks
-        setup_config = task_config.get("config", [])
+    # Close the writer and client however the step loop ends (errors included)
+    writer = None
+    step = 0
+    task_success = False
+    try:
+        # Run task setup (config commands); launches wait on readiness probes, not sleeps.
+        # Chrome gets a per-task --user-data-dir, so no earlier profile is reused; with
+        # OSWORLD_RESET enabled the pool also closes the previous task's apps.
+        setup_config = task_setup_config(task_id, domain, task_config)
+        setup_sec = 0.0
         if setup_config:
             logger.info("Running task setup...")
-            run_task_setup(osworld_client, setup_config)
-            time.sleep(2)  # Give setup time to complete
+            setup_sec = run_setup(osworld_client, setup_config)["time_sec"]
 
-    # Create results directory
-    if save_screenshots:
-        results_dir = Path("results") / domain / task_id
-        results_dir.mkdir(parents=True, exist_ok=True)
-        logger.info(f"Saving screenshots to: {results_dir}")
+        # Create results directory; screenshots are written in the background
+        if save_screenshots:
+            results_dir = Path("results") / domain / task_id
+            results_dir.mkdir(parents=True, exist_ok=True)
+            writer = ArtifactWriter(str(results_dir))
+            logger.info(f"Saving screenshots to: {results_dir}")
 
-    # Run agent loop
-    logger.info(f"Starting GPT-4V agent loop (max {max_steps} steps)...")
+        # Run agent loop
+        logger.info(f"Starting GPT-4V agent loop (max {max_steps} steps)...")
 
-    task_success = False
+        for step in range(1, max_steps + 1):
+            logger.info(f"\n--- Step {step}/{max_steps} ---")
 
-    for step in range(1, max_steps + 1):
-        logger.info(f"\n--- Step {step}/{max_steps} ---")
+            # Get observation from OSWorld
+            screenshot = osworld_client.screenshot()
+            obs = {"screenshot": screenshot}
 
-        # Get observation from OSWorld
-        screenshot = osworld_client.screenshot()
-        obs = {"screenshot": screenshot}
+            # Save screenshot
+            if writer:
+                writer.write(f"step_{step:03d}.png", screenshot)
 
-        # Save screenshot
-        if save_screenshots:
-            screenshot_path = results_dir / f"step_{step:03d}.png"
-            with open(screenshot_path, 'wb') as f:
-                f.write(screenshot)
-            logger.debug(f"Saved screenshot to {screenshot_path}")
-
-        # Get action from GPT-4V agent
-        logger.info("Querying GPT-4V agent...")
-        try:
-            response, actions = agent.predict(instruction, obs)
-            logger.info(f"GPT-4V response: {response[:200]}..." if len(response) > 200 else f"GPT-4V response: {response}")
-            logger.info(f"Actions: {actions}")
-        except Exception as e:
-            logger.error(f"Agent prediction failed: {e}")
-            break
-
-        # Check if done or failed
-        if "DONE" in actions:
-            logger.info("✓ GPT-4V agent signaled DONE - task complete!")
-            task_success = True
-            break
-        if "FAIL" in actions:
-            logger.error("✗ GPT-4V agent signaled FAIL")
-            break
-
-        # Execute actions via REST API
-        for action in actions:
-            if action in ["DONE", "FAIL", "WAIT"]:
-                continue
-
-            logger.info(f"Executing: {action}")
+            # Get action from GPT-4V agent
+            logger.info("Querying GPT-4V agent...")
             try:
-                execute_pyautogui_action(osworld_client, action)
+                response, actions = agent.predict(instruction, obs)
+                logger.info(f"GPT-4V response: {response[:200]}..." if len(response) > 200 else f"GPT-4V response: {response}")
+                logger.info(f"Actions: {actions}")
+            except Exception as e:
+                logger.error(f"Agent prediction failed: {e}")
+                break
+
+            # Check if done or failed
+            if "DONE" in actions:
+                logger.info("✓ GPT-4V agent signaled DONE - task complete!")
+                task_success = True
+                break
+            if "FAIL" in actions:
+                logger.error("✗ GPT-4V agent signaled FAIL")
+                break
+
+            # Execute the step's actions via REST API in one round trip
+            action_strs = [a for a in actions if a not in ["DONE", "FAIL", "WAIT"]]
+            logger.info(f"Executing: {action_strs}")
+            try:
+                run_pyautogui(osworld_client, action_strs)
             except Exception as e:
                 logger.error(f"Action execution failed: {e}")
 
-        # Sleep after execution
-        time.sleep(1)
+            # Wait for the UI to update after execution
+            settle(osworld_client, fixed_sleep=1)
+    finally:
+        if writer:
+            writer.close()
+            logger.info(f"Artifact writer: {writer.stats()}")
+        osworld_client.close()
 
     logger.info(f"\n{'='*80}")
     logger.info(f"Task completed after {step} steps")
     logger.info(f"Success: {task_success}")
     logger.info(f"{'='*80}\n")
 
-    osworld_client.close()
-
     return {
         "task_id": task_id,
         "domain": domain,
         "instruction": instruction,
         "steps": step,
         "success": task_success,
-        "screenshots_dir": str(results_dir) if save_screenshots else None
+        "screenshots_dir": str(results_dir) if save_screenshots else None,
+        "setup_sec": setup_sec,
     }
 
 
@@ -291,14 +183,25 @@ def main():
                         help="OpenAI model to use (gpt-4o, gpt-4o-mini, etc.)")
     parser.add_argument("--domain", type=str, default="chrome",
                         help="Domain to test")
-    parser.add_argument("--task-id", type=str, required=True,
-                        help="Specific task ID to run")
+    parser.add_argument("--task-id", type=str, default=None,
+                        help="Specific task ID to run (default: every task of --domain in --test-file)")
+    parser.add_argument("--test-file", type=str,
+                        default="vendor/OSWorld/evaluation_examples/test_small.json",
+                        help="Test file with task IDs (used without --task-id)")
     parser.add_argument("--max-steps", type=int, default=15,
                         help="Maximum steps per task")
     parser.add_argument("--temperature", type=float, default=1.0,
                         help="Model temperature")
     parser.add_argument("--save-screenshots", action="store_true", default=True,
                         help="Save screenshots to results directory")
+    parser.add_argument("--results", type=str, default="results/gpt4v_sweep.jsonl",
+                        help="Results file, appended as tasks finish")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip tasks already finished according to the sweep manifest")
+    parser.add_argument("--lease-timeout", type=float, default=SWEEP_LEASE_TIMEOUT,
+                        help="Seconds before another run's in-progress task counts as abandoned")
+    parser.add_argument("--max-retries", type=int, default=0,
+                        help="Retries per task after infrastructure failures (VM unreachable)")
 
     args = parser.parse_args()
 
@@ -321,34 +224,60 @@ def main():
     )
     logger.info("✓ GPT-4V agent initialized")
 
-    # Run task
-    try:
-        result = run_single_task(
-            task_id=args.task_id,
-            domain=args.domain,
-            osworld_url=args.osworld_url,
+    if args.task_id:
+        tasks = [SweepTask(args.domain, args.task_id)]
+    else:
+        with open(args.test_file) as f:
+            tasks = [SweepTask(args.domain, task_id) for task_id in json.load(f).get(args.domain, [])]
+
+    manifest = SweepManifest(os.path.splitext(args.results)[0] + ".manifest.json", lease_timeout=args.lease_timeout)
+    tasks = manifest.plan(tasks, resume=args.resume, max_retries=args.max_retries)
+    if not tasks:
+        logger.info(f"Nothing to run ({manifest.counts()})")
+        return 0
+
+    def run_task(task: SweepTask, osworld_url: str) -> dict:
+        return run_single_task(
+            task_id=task.task_id,
+            domain=task.domain,
+            osworld_url=osworld_url,
             agent=agent,
             max_steps=args.max_steps,
             save_screenshots=args.save_screenshots
         )
 
-        # Print summary
-        logger.info("\n" + "="*80)
-        logger.info("FINAL RESULTS")
-        logger.info("="*80)
+    # One agent instance, so tasks run one at a time
+    results = open_results(args.results)
+    try:
+        sweep = Sweep(
+            VMPool([args.osworld_url]), run_task, results,
+            workers=1, manifest=manifest, max_retries=args.max_retries,
+        )
+        sweep.run(tasks)
+    finally:
+        results.close()
+    records = sweep.records
+
+    # Print summary
+    logger.info("\n" + "="*80)
+    logger.info("FINAL RESULTS")
+    logger.info("="*80)
+    for result in records:
         logger.info(f"Task: {result['domain']}/{result['task_id']}")
+        if result["status"] != "done":
+            logger.info(f"Error: {result.get('error')}")
+            continue
         logger.info(f"Instruction: {result['instruction']}")
         logger.info(f"Steps: {result['steps']}")
         logger.info(f"Success: {'✓ YES' if result['success'] else '✗ NO'}")
         if result['screenshots_dir']:
             logger.info(f"Screenshots: {result['screenshots_dir']}")
-        logger.info("="*80)
-
-        return 0 if result['success'] else 1
+        if result.get("reset"):
+            logger.info(f"VM reset: {result['reset']['strategy']} in {result['reset']['time_sec']:.1f}s")
+    logger.info(f"Results: {args.results} (state: {manifest.path})")
+    logger.info("="*80)
 
-    except Exception as e:
-        logger.error(f"Error running task: {e}", exc_info=True)
-        return 1
+    return 0 if records and all(r.get("success") for r in records) else 1
 
 
 if __name__ == "__main__":
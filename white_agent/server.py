@@ -1,9 +1,12 @@
 from __future__ import annotations
+import json
+import base64
 import argparse
 import logging
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from fastapi import FastAPI, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Optional
 import uvicorn
 
 # Configure logging
@@ -16,10 +19,56 @@ logger = logging.getLogger(__name__)
 
 class Observation(BaseModel):
     frame_id: int
-    image_png_b64: str
+    # Empty when the green agent sent only changed tiles (see prev_frame_id)
+    image_png_b64: str = ""
     instruction: str = ""
     ui_hint: Optional[str] = None
     done: bool = False
+    # Frame diff against the previous observation
+    unchanged: bool = False
+    prev_frame_id: Optional[int] = None
+    tiles: List[Dict[str, Any]] = Field(default_factory=list)
+    # Set when the frame was re-encoded (downscaled, cropped, JPEG/WebP);
+    # coordinates are expected in the encoded image's pixel space
+    image_mime: str = "image/png"
+    image_transform: Optional[Dict[str, Any]] = None
+    # Raw frame when it arrived as a multipart part (never serialized)
+    image_bytes: Optional[bytes] = Field(default=None, exclude=True)
+
+    def image(self) -> bytes:
+        """Frame bytes regardless of transport (decodes base64 only for JSON bodies)."""
+        if self.image_bytes is None:
+            self.image_bytes = base64.b64decode(self.image_png_b64) if self.image_png_b64 else b""
+        return self.image_bytes
+
+
+# Body formats accepted by /decide (advertised on /health)
+OBSERVATION_TRANSPORTS = ["json", "multipart"]
+
+
+async def read_observation(request: Request) -> Observation:
+    """
+    Parse an observation from either transport.
+
+    - application/json: the original protocol with a base64 image_png_b64
+    - multipart/form-data: an "observation" JSON part plus an "image" part
+      holding the raw frame bytes
+    """
+    content_type = request.headers.get("content-type", "application/json")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            obs = Observation(**json.loads(form["observation"]))
+            image = form.get("image")
+            if image is not None and not isinstance(image, str):
+                obs.image_bytes = await image.read()
+                obs.image_mime = image.content_type or obs.image_mime
+            return obs
+        if "json" in content_type:
+            return Observation(**await request.json())
+    except (KeyError, ValueError) as e:
+        raise HTTPException(422, f"Invalid observation: {e}")
+    raise HTTPException(415, f"Unsupported content type '{content_type}'")
 
 
 app = FastAPI(title="White Agent (Native OSWorld)")
@@ -46,7 +95,13 @@ def reset():
 
 
 @app.post("/decide")
-def decide(obs: Observation) -> Dict[str, Any]:
+async def decide(request: Request) -> Dict[str, Any]:
+    """Decide next action; accepts JSON or multipart observations."""
+    obs = await read_observation(request)
+    return await run_in_threadpool(decide_action, obs)
+
+
+def decide_action(obs: Observation) -> Dict[str, Any]:
     """
     Decide next action based on observation.
 
@@ -81,7 +136,8 @@ def health():
         "status": "healthy",
         "agent": "white-agent",
         "version": "0.2.0",
-        "current_step": task_state["step"]
+        "current_step": task_state["step"],
+        "observation_transports": OBSERVATION_TRANSPORTS,
     }
 
 